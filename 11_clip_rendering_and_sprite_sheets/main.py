@@ -51,6 +51,7 @@ class LTexture:
             sdl2.SDL_DestroyTexture(self._m_texture)
             self._m_width = 0
             self._m_height = 0
+        self._destroyed = True
 
 g_window = None
 g_renderer = None
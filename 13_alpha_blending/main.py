@@ -60,11 +60,142 @@ class LTexture:
             sdl2.SDL_DestroyTexture(self._m_texture)
             self._m_width = 0
             self._m_height = 0
+        self._destroyed = True
+
+# NOTE: how long the main loop sleeps waiting for input when the scene has nothing to redraw.
+SCENE_IDLE_WAIT_MS = 100
+
+class RetainedScene:
+    # NOTE: keeps the finished frame in a target texture and only redraws the parts of it that
+    # changed. the main loop set()s everything that should be on screen every frame; a node
+    # that moved, got another texture/clip or changed its state (anything else that changes
+    # how it looks, e.g. its alpha or its text) damages its old and new rect, and render()
+    # redraws just those rects, every node overlapping them back to front. when nothing is
+    # damaged render() returns False and the frame doesn't need to be presented at all.
+    def __init__(self, width: int = SCREEN_WIDTH, height: int = SCREEN_HEIGHT, clear_color: tuple = (0xff, 0xff, 0xff, 0xff)):
+        self._width = width
+        self._height = height
+        self._clear_color = clear_color
+        self._target = None
+        # name -> [texture, clip, clip as a tuple, state, (x, y, w, h)], in draw order
+        self._nodes = {}
+        self._damage = []
+        self._present_needed = False
+
+    def create(self) -> bool:
+        self.free()
+        self._target = sdl2.SDL_CreateTexture(g_renderer,
+            sdl2.SDL_PIXELFORMAT_RGBA8888, sdl2.SDL_TEXTUREACCESS_TARGET,
+            self._width, self._height,
+        )
+        if not self._target:
+            print(f'Unable to create scene target texture! SDL Error: {sdl2.SDL_GetError().decode()}')
+            return False
+        sdl2.SDL_SetTextureBlendMode(self._target, sdl2.SDL_BLENDMODE_NONE)
+        self.invalidate()
+        return True
+
+    def invalidate(self):
+        self._damage = [(0, 0, self._width, self._height)]
+
+    def handle_event(self, e):
+        # NOTE: target textures lose their contents when the renderer is reset. an exposed
+        # window just needs the last frame presented again.
+        if e.type in (sdl2.SDL_RENDER_TARGETS_RESET, sdl2.SDL_RENDER_DEVICE_RESET):
+            self.invalidate()
+        elif e.type == sdl2.SDL_WINDOWEVENT and e.window.event == sdl2.SDL_WINDOWEVENT_EXPOSED:
+            self._present_needed = True
+
+    def set(self, name: str, texture, x: int, y: int, clip: sdl2.SDL_Rect = None, state=None):
+        if clip:
+            clip_key = (clip.x, clip.y, clip.w, clip.h)
+            rect = (x, y, clip.w, clip.h)
+        else:
+            clip_key = None
+            rect = (x, y, texture.get_width(), texture.get_height())
+        node = self._nodes.get(name)
+        if node:
+            if node[0] is texture and node[2] == clip_key and node[3] == state and node[4] == rect:
+                return
+            self._damage.append(node[4])
+        self._nodes[name] = [texture, clip, clip_key, state, rect]
+        self._damage.append(rect)
+
+    def remove(self, name: str):
+        node = self._nodes.pop(name, None)
+        if node:
+            self._damage.append(node[4])
+
+    def _get_damaged_rects(self):
+        # NOTE: clipped to the target and merged until no two overlap, so no pixel is drawn
+        # twice in one frame.
+        rects = []
+        for x, y, w, h in self._damage:
+            left = max(0, x)
+            top = max(0, y)
+            right = min(self._width, x + w)
+            bottom = min(self._height, y + h)
+            if left < right and top < bottom:
+                rects.append([left, top, right, bottom])
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(rects)):
+                a = rects[i]
+                for j in range(i + 1, len(rects)):
+                    b = rects[j]
+                    if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                        a[0] = min(a[0], b[0])
+                        a[1] = min(a[1], b[1])
+                        a[2] = max(a[2], b[2])
+                        a[3] = max(a[3], b[3])
+                        del rects[j]
+                        merged = True
+                        break
+                if merged:
+                    break
+        return rects
+
+    def render(self) -> bool:
+        rects = self._get_damaged_rects()
+        self._damage = []
+        if not rects and not self._present_needed:
+            return False
+
+        if rects:
+            sdl2.SDL_SetRenderTarget(g_renderer, self._target)
+            sdl2.SDL_SetRenderDrawColor(g_renderer, *self._clear_color)
+            clip_rect = sdl2.SDL_Rect()
+            for left, top, right, bottom in rects:
+                clip_rect.x = left
+                clip_rect.y = top
+                clip_rect.w = right - left
+                clip_rect.h = bottom - top
+                sdl2.SDL_RenderSetClipRect(g_renderer, clip_rect)
+                # NOTE: SDL_RenderClear ignores the clip rect.
+                sdl2.SDL_RenderFillRect(g_renderer, clip_rect)
+                for texture, clip, _, _, (x, y, w, h) in self._nodes.values():
+                    if x < right and x + w > left and y < bottom and y + h > top:
+                        texture.render(x, y, clip)
+            sdl2.SDL_RenderSetClipRect(g_renderer, None)
+            sdl2.SDL_SetRenderTarget(g_renderer, None)
+
+        sdl2.SDL_RenderCopy(g_renderer, self._target, None, None)
+        self._present_needed = False
+        return True
+
+    def free(self):
+        if self._target:
+            sdl2.SDL_DestroyTexture(self._target)
+            self._target = None
+        self._nodes.clear()
+        self._damage = []
 
 g_window = None
 g_renderer = None
 g_bg_texture = LTexture()
 g_fg_texture = LTexture()
+g_scene = RetainedScene()
 
 def init():
     global g_window, g_screen_surface, g_renderer
@@ -113,11 +244,15 @@ def load_media():
         print(f'Failed to load background texture!')
         success = False
 
+    if not g_scene.create():
+        success = False
+
     return success
 
 def close():
     global g_window, g_renderer
 
+    g_scene.free()
     g_fg_texture.free()
     g_bg_texture.free()
 
@@ -141,6 +276,7 @@ def main():
             a = 255
             while not quit:
                 while sdl2.SDL_PollEvent(ctypes.byref(e)) != 0:
+                    g_scene.handle_event(e)
                     if e.type == sdl2.SDL_QUIT:
                         quit = True
 
@@ -152,14 +288,15 @@ def main():
                             if a-32 < 0: a = 0
                             else: a -= 32
 
-                sdl2.SDL_SetRenderDrawColor(g_renderer, 0xff, 0xff, 0xff, 0xff)
-                sdl2.SDL_RenderClear(g_renderer)
-
-                g_bg_texture.render(0, 0)
                 g_fg_texture.set_alpha(a)
-                g_fg_texture.render(0, 0)
+                g_scene.set('bg', g_bg_texture, 0, 0)
+                g_scene.set('fg', g_fg_texture, 0, 0, state=a)
 
-                sdl2.SDL_RenderPresent(g_renderer)
+                if g_scene.render():
+                    sdl2.SDL_RenderPresent(g_renderer)
+                else:
+                    # NOTE: nothing changed, so instead of spinning wait until there's input.
+                    sdl2.SDL_WaitEventTimeout(None, SCENE_IDLE_WAIT_MS)
     
     close()
     return 0
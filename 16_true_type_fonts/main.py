@@ -53,6 +53,7 @@ class LTexture:
             else:
                 self._m_width = text_surface.contents.w
                 self._m_height = text_surface.contents.h
+                self._destroyed = False
             sdl2.SDL_FreeSurface(text_surface)
         return self._m_texture is not None
 
@@ -88,6 +89,7 @@ class LTexture:
             sdl2.SDL_DestroyTexture(self._m_texture)
             self._m_width = 0
             self._m_height = 0
+        self._destroyed = True
 
 g_window = None
 g_renderer = None
@@ -74,6 +74,7 @@ class LTexture:
                 else:
                     self._m_width = text_surface.contents.w
                     self._m_height = text_surface.contents.h
+                    self._destroyed = False
                 sdl2.SDL_FreeSurface(text_surface)
             return self._m_texture is not None
 
@@ -109,7 +110,74 @@ class LTexture:
             sdl2.SDL_DestroyTexture(self._m_texture)
             self._m_width = 0
             self._m_height = 0
+        self._destroyed = True
 
+# NOTE: events taken off the queue per SDL_PeepEvents call. more than this in the queue just
+# means another call.
+EVENT_PUMP_CAPACITY = 256
+
+class EventPump:
+    # NOTE: SDL_PollEvent takes one event off the queue per ctypes call (and pumps the OS
+    # events every time). drain() pumps once and then takes up to EVENT_PUMP_CAPACITY events
+    # at a time into a preallocated array with SDL_PeepEvents. the events it yields live in
+    # that array, so they're only good until the next one is asked for; copy whatever has to
+    # be kept. with coalesce on, a run of mouse motion events of the same mouse (or joystick
+    # axis events of the same axis) with nothing else in between is handed out as only the
+    # last of them, with the relative motion of the whole run added up. runs are only
+    # looked for inside one batch of capacity events.
+    def __init__(self, capacity: int = EVENT_PUMP_CAPACITY, coalesce: bool = False):
+        self._events = (sdl2.SDL_Event * capacity)()
+        self._capacity = capacity
+        self.coalesce = coalesce
+        self.coalesced = 0
+
+    def drain(self):
+        sdl2.SDL_PumpEvents()
+        events = self._events
+        while True:
+            count = sdl2.SDL_PeepEvents(events, self._capacity, sdl2.SDL_GETEVENT, sdl2.SDL_FIRSTEVENT, sdl2.SDL_LASTEVENT)
+            if count < 0:
+                print(f'Unable to get events! SDL Error: {sdl2.SDL_GetError().decode()}')
+                return
+            for i in (self._coalesce(count) if self.coalesce else range(count)):
+                yield events[i]
+            if count < self._capacity:
+                return
+
+    def _coalesce(self, count: int):
+        # NOTE: walks the batch backwards, so the first motion event of a device seen in a
+        # run is the one that's kept; anything else ends the run.
+        events = self._events
+        kept = []
+        latest = {}
+        for i in range(count - 1, -1, -1):
+            e = events[i]
+            if e.type == sdl2.SDL_MOUSEMOTION:
+                key = (sdl2.SDL_MOUSEMOTION, e.motion.windowID, e.motion.which)
+            elif e.type == sdl2.SDL_JOYAXISMOTION:
+                key = (sdl2.SDL_JOYAXISMOTION, e.jaxis.which, e.jaxis.axis)
+            else:
+                latest.clear()
+                kept.append(i)
+                continue
+            last = latest.get(key)
+            if last is None:
+                latest[key] = e
+                kept.append(i)
+            else:
+                if e.type == sdl2.SDL_MOUSEMOTION:
+                    last.motion.xrel += e.motion.xrel
+                    last.motion.yrel += e.motion.yrel
+                self.coalesced += 1
+        kept.reverse()
+        return kept
+
+# NOTE: LButton.handle_event's sprite for each mouse event over a button.
+BUTTON_EVENT_SPRITES = {
+    sdl2.SDL_MOUSEMOTION: LButtonSprite.BUTTON_SPRITE_MOUSE_OVER_MOTION,
+    sdl2.SDL_MOUSEBUTTONDOWN: LButtonSprite.BUTTON_SPRITE_MOUSE_OVER_DOWN,
+    sdl2.SDL_MOUSEBUTTONUP: LButtonSprite.BUTTON_SPRITE_MOUSE_OVER_UP,
+}
 class LButton:
     def __init__(self):
         self._m_position = sdl2.SDL_Point()
@@ -119,29 +187,28 @@ class LButton:
         self._m_position.x = x
         self._m_position.y = y
 
+    def get_position(self):
+        return self._m_position.x, self._m_position.y
+
+    def contains(self, x: int, y: int):
+        return (self._m_position.x <= x <= self._m_position.x + BUTTON_WIDTH
+            and self._m_position.y <= y <= self._m_position.y + BUTTON_HEIGHT)
+
+    def set_sprite(self, sprite: LButtonSprite):
+        # NOTE: returns whether the sprite changed.
+        if self._m_current_sprite == sprite:
+            return False
+        self._m_current_sprite = sprite
+        return True
+
     def handle_event(self, e: sdl2.SDL_Event):
-        if (e.type == sdl2.SDL_MOUSEMOTION
-                or e.type == sdl2.SDL_MOUSEBUTTONDOWN
-                or e.type == sdl2.SDL_MOUSEBUTTONUP):
-            # NOTE: SDL_GetMouseState passes by ref, so we have to act accordingly.
-            # the return value is actually the state of the mouse buttons.
-            x = ctypes.c_int(); y = ctypes.c_int()
-            sdl2.SDL_GetMouseState(ctypes.byref(x), ctypes.byref(y))
-            outside = (
-                x.value < self._m_position.x
-                or x.value > (self._m_position.x + BUTTON_WIDTH)
-                or y.value < self._m_position.y
-                or y.value > (self._m_position.y + BUTTON_HEIGHT)
-            )
-            if outside:
-                self._m_current_sprite = LButtonSprite.BUTTON_SPRITE_MOUSE_OUT
+        sprite = BUTTON_EVENT_SPRITES.get(e.type)
+        if sprite is not None:
+            if e.type == sdl2.SDL_MOUSEMOTION:
+                x = e.motion.x; y = e.motion.y
             else:
-                self._m_current_sprite = (
-                    LButtonSprite.BUTTON_SPRITE_MOUSE_OVER_MOTION if e.type == sdl2.SDL_MOUSEMOTION
-                    else LButtonSprite.BUTTON_SPRITE_MOUSE_OVER_DOWN if e.type == sdl2.SDL_MOUSEBUTTONDOWN
-                    else LButtonSprite.BUTTON_SPRITE_MOUSE_OVER_UP if e.type == sdl2.SDL_MOUSEBUTTONUP
-                    else LButtonSprite.BUTTON_SPRITE_MOUSE_OUT # impossible
-                )
+                x = e.button.x; y = e.button.y
+            self.set_sprite(sprite if self.contains(x, y) else LButtonSprite.BUTTON_SPRITE_MOUSE_OUT)
 
     def render(self):
         g_sprite.render(
@@ -150,12 +217,74 @@ class LButton:
             g_sprite_clips[self._m_current_sprite]
         )
 
+BUTTON_GRID_CELL_SIZE = 128
+
+class ButtonGrid:
+    # NOTE: hit index for a lot of buttons. every button is filed under the grid cells its
+    # rect touches, so a mouse event only tests the buttons in the cell under the pointer
+    # instead of all of them. the pointer position comes from the event itself rather than
+    # SDL_GetMouseState, and only the buttons that go from hovered to not hovered (or the
+    # other way, or change between motion/down/up) are touched. buttons that move have to be
+    # added again.
+    def __init__(self, cell_size: int = BUTTON_GRID_CELL_SIZE):
+        self._cell_size = cell_size
+        # (column, row) -> [LButton]
+        self._cells = {}
+        # buttons not showing BUTTON_SPRITE_MOUSE_OUT
+        self._hovered = set()
+
+    def _get_cell_range(self, button):
+        # NOTE: the bounds are inclusive on both ends, like in LButton.contains.
+        cell_size = self._cell_size
+        x, y = button.get_position()
+        return x // cell_size, y // cell_size, (x + BUTTON_WIDTH) // cell_size, (y + BUTTON_HEIGHT) // cell_size
+
+    def add(self, button):
+        self.remove(button)
+        left, top, right, bottom = self._get_cell_range(button)
+        for column in range(left, right + 1):
+            for row in range(top, bottom + 1):
+                self._cells.setdefault((column, row), []).append(button)
+
+    def remove(self, button):
+        for key in [key for key, buttons in self._cells.items() if button in buttons]:
+            self._cells[key].remove(button)
+            if not self._cells[key]:
+                del self._cells[key]
+        self._hovered.discard(button)
+
+    def get_buttons_at(self, x: int, y: int):
+        cell_size = self._cell_size
+        return [button for button in self._cells.get((x // cell_size, y // cell_size), ()) if button.contains(x, y)]
+
+    def handle_event(self, e: sdl2.SDL_Event):
+        # NOTE: returns the buttons whose sprite changed.
+        sprite = BUTTON_EVENT_SPRITES.get(e.type)
+        if sprite is None:
+            return []
+        if e.type == sdl2.SDL_MOUSEMOTION:
+            x = e.motion.x; y = e.motion.y
+        else:
+            x = e.button.x; y = e.button.y
+        hits = self.get_buttons_at(x, y)
+        changed = []
+        for button in self._hovered.difference(hits):
+            button.set_sprite(LButtonSprite.BUTTON_SPRITE_MOUSE_OUT)
+            changed.append(button)
+        for button in hits:
+            if button.set_sprite(sprite):
+                changed.append(button)
+        self._hovered = set(hits)
+        return changed
+
 g_buttons = [LButton(), LButton(), LButton(), LButton()]
+g_button_grid = ButtonGrid()
 g_window = None
 g_renderer = None
 g_font = None
 g_sprite_clips = []
 g_sprite = LTexture()
+g_event_pump = EventPump(coalesce=True)
 
 def init():
     global g_window, g_screen_surface, g_renderer
@@ -211,6 +340,8 @@ def load_media():
     g_buttons[1].set_position(BUTTON_WIDTH, 0)
     g_buttons[2].set_position(0, BUTTON_HEIGHT)
     g_buttons[3].set_position(BUTTON_WIDTH, BUTTON_HEIGHT)
+    for button in g_buttons:
+        g_button_grid.add(button)
 
     return True
 
@@ -237,15 +368,13 @@ def main():
             print('Failed to load media!')
         else:
             quit = False
-            e = sdl2.SDL_Event()
 
             while not quit:
-                while sdl2.SDL_PollEvent(ctypes.byref(e)) != 0:
+                for e in g_event_pump.drain():
                     if e.type == sdl2.SDL_QUIT:
                         quit = True
 
-                    for btn in g_buttons:
-                        btn.handle_event(e)
+                    g_button_grid.handle_event(e)
 
                 sdl2.SDL_SetRenderDrawColor(g_renderer, 0xff, 0xff, 0xff, 0xff)
                 sdl2.SDL_RenderClear(g_renderer)
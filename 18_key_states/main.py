@@ -1,3 +1,4 @@
+import os
 import sys
 import enum
 import ctypes
@@ -73,6 +74,7 @@ class LTexture:
                 else:
                     self._m_width = text_surface.contents.w
                     self._m_height = text_surface.contents.h
+                    self._destroyed = False
                 sdl2.SDL_FreeSurface(text_surface)
             return self._m_texture is not None
 
@@ -108,11 +110,287 @@ class LTexture:
             sdl2.SDL_DestroyTexture(self._m_texture)
             self._m_width = 0
             self._m_height = 0
+        self._destroyed = True
+
+
+class LTextureAtlas(LTexture):
+    # NOTE: loads an atlas made by pack_atlas.py: one image holding every sprite plus an
+    # index of where each one is. everything is drawn from the one texture.
+    def __init__(self):
+        super().__init__()
+        self._clips = {}
+
+    def load_from_atlas(self, p: str) -> bool:
+        self._clips = {}
+        try:
+            with open(p) as f:
+                lines = f.read().split('\n')
+        except OSError as e:
+            print(f'Unable to load atlas index {p}! {e}')
+            return False
+        if not self.load_from_file(os.path.join(os.path.dirname(p), lines[0])):
+            return False
+        for line in lines[1:]:
+            if line:
+                name, x, y, w, h = line.rsplit(' ', 4)
+                self._clips[name] = sdl2.SDL_Rect(x=int(x), y=int(y), w=int(w), h=int(h))
+        return True
+
+    def get_clip(self, name: str):
+        clip = self._clips.get(name)
+        if clip is None:
+            print(f'No sprite named {name} in the atlas!')
+            return None
+        return LAtlasClip(self, clip)
+
+class LAtlasClip:
+    # NOTE: stands in for an LTexture holding just one sprite of an atlas.
+    def __init__(self, atlas: LTextureAtlas, clip: sdl2.SDL_Rect):
+        self._atlas = atlas
+        self._clip = clip
+
+    def get_width(self):
+        return self._clip.w
+
+    def get_height(self):
+        return self._clip.h
+
+    def render(self,
+            x: int, y: int,
+            clip: sdl2.SDL_Rect = None,
+            angle: float = 0,
+            center: sdl2.SDL_Point = None,
+            flip: sdl2.SDL_RendererFlip = sdl2.SDL_FLIP_NONE
+    ):
+        if clip:
+            clip = sdl2.SDL_Rect(x=self._clip.x + clip.x, y=self._clip.y + clip.y, w=clip.w, h=clip.h)
+        else:
+            clip = self._clip
+        self._atlas.render(x, y, clip, angle, center, flip)
+
+# NOTE: how long the main loop sleeps waiting for input when the scene has nothing to redraw.
+SCENE_IDLE_WAIT_MS = 100
+
+class RetainedScene:
+    # NOTE: keeps the finished frame in a target texture and only redraws the parts of it that
+    # changed. the main loop set()s everything that should be on screen every frame; a node
+    # that moved, got another texture/clip or changed its state (anything else that changes
+    # how it looks, e.g. its alpha or its text) damages its old and new rect, and render()
+    # redraws just those rects, every node overlapping them back to front. when nothing is
+    # damaged render() returns False and the frame doesn't need to be presented at all.
+    def __init__(self, width: int = SCREEN_WIDTH, height: int = SCREEN_HEIGHT, clear_color: tuple = (0xff, 0xff, 0xff, 0xff)):
+        self._width = width
+        self._height = height
+        self._clear_color = clear_color
+        self._target = None
+        # name -> [texture, clip, clip as a tuple, state, (x, y, w, h)], in draw order
+        self._nodes = {}
+        self._damage = []
+        self._present_needed = False
+
+    def create(self) -> bool:
+        self.free()
+        self._target = sdl2.SDL_CreateTexture(g_renderer,
+            sdl2.SDL_PIXELFORMAT_RGBA8888, sdl2.SDL_TEXTUREACCESS_TARGET,
+            self._width, self._height,
+        )
+        if not self._target:
+            print(f'Unable to create scene target texture! SDL Error: {sdl2.SDL_GetError().decode()}')
+            return False
+        sdl2.SDL_SetTextureBlendMode(self._target, sdl2.SDL_BLENDMODE_NONE)
+        self.invalidate()
+        return True
+
+    def invalidate(self):
+        self._damage = [(0, 0, self._width, self._height)]
+
+    def handle_event(self, e):
+        # NOTE: target textures lose their contents when the renderer is reset. an exposed
+        # window just needs the last frame presented again.
+        if e.type in (sdl2.SDL_RENDER_TARGETS_RESET, sdl2.SDL_RENDER_DEVICE_RESET):
+            self.invalidate()
+        elif e.type == sdl2.SDL_WINDOWEVENT and e.window.event == sdl2.SDL_WINDOWEVENT_EXPOSED:
+            self._present_needed = True
+
+    def set(self, name: str, texture, x: int, y: int, clip: sdl2.SDL_Rect = None, state=None):
+        if clip:
+            clip_key = (clip.x, clip.y, clip.w, clip.h)
+            rect = (x, y, clip.w, clip.h)
+        else:
+            clip_key = None
+            rect = (x, y, texture.get_width(), texture.get_height())
+        node = self._nodes.get(name)
+        if node:
+            if node[0] is texture and node[2] == clip_key and node[3] == state and node[4] == rect:
+                return
+            self._damage.append(node[4])
+        self._nodes[name] = [texture, clip, clip_key, state, rect]
+        self._damage.append(rect)
+
+    def remove(self, name: str):
+        node = self._nodes.pop(name, None)
+        if node:
+            self._damage.append(node[4])
+
+    def _get_damaged_rects(self):
+        # NOTE: clipped to the target and merged until no two overlap, so no pixel is drawn
+        # twice in one frame.
+        rects = []
+        for x, y, w, h in self._damage:
+            left = max(0, x)
+            top = max(0, y)
+            right = min(self._width, x + w)
+            bottom = min(self._height, y + h)
+            if left < right and top < bottom:
+                rects.append([left, top, right, bottom])
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(rects)):
+                a = rects[i]
+                for j in range(i + 1, len(rects)):
+                    b = rects[j]
+                    if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                        a[0] = min(a[0], b[0])
+                        a[1] = min(a[1], b[1])
+                        a[2] = max(a[2], b[2])
+                        a[3] = max(a[3], b[3])
+                        del rects[j]
+                        merged = True
+                        break
+                if merged:
+                    break
+        return rects
+
+    def render(self) -> bool:
+        rects = self._get_damaged_rects()
+        self._damage = []
+        if not rects and not self._present_needed:
+            return False
+
+        if rects:
+            sdl2.SDL_SetRenderTarget(g_renderer, self._target)
+            sdl2.SDL_SetRenderDrawColor(g_renderer, *self._clear_color)
+            clip_rect = sdl2.SDL_Rect()
+            for left, top, right, bottom in rects:
+                clip_rect.x = left
+                clip_rect.y = top
+                clip_rect.w = right - left
+                clip_rect.h = bottom - top
+                sdl2.SDL_RenderSetClipRect(g_renderer, clip_rect)
+                # NOTE: SDL_RenderClear ignores the clip rect.
+                sdl2.SDL_RenderFillRect(g_renderer, clip_rect)
+                for texture, clip, _, _, (x, y, w, h) in self._nodes.values():
+                    if x < right and x + w > left and y < bottom and y + h > top:
+                        texture.render(x, y, clip)
+            sdl2.SDL_RenderSetClipRect(g_renderer, None)
+            sdl2.SDL_SetRenderTarget(g_renderer, None)
+
+        sdl2.SDL_RenderCopy(g_renderer, self._target, None, None)
+        self._present_needed = False
+        return True
+
+    def free(self):
+        if self._target:
+            sdl2.SDL_DestroyTexture(self._target)
+            self._target = None
+        self._nodes.clear()
+        self._damage = []
+
+@enum.unique
+class InputAction(enum.IntEnum):
+    UP = 0
+    DOWN = enum.auto()
+    LEFT = enum.auto()
+    RIGHT = enum.auto()
+    TOTAL = enum.auto()
+
+# NOTE: the scancodes every action is bound to; any of them held holds the action.
+INPUT_BINDINGS = {
+    InputAction.UP: (sdl2.SDL_SCANCODE_UP,),
+    InputAction.DOWN: (sdl2.SDL_SCANCODE_DOWN,),
+    InputAction.LEFT: (sdl2.SDL_SCANCODE_LEFT,),
+    InputAction.RIGHT: (sdl2.SDL_SCANCODE_RIGHT,),
+}
+
+class InputState:
+    # NOTE: SDL_GetKeyboardState is live: it changes while events are polled, so reading it
+    # per event (and rebuilding lists from it) gives a different answer every time. update()
+    # copies it once a frame into one of two buffers made up front, and a key (or action)
+    # was pressed or released this frame when its byte differs (XOR) from the last frame's.
+    # every query is an index into those buffers; update() and the queries make no lists,
+    # bytes or other buffers.
+    def __init__(self, bindings: dict = INPUT_BINDINGS):
+        self._keys = None
+        self._current = None
+        self._previous = None
+        self._current_view = None
+        self._previous_view = None
+        # action -> scancodes, indexed by the action
+        self._bindings = [bindings.get(action, ()) for action in range(InputAction.TOTAL)]
+        self._current_actions = bytearray(InputAction.TOTAL)
+        self._previous_actions = bytearray(InputAction.TOTAL)
+
+    def bind(self, action: InputAction, *scancodes):
+        self._bindings[action] = scancodes
+
+    def _attach(self):
+        # NOTE: the array SDL_GetKeyboardState points to lives as long as SDL does.
+        count = ctypes.c_int()
+        keys = sdl2.SDL_GetKeyboardState(ctypes.byref(count))
+        self._keys = memoryview((ctypes.c_uint8 * count.value).from_address(ctypes.addressof(keys.contents))).cast('B')
+        self._current = bytearray(count.value)
+        self._previous = bytearray(count.value)
+        self._current_view = memoryview(self._current)
+        self._previous_view = memoryview(self._previous)
+
+    def update(self):
+        # NOTE: call once a frame, after polling the events.
+        if self._keys is None:
+            self._attach()
+        self._current, self._previous = self._previous, self._current
+        self._current_view, self._previous_view = self._previous_view, self._current_view
+        self._current_actions, self._previous_actions = self._previous_actions, self._current_actions
+        self._current_view[:] = self._keys
+        current = self._current
+        for action, scancodes in enumerate(self._bindings):
+            held = 0
+            for scancode in scancodes:
+                held |= current[scancode]
+            self._current_actions[action] = held
+
+    def has_changed(self) -> bool:
+        # NOTE: compares the two snapshots in C, without copying either.
+        return self._current_view != self._previous_view
+
+    def is_key_down(self, scancode: int) -> bool:
+        return self._current[scancode] != 0
+
+    def was_key_pressed(self, scancode: int) -> bool:
+        return (self._current[scancode] ^ self._previous[scancode]) & self._current[scancode] != 0
+
+    def was_key_released(self, scancode: int) -> bool:
+        return (self._current[scancode] ^ self._previous[scancode]) & self._previous[scancode] != 0
+
+    def is_held(self, action: InputAction) -> bool:
+        return self._current_actions[action] != 0
+
+    def was_pressed(self, action: InputAction) -> bool:
+        return (self._current_actions[action] ^ self._previous_actions[action]) & self._current_actions[action] != 0
+
+    def was_released(self, action: InputAction) -> bool:
+        return (self._current_actions[action] ^ self._previous_actions[action]) & self._previous_actions[action] != 0
+
+    def count_held(self) -> int:
+        return sum(self._current_actions)
 
 g_window = None
 g_renderer = None
 g_font = None
-g_texture_list = [LTexture() for _ in range(LSpriteClipType.TOTAL)]
+g_atlas = LTextureAtlas()
+g_texture_list = [None for _ in range(LSpriteClipType.TOTAL)]
+g_scene = RetainedScene()
+g_input = InputState()
 
 def init():
     global g_window, g_screen_surface, g_renderer
@@ -152,33 +430,28 @@ def init():
 def load_media():
     global g_texture_list
 
-    if not g_texture_list[0].load_from_file('image.png'):
-        print(f'Failed to load default texture!')
-        return False
-        
-    if not g_texture_list[1].load_from_file('image_up.png'):
-        print(f'Failed to load up texture!')
-        return False
-        
-    if not g_texture_list[2].load_from_file('image_down.png'):
-        print(f'Failed to load down sprite!')
-        return False
-        
-    if not g_texture_list[3].load_from_file('image_left.png'):
-        print(f'Failed to load left sprite!')
+    if not g_atlas.load_from_atlas('atlas.idx'):
+        print(f'Failed to load sprite atlas!')
         return False
 
-    if not g_texture_list[4].load_from_file('image_right.png'):
-        print(f'Failed to load right sprite!')
+    g_texture_list = [
+        g_atlas.get_clip('image'),
+        g_atlas.get_clip('image_up'),
+        g_atlas.get_clip('image_down'),
+        g_atlas.get_clip('image_left'),
+        g_atlas.get_clip('image_right'),
+    ]
+    if None in g_texture_list:
+        print(f'Failed to load sprites from the atlas!')
         return False
 
-    return True
+    return g_scene.create()
 
 def close():
-    global g_window, g_renderer, g_sprite
+    global g_window, g_renderer
 
-    g_sprite.free()
-    g_sprite = None
+    g_scene.free()
+    g_atlas.free()
 
     sdl2.SDL_DestroyRenderer(g_renderer)
     g_renderer = None
@@ -202,29 +475,32 @@ def main():
 
             while not quit:
                 while sdl2.SDL_PollEvent(ctypes.byref(e)) != 0:
+                    g_scene.handle_event(e)
                     if e.type == sdl2.SDL_QUIT:
                         quit = True
 
-                    states = sdl2.SDL_GetKeyboardState(None)
-                    print('Current pressed-down arrow key number:', sum(states[i] for i in [
-                        sdl2.SDL_SCANCODE_UP,
-                        sdl2.SDL_SCANCODE_DOWN,
-                        sdl2.SDL_SCANCODE_LEFT,
-                        sdl2.SDL_SCANCODE_RIGHT,
-                    ]))
+                g_input.update()
+                if g_input.has_changed():
+                    # NOTE: only when an arrow went down or up, not once per event.
+                    for action in range(InputAction.TOTAL):
+                        if g_input.was_pressed(action) or g_input.was_released(action):
+                            print('Current pressed-down arrow key number:', g_input.count_held())
+                            break
 
                     current_texture = (
-                        g_texture_list[1] if states[sdl2.SDL_SCANCODE_UP]
-                        else g_texture_list[2] if states[sdl2.SDL_SCANCODE_DOWN]
-                        else g_texture_list[3] if states[sdl2.SDL_SCANCODE_LEFT]
-                        else g_texture_list[4] if states[sdl2.SDL_SCANCODE_RIGHT]
+                        g_texture_list[1] if g_input.is_held(InputAction.UP)
+                        else g_texture_list[2] if g_input.is_held(InputAction.DOWN)
+                        else g_texture_list[3] if g_input.is_held(InputAction.LEFT)
+                        else g_texture_list[4] if g_input.is_held(InputAction.RIGHT)
                         else g_texture_list[0]
                     )
 
-                sdl2.SDL_SetRenderDrawColor(g_renderer, 0xff, 0xff, 0xff, 0xff)
-                sdl2.SDL_RenderClear(g_renderer)
-                current_texture.render(0, 0)
-                sdl2.SDL_RenderPresent(g_renderer)
+                g_scene.set('image', current_texture, 0, 0)
+                if g_scene.render():
+                    sdl2.SDL_RenderPresent(g_renderer)
+                else:
+                    # NOTE: nothing changed, so instead of spinning wait until there's input.
+                    sdl2.SDL_WaitEventTimeout(None, SCENE_IDLE_WAIT_MS)
 
     
     close()
@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+import shutil
+import struct
+import tempfile
+import sdl2
+import sdl2.sdlmixer
+
+import main as lesson
+
+# NOTE: times loading a lot of distinct sounds at startup, once with a Mix_LoadWAV per file
+# on the main thread and once through AudioBank (preload everything, then acquire it). the
+# sounds are the lesson's notes with a different first sample each, so the bank can't share
+# them; the mixer runs at 48 kHz so every one of them has to be resampled.
+#
+#     cd 21_sound_effects_and_music && SDL_AUDIODRIVER=dummy python bench_audio_bank.py
+SOUND_COUNTS = [50, 200]
+MIXER_FREQUENCY = 48000
+
+def make_sounds(directory: str, count: int):
+    notes = [f'note_{i:02}.wav' for i in range(1, 6)]
+    paths = []
+    for i in range(count):
+        with open(notes[i % len(notes)], 'rb') as f:
+            data = bytearray(f.read())
+        # NOTE: the first sample right after the 44 byte header of these files.
+        data[44:48] = struct.pack('<hh', i, -i)
+        p = os.path.join(directory, f'sound_{i:04}.wav')
+        with open(p, 'wb') as f:
+            f.write(data)
+        paths.append(p)
+    return paths
+
+def time_load_wav(paths):
+    start = time.perf_counter()
+    chunks = [sdl2.sdlmixer.Mix_LoadWAV(p.encode()) for p in paths]
+    elapsed = time.perf_counter() - start
+    for chunk in chunks:
+        sdl2.sdlmixer.Mix_FreeChunk(chunk)
+    return elapsed * 1000
+
+def time_audio_bank(paths, workers: int):
+    bank = lesson.AudioBank(workers=workers)
+    start = time.perf_counter()
+    bank.preload(paths)
+    preloaded = time.perf_counter() - start
+    chunks = [bank.acquire(p) for p in paths]
+    elapsed = time.perf_counter() - start
+    for chunk in chunks:
+        bank.release(chunk)
+    bank.clear()
+    return preloaded * 1000, elapsed * 1000
+
+def main():
+    if sdl2.SDL_Init(sdl2.SDL_INIT_AUDIO) < 0:
+        print(f'SDL could not initialize! SDL_Error: {sdl2.SDL_GetError().decode()}')
+        return 1
+    if sdl2.sdlmixer.Mix_OpenAudio(MIXER_FREQUENCY, sdl2.sdlmixer.MIX_DEFAULT_FORMAT, 2, 2048) < 0:
+        print(f'SDL_mixer could not initialize. SDL_mixer Error: {sdl2.sdlmixer.Mix_GetError().decode()}')
+        sdl2.SDL_Quit()
+        return 1
+    directory = tempfile.mkdtemp()
+    print(f'{"sounds":>6} {"Mix_LoadWAV ms":>15} {"bank, 1 worker ms":>18} {f"bank, {lesson.AUDIO_BANK_WORKERS} workers ms":>20} {"blocked in preload ms":>22}')
+    for count in SOUND_COUNTS:
+        paths = make_sounds(directory, count)
+        load_wav = time_load_wav(paths)
+        _, single = time_audio_bank(paths, 1)
+        preloaded, pooled = time_audio_bank(paths, lesson.AUDIO_BANK_WORKERS)
+        print(f'{count:>6} {load_wav:>15.1f} {single:>18.1f} {pooled:>20.1f} {preloaded:>22.1f}')
+    shutil.rmtree(directory)
+    sdl2.sdlmixer.Mix_CloseAudio()
+    sdl2.SDL_Quit()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
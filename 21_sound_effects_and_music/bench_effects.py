@@ -0,0 +1,81 @@
+import sys
+import time
+import numpy
+import sdl2
+import sdl2.sdlmixer
+
+import main as lesson
+
+# NOTE: times the EffectPipeline callbacks for one buffer of the mix against how long that
+# buffer plays (the period); past 100% the audio thread can't keep up and the sound breaks
+# up. one buffer is VOICES channel callbacks (envelope and pan, like the notes get) and the
+# post-mix low-pass. the callbacks are called here on the main thread with buffers of noise,
+# the same way SDL_mixer calls them. the per-sample column is the same post-mix low-pass
+# and envelope written as python loops over the samples, at the smallest size only.
+#
+#     cd 21_sound_effects_and_music && SDL_AUDIODRIVER=dummy python bench_effects.py
+CHUNK_SIZES = [512, 1024, 2048, 4096]
+VOICES = 8
+FREQUENCY = 44100
+REPEATS = 200
+
+def low_pass_per_sample(samples, taps, history):
+    out = []
+    for channel in range(len(samples[0])):
+        x = history[channel] + [frame[channel] for frame in samples]
+        out.append([sum(x[i + k] * taps[k] for k in range(len(taps))) for i in range(len(samples))])
+        history[channel] = x[len(samples):]
+    return [list(frame) for frame in zip(*out)]
+
+def time_pipeline(chunk_size: int, rng):
+    fx = lesson.EffectPipeline()
+    fx._open()
+    channels = fx._spec[2]
+    buffers = [(rng.standard_normal((chunk_size, channels)) * 3000).astype(fx._dtype) for _ in range(VOICES + 1)]
+    voices = [[[lesson.VolumeEnvelope(lesson.NOTE_ENVELOPE), lesson.Pan(lesson.NOTE_PANS[i % len(lesson.NOTE_PANS)])], 0] for i in range(VOICES)]
+    post = [[lesson.LowPass()], 0]
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        for state, samples in zip(voices, buffers):
+            fx.process(samples.ctypes.data, samples.nbytes, state)
+        fx.process(buffers[-1].ctypes.data, buffers[-1].nbytes, post)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times[len(times) // 2] * 1000, times[len(times) * 99 // 100] * 1000
+
+def time_per_sample(chunk_size: int, rng):
+    low_pass = lesson.LowPass()
+    low_pass.process(numpy.zeros((1, 2), dtype=numpy.float32), 0, FREQUENCY)
+    taps = [float(tap) for tap in low_pass._taps]
+    samples = (rng.standard_normal((chunk_size, 2)) * 3000).tolist()
+    history = [[0.0] * (len(taps) - 1) for _ in range(2)]
+    start = time.perf_counter()
+    out = low_pass_per_sample(samples, taps, history)
+    for i, frame in enumerate(out):
+        gain = min(1.0, i * 1000 / FREQUENCY / 8)
+        out[i] = [max(-32768, min(32767, round(sample * gain))) for sample in frame]
+    return (time.perf_counter() - start) * 1000
+
+def main():
+    if sdl2.SDL_Init(sdl2.SDL_INIT_AUDIO) < 0:
+        print(f'SDL could not initialize! SDL_Error: {sdl2.SDL_GetError().decode()}')
+        return 1
+    if sdl2.sdlmixer.Mix_OpenAudio(FREQUENCY, sdl2.sdlmixer.MIX_DEFAULT_FORMAT, 2, 2048) < 0:
+        print(f'SDL_mixer could not initialize. SDL_mixer Error: {sdl2.sdlmixer.Mix_GetError().decode()}')
+        sdl2.SDL_Quit()
+        return 1
+    rng = numpy.random.default_rng(42)
+    print(f'{VOICES} voices with envelope and pan, low-pass post-mix, 16 bit stereo {FREQUENCY} Hz')
+    print(f'{"frames":>6} {"period ms":>10} {"p50 ms":>8} {"p99 ms":>8} {"p99 % of period":>16} {"per-sample post ms":>19}')
+    for chunk_size in CHUNK_SIZES:
+        period = chunk_size * 1000 / FREQUENCY
+        p50, p99 = time_pipeline(chunk_size, rng)
+        per_sample = f'{time_per_sample(chunk_size, rng):>19.1f}' if chunk_size == CHUNK_SIZES[0] else f'{"-":>19}'
+        print(f'{chunk_size:>6} {period:>10.2f} {p50:>8.3f} {p99:>8.3f} {p99 / period * 100:>15.1f}% {per_sample}')
+    sdl2.sdlmixer.Mix_CloseAudio()
+    sdl2.SDL_Quit()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+import os
+import sys
+import math
+import time
+import array
+import ctypes
+import mmap
+import wave
+import shutil
+import tempfile
+import argparse
+import subprocess
+import sdl2
+import sdl2.sdlmixer
+
+# NOTE: how much memory music takes once it plays, loaded the way 21 does (Mix_LoadMUS on
+# the path), from a mapping of the file (mmap and Mix_LoadMUS_RW over SDL_RWFromConstMem,
+# which is what a streamer reading straight from the mapping would do), read whole into
+# memory first, and decoded into a chunk with Mix_LoadWAV (which is what a crossfade over
+# chunks would need). every way runs in a process of its own and reports what it added to
+# the anonymous (heap) and file backed resident memory, from /proc/self/status, so this
+# needs linux.
+#
+#     cd 21_sound_effects_and_music && SDL_AUDIODRIVER=dummy python bench_music_stream.py
+#
+# Mix_LoadMUS already streams from the file, so the mapping saves nothing against it; a
+# MIDI like 21's is rendered by the synth from a few KB of events either way.
+MUSIC_SECONDS = 300
+PLAY_SECONDS = 1
+MUSIC_PATHS = ['influencia-do-jazz.mid']
+WAYS = ['Mix_LoadMUS', 'mapped', 'whole file', 'Mix_LoadWAV']
+
+def write_track(p: str, hz: int):
+    second = array.array('h', (int(8000 * math.sin(2 * math.pi * hz * i / 44100)) for i in range(44100) for _ in range(2))).tobytes()
+    with wave.open(p, 'wb') as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(44100)
+        for _ in range(MUSIC_SECONDS):
+            w.writeframes(second)
+
+def get_rss_kb():
+    rss = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('RssAnon', 'RssFile'):
+                rss[key] = int(value.split()[0])
+    return rss['RssAnon'], rss['RssFile']
+
+def measure(way: str, p: str):
+    if sdl2.SDL_Init(sdl2.SDL_INIT_AUDIO) < 0 or sdl2.sdlmixer.Mix_OpenAudio(44100, sdl2.sdlmixer.MIX_DEFAULT_FORMAT, 2, 2048) < 0:
+        print('Unable to open audio!')
+        return 1
+    anon, file = get_rss_kb()
+    start = time.perf_counter()
+
+    keep = []
+    music = None
+    chunk = None
+    if way == 'Mix_LoadMUS':
+        music = sdl2.sdlmixer.Mix_LoadMUS(p.encode())
+    elif way == 'mapped':
+        with open(p, 'rb') as f:
+            # NOTE: copy-on-write, because ctypes only hands out the address of a writable
+            # buffer; nothing writes to it.
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        view = ctypes.c_char.from_buffer(data)
+        keep += [data, view]
+        music = sdl2.sdlmixer.Mix_LoadMUS_RW(sdl2.SDL_RWFromConstMem(ctypes.addressof(view), len(data)), 1)
+    elif way == 'whole file':
+        with open(p, 'rb') as f:
+            data = f.read()
+        keep.append(data)
+        music = sdl2.sdlmixer.Mix_LoadMUS_RW(sdl2.SDL_RWFromConstMem(data, len(data)), 1)
+    else:
+        chunk = sdl2.sdlmixer.Mix_LoadWAV(p.encode())
+    loaded = time.perf_counter() - start
+    if not music and not chunk:
+        print(f'{way:>12} {"":>10} Unable to load {os.path.basename(p)}! SDL_mixer Error: {sdl2.sdlmixer.Mix_GetError().decode()}')
+        return 0
+    if music:
+        sdl2.sdlmixer.Mix_PlayMusic(music, -1)
+    else:
+        sdl2.sdlmixer.Mix_PlayChannel(-1, chunk, 0)
+    time.sleep(PLAY_SECONDS)
+
+    now_anon, now_file = get_rss_kb()
+    print(f'{way:>12} {loaded * 1000:>10.1f} {(now_anon - anon) / 1024:>10.1f} {(now_file - file) / 1024:>10.1f}')
+    sdl2.sdlmixer.Mix_HaltMusic()
+    sdl2.sdlmixer.Mix_HaltChannel(-1)
+    if music:
+        sdl2.sdlmixer.Mix_FreeMusic(music)
+    if chunk:
+        sdl2.sdlmixer.Mix_FreeChunk(chunk)
+    keep.clear()
+    sdl2.sdlmixer.Mix_CloseAudio()
+    sdl2.SDL_Quit()
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the memory use of the ways to load music.')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('paths', nargs='*', help='music files to measure besides a generated WAV (default: 21\'s MIDI)')
+    args = parser.parse_args()
+    if args.child:
+        return measure(args.child, args.paths[0])
+
+    directory = tempfile.mkdtemp()
+    paths = [os.path.join(directory, 'long.wav')]
+    write_track(paths[0], 440)
+    paths += args.paths or [p for p in MUSIC_PATHS if os.path.exists(p)]
+    for p in paths:
+        print(f'{os.path.basename(p)} ({os.path.getsize(p) / (1024 * 1024):.2f} MiB), played for {PLAY_SECONDS} s')
+        print(f'{"":>12} {"load ms":>10} {"heap MiB":>10} {"file MiB":>10}')
+        sys.stdout.flush()
+        for way in WAYS:
+            subprocess.run([sys.executable, os.path.abspath(__file__), '--child', way, p])
+    shutil.rmtree(directory)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
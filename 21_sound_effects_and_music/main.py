@@ -1,9 +1,20 @@
+import os
 import sys
 import enum
+import math
 import ctypes
+import hashlib
+import threading
 import sdl2
 import sdl2.sdlimage
 
+NUMPY_AVAILABLE = False
+try:
+    import numpy
+    NUMPY_AVAILABLE = True
+except ImportError:
+    pass
+
 SDL2_SDLTTF_AVAILABLE = False
 try:
     import sdl2.sdlttf
@@ -12,10 +23,47 @@ except:
     pass
 
 import sdl2.sdlmixer
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
 
 SCREEN_WIDTH = 640
 SCREEN_HEIGHT = 480
 
+# NOTE: like the texture cache, sounds nothing plays anymore stay around until the bank
+# needs the room. the budget counts converted PCM bytes, which is what the chunks hold.
+AUDIO_BANK_BUDGET = 64 * 1024 * 1024
+AUDIO_BANK_WORKERS = os.cpu_count() or 4
+
+# NOTE: which voice a full group gives up for a new sound.
+VOICE_STEAL_OLDEST = 0
+VOICE_STEAL_QUIETEST = 1
+# NOTE: the same sound triggered again within this many ms is dropped as a duplicate, so
+# mashing a key (or its key repeat) doesn't restart the mixer channels over and over.
+VOICE_COOLDOWN_MS = 50
+# NOTE: drops and steals are reported per second over a window this long.
+VOICE_STATS_WINDOW_MS = 1000
+
+VOICE_GROUP_NOTES = 1
+# NOTE: (tag, channels, steal policy); every group gets channels of its own, so one kind
+# of sound can't take all of them from another.
+VOICE_GROUPS = [
+    (VOICE_GROUP_NOTES, 8, VOICE_STEAL_OLDEST),
+]
+
+# NOTE: the mixer formats the effects can work on, as numpy dtype names; anything else plays
+# without effects.
+EFFECT_DTYPES = {
+    sdl2.AUDIO_S16SYS: 'int16',
+    sdl2.AUDIO_S32SYS: 'int32',
+    sdl2.AUDIO_F32SYS: 'float32',
+}
+LOW_PASS_TAPS = 31
+LOW_PASS_CUTOFF = 1200
+# NOTE: (ms, gain) points of the envelope every note gets, and where each note sits from
+# left (-1) to right (1).
+NOTE_ENVELOPE = [(0, 0.0), (8, 1.0), (400, 0.4)]
+NOTE_PANS = [-0.8, -0.4, 0.0, 0.4, 0.8]
+
 class LTexture:
     def __init__(self):
         self._m_texture = None
@@ -64,6 +112,7 @@ class LTexture:
                 else:
                     self._m_width = text_surface.contents.w
                     self._m_height = text_surface.contents.h
+                    self._destroyed = False
                 sdl2.SDL_FreeSurface(text_surface)
             return self._m_texture is not None
 
@@ -99,12 +148,565 @@ class LTexture:
             sdl2.SDL_DestroyTexture(self._m_texture)
             self._m_width = 0
             self._m_height = 0
+        self._destroyed = True
+
+def get_mixer_spec():
+    # NOTE: (frequency, format, channels) of the open audio device, or None.
+    frequency = ctypes.c_int()
+    audio_format = ctypes.c_uint16()
+    channels = ctypes.c_int()
+    if not sdl2.sdlmixer.Mix_QuerySpec(ctypes.byref(frequency), ctypes.byref(audio_format), ctypes.byref(channels)):
+        return None
+    return (frequency.value, audio_format.value, channels.value)
+
+class AudioBank:
+    # NOTE: Mix_LoadWAV reads, decodes and converts a sound on the calling thread. here the
+    # workers do all of that with SDL_LoadWAV_RW and SDL_ConvertAudio (ctypes lets go of the
+    # GIL while SDL runs) into buffers already in the format the mixer was opened with, and
+    # the main thread only wraps them with Mix_QuickLoad_RAW. such a chunk doesn't own its
+    # buffer, so the bank keeps the buffer alive until the chunk is freed. the buffers are
+    # the ones SDL_LoadWAV_RW allocated, grown for the conversion and shrunk after it, so no
+    # sample is copied on the python side.
+    #
+    # files are shared by content: the same file under two names, or a file loaded again
+    # after it was edited back, is decoded and held once.
+    def __init__(self, byte_budget: int = AUDIO_BANK_BUDGET, workers: int = AUDIO_BANK_WORKERS, voices=None):
+        self.byte_budget = byte_budget
+        self._workers = workers
+        # VoiceManager told about every chunk the bank frees
+        self._voices = voices
+        self._pool = None
+        self._spec = None
+        self._lock = threading.Lock()
+        # (path, mtime) -> Future of the digest of the file's contents
+        self._paths = {}
+        # digest -> Future of (address of the PCM buffer, bytes, error), set by the worker
+        # that decodes it
+        self._decodes = {}
+        # digest -> [chunk, address of the PCM buffer, reference count, bytes], oldest first
+        self._entries = OrderedDict()
+        # address of the Mix_Chunk -> digest
+        self._keys = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_bytes(self):
+        return self._bytes
+
+    def _get_spec(self):
+        # NOTE: Mix_OpenAudio may get a different rate or channel count than it asked for,
+        # so the target format comes from the opened device.
+        if self._spec is None:
+            self._spec = get_mixer_spec()
+            if self._spec is None:
+                print(f'Unable to query the audio format! SDL_mixer Error: {sdl2.sdlmixer.Mix_GetError().decode()}')
+        return self._spec
+
+    def _get_key(self, p: str):
+        try:
+            return (os.path.abspath(p), os.path.getmtime(p))
+        except OSError as e:
+            print(f'Unable to load sound {p}! {e}')
+            return None
+
+    def preload(self, paths) -> bool:
+        # NOTE: starts decoding in the background and returns right away; acquire() waits
+        # for whatever isn't done yet.
+        spec = self._get_spec()
+        if spec is None:
+            return False
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self._workers)
+        success = True
+        for p in paths:
+            key = self._get_key(p)
+            if key is None:
+                success = False
+            elif key not in self._paths:
+                self._paths[key] = self._pool.submit(self._load, p, spec)
+        return success
+
+    def _load(self, p: str, spec):
+        # NOTE: runs on a worker. the first worker to see some contents decodes them, any
+        # other one with the same contents just hands back the digest.
+        try:
+            with open(p, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            return None, f'Unable to load sound {p}! {e}'
+        digest = hashlib.sha1(data).digest()
+        with self._lock:
+            decode = self._decodes.get(digest)
+            owner = decode is None
+            if owner:
+                decode = self._decodes[digest] = Future()
+        if owner:
+            try:
+                decode.set_result(self._convert(p, data, spec))
+            except BaseException as e:
+                # NOTE: whoever waits for these contents gets the exception instead of hanging,
+                # and acquire() drops the decode for them all.
+                decode.set_exception(e)
+        return digest, None
+
+    def _convert(self, p: str, data: bytes, spec):
+        frequency, audio_format, channels = spec
+        wav_spec = sdl2.SDL_AudioSpec(0, 0, 0, 0)
+        wav_buffer = ctypes.POINTER(ctypes.c_uint8)()
+        wav_length = ctypes.c_uint32()
+        rw = sdl2.SDL_RWFromConstMem(data, len(data))
+        if not sdl2.SDL_LoadWAV_RW(rw, 1, ctypes.byref(wav_spec), ctypes.byref(wav_buffer), ctypes.byref(wav_length)):
+            return None, 0, f'Unable to load sound {p}! SDL Error: {sdl2.SDL_GetError().decode()}'
+        pcm = ctypes.cast(wav_buffer, ctypes.c_void_p).value
+        size = wav_length.value
+
+        cvt = sdl2.SDL_AudioCVT()
+        needed = sdl2.SDL_BuildAudioCVT(ctypes.byref(cvt),
+            wav_spec.format, wav_spec.channels, wav_spec.freq,
+            audio_format, channels, frequency,
+        )
+        if needed < 0:
+            sdl2.SDL_free(pcm)
+            return None, 0, f'Unable to convert sound {p}! SDL Error: {sdl2.SDL_GetError().decode()}'
+        if needed:
+            # NOTE: SDL_ConvertAudio works in place and needs len * len_mult bytes for that
+            # (8 times the WAV for 16 bit 44.1 -> 48 kHz, it resamples in floats).
+            grown = sdl2.SDL_realloc(pcm, size * cvt.len_mult)
+            if not grown:
+                sdl2.SDL_free(pcm)
+                return None, 0, f'Unable to convert sound {p}! Out of memory.'
+            cvt.buf = ctypes.cast(grown, ctypes.POINTER(ctypes.c_uint8))
+            cvt.len = size
+            if sdl2.SDL_ConvertAudio(ctypes.byref(cvt)) < 0:
+                sdl2.SDL_free(grown)
+                return None, 0, f'Unable to convert sound {p}! SDL Error: {sdl2.SDL_GetError().decode()}'
+            size = cvt.len_cvt
+            # NOTE: shrinking never fails and usually doesn't move the buffer.
+            pcm = sdl2.SDL_realloc(grown, max(1, size))
+        return pcm, size, None
+
+    def acquire(self, p: str):
+        # NOTE: returns a Mix_Chunk, or None if the sound couldn't be loaded. every chunk
+        # acquired has to be released; the bank frees it.
+        key = self._get_key(p)
+        if key is None:
+            return None
+        while True:
+            load = self._paths.get(key)
+            if load is None:
+                if not self.preload([p]):
+                    return None
+                load = self._paths[key]
+            try:
+                digest, error = load.result()
+            except Exception as e:
+                # NOTE: the worker raised; whatever it was, it's reported like any other error.
+                digest, error = None, f'Unable to load sound {p}! {e}'
+            if error:
+                del self._paths[key]
+                print(error)
+                return None
+
+            entry = self._entries.get(digest)
+            if entry:
+                self.hits += 1
+                self._entries.move_to_end(digest)
+                entry[2] += 1
+                return entry[0]
+
+            with self._lock:
+                decode = self._decodes.get(digest)
+            if decode is not None:
+                break
+            # NOTE: the decode was dropped after this path was loaded (it failed, or the
+            # sound was evicted), so the file is loaded again.
+            del self._paths[key]
+
+        self.misses += 1
+        try:
+            pcm, size, error = decode.result()
+        except Exception as e:
+            pcm, size, error = None, 0, f'Unable to load sound {p}! {e}'
+        if error:
+            with self._lock:
+                self._decodes.pop(digest, None)
+            # NOTE: every path with these contents shares the failed decode.
+            self._forget_paths(digest)
+            print(error)
+            return None
+        chunk = sdl2.sdlmixer.Mix_QuickLoad_RAW(ctypes.cast(pcm, ctypes.POINTER(ctypes.c_uint8)), size)
+        if not chunk:
+            print(f'Unable to create chunk from {p}! SDL_mixer Error: {sdl2.sdlmixer.Mix_GetError().decode()}')
+            return None
+        self._entries[digest] = [chunk, pcm, 1, size]
+        self._keys[ctypes.addressof(chunk.contents)] = digest
+        self._bytes += size
+        self._evict()
+        return chunk
+
+    def release(self, chunk):
+        digest = self._keys.get(ctypes.addressof(chunk.contents))
+        if digest is not None:
+            self._entries[digest][2] -= 1
+            self._evict()
+
+    def _evict(self):
+        # NOTE: chunks that are still acquired can't be evicted, so the bank can end up over
+        # budget if everything in it is in use.
+        if self._bytes <= self.byte_budget:
+            return
+        for digest, entry in list(self._entries.items()):
+            if self._bytes <= self.byte_budget:
+                break
+            if entry[2] <= 0:
+                self._remove(digest)
+                self.evictions += 1
+
+    def _remove(self, digest):
+        entry = self._entries.pop(digest)
+        del self._keys[ctypes.addressof(entry[0].contents)]
+        self._bytes -= entry[3]
+        if self._voices is not None:
+            self._voices.forget(entry[0])
+        # NOTE: Mix_FreeChunk halts the channels still playing it before it returns, so the
+        # buffer can go after it.
+        sdl2.sdlmixer.Mix_FreeChunk(entry[0])
+        sdl2.SDL_free(entry[1])
+        with self._lock:
+            self._decodes.pop(digest, None)
+        self._forget_paths(digest)
+
+    def _forget_paths(self, digest):
+        for key in [key for key, load in self._paths.items()
+                if load.done() and not load.exception() and load.result()[0] == digest]:
+            del self._paths[key]
+
+    def clear(self):
+        # NOTE: call this before closing the audio device; the next preload() picks up the
+        # format of whatever device is open then.
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        for digest in list(self._entries):
+            self._remove(digest)
+        # NOTE: sounds preloaded but never acquired have no chunk yet, only a buffer. a
+        # decode that raised has neither.
+        for decode in self._decodes.values():
+            if decode.exception() is not None:
+                continue
+            pcm, _, _ = decode.result()
+            if pcm:
+                sdl2.SDL_free(pcm)
+        self._paths.clear()
+        self._decodes.clear()
+        self._spec = None
+
+class VolumeEnvelope:
+    # NOTE: gain over time since the sound started, linear between (ms, gain) points and the
+    # last gain after the last point.
+    def __init__(self, points):
+        self._ms = numpy.array([point[0] for point in points], dtype=numpy.float64)
+        self._gains = numpy.array([point[1] for point in points], dtype=numpy.float32)
+
+    def process(self, samples, first_frame: int, frequency: int):
+        ms = numpy.arange(first_frame, first_frame + len(samples), dtype=numpy.float64)
+        ms *= 1000 / frequency
+        samples *= numpy.interp(ms, self._ms, self._gains).astype(numpy.float32)[:, None]
+
+class Pan:
+    # NOTE: constant power, so a sound is as loud in the middle as it is on one side.
+    def __init__(self, pan: float):
+        angle = (pan + 1) * math.pi / 4
+        self._gains = numpy.array([math.cos(angle), math.sin(angle)], dtype=numpy.float32) * math.sqrt(2)
+
+    def process(self, samples, first_frame: int, frequency: int):
+        if samples.shape[1] >= 2:
+            samples[:, :2] *= self._gains
+
+class LowPass:
+    # NOTE: a windowed-sinc FIR, so every output sample is a numpy.convolve away from the
+    # input instead of depending on the one before it like a one pole filter would. the last
+    # taps - 1 input samples of every channel carry over to the next buffer.
+    def __init__(self, cutoff: int = LOW_PASS_CUTOFF, taps: int = LOW_PASS_TAPS):
+        self.cutoff = cutoff
+        self._taps_count = taps
+        self._taps = None
+        self._frequency = 0
+        self._history = None
+
+    def process(self, samples, first_frame: int, frequency: int):
+        if self._taps is None or self._frequency != frequency:
+            n = numpy.arange(self._taps_count) - (self._taps_count - 1) / 2
+            taps = numpy.sinc(2 * self.cutoff / frequency * n) * numpy.hamming(self._taps_count)
+            self._taps = (taps / taps.sum()).astype(numpy.float32)
+            self._frequency = frequency
+            self._history = None
+        if self._history is None or self._history.shape[1] != samples.shape[1]:
+            self._history = numpy.zeros((self._taps_count - 1, samples.shape[1]), dtype=numpy.float32)
+        for channel in range(samples.shape[1]):
+            x = numpy.concatenate((self._history[:, channel], samples[:, channel]))
+            self._history[:, channel] = x[len(x) - len(self._history):]
+            samples[:, channel] = numpy.convolve(x, self._taps, mode='valid')
+
+class EffectPipeline:
+    # NOTE: runs effects (objects with a process(samples, first_frame, frequency) method) on
+    # a channel (Mix_RegisterEffect) or on the whole mix (Mix_SetPostMix). SDL_mixer calls
+    # back on the audio thread with a pointer to the samples; they're wrapped as a numpy
+    # array of (frames, channels) without copying them. float32 mixers are processed right
+    # there; int mixers go through one float32 scratch buffer, converted in once and clipped
+    # back once, however many effects there are. nothing loops over samples in python.
+    def __init__(self):
+        self._spec = None
+        self._dtype = None
+        self._limits = None
+        # channel -> [effects, frames processed]
+        self._channels = {}
+        self._post = None
+        # bytes -> ctypes array type of that many bytes, to wrap a stream pointer with
+        self._buffer_types = {}
+        self._scratch = None
+        self._effect = sdl2.sdlmixer.Mix_EffectFunc_t(self._run_channel)
+        self._effect_done = sdl2.sdlmixer.Mix_EffectDone_t(self._channel_done)
+        self._post_mix = sdl2.sdlmixer.mix_func(self._run_post)
+        self._no_post_mix = sdl2.sdlmixer.mix_func()
+
+    def _open(self) -> bool:
+        if self._spec is not None:
+            return True
+        if not NUMPY_AVAILABLE:
+            return False
+        spec = get_mixer_spec()
+        if spec is None or spec[1] not in EFFECT_DTYPES:
+            return False
+        self._spec = spec
+        self._dtype = numpy.dtype(EFFECT_DTYPES[spec[1]])
+        if self._dtype.kind == 'i':
+            info = numpy.iinfo(self._dtype)
+            self._limits = (info.min, info.max)
+        return True
+
+    def add(self, channel: int, effects) -> bool:
+        if not self._open():
+            return False
+        if channel in self._channels:
+            self._channels[channel][0].extend(effects)
+            return True
+        self._channels[channel] = [list(effects), 0]
+        if not sdl2.sdlmixer.Mix_RegisterEffect(channel, self._effect, self._effect_done, None):
+            print(f'Unable to register effects on channel {channel}! SDL_mixer Error: {sdl2.sdlmixer.Mix_GetError().decode()}')
+            del self._channels[channel]
+            return False
+        return True
+
+    def remove(self, channel: int):
+        if channel in self._channels:
+            sdl2.sdlmixer.Mix_UnregisterEffect(channel, self._effect)
+
+    def set_post(self, effects) -> bool:
+        # NOTE: replaces the post-mix effects; an empty list turns the post-mix off.
+        if not effects:
+            if self._post is not None:
+                sdl2.sdlmixer.Mix_SetPostMix(self._no_post_mix, None)
+                self._post = None
+            return True
+        if not self._open():
+            return False
+        self._post = [list(effects), 0]
+        sdl2.sdlmixer.Mix_SetPostMix(self._post_mix, None)
+        return True
+
+    def _run_channel(self, channel, stream, length, udata):
+        state = self._channels.get(channel)
+        if state:
+            self.process(stream, length, state)
+
+    def _channel_done(self, channel, udata):
+        self._channels.pop(channel, None)
+
+    def _run_post(self, udata, stream, length):
+        state = self._post
+        if state:
+            self.process(ctypes.cast(stream, ctypes.c_void_p).value, length, state)
+
+    def process(self, address: int, length: int, state):
+        buffer_type = self._buffer_types.get(length)
+        if buffer_type is None:
+            buffer_type = self._buffer_types[length] = ctypes.c_uint8 * length
+        channels = self._spec[2]
+        view = numpy.frombuffer(buffer_type.from_address(address), dtype=self._dtype).reshape(-1, channels)
+        if self._limits is None:
+            samples = view
+        else:
+            if self._scratch is None or self._scratch.size < view.size:
+                self._scratch = numpy.empty(view.size, dtype=numpy.float32)
+            samples = self._scratch[:view.size].reshape(view.shape)
+            numpy.copyto(samples, view)
+        effects, first_frame = state
+        for effect in effects:
+            effect.process(samples, first_frame, self._spec[0])
+        state[1] = first_frame + len(view)
+        if self._limits is not None:
+            numpy.rint(samples, out=samples)
+            numpy.clip(samples, *self._limits, out=samples)
+            numpy.copyto(view, samples, casting='unsafe')
+
+    def has_post(self):
+        return self._post is not None
+
+    def clear(self):
+        # NOTE: call this before closing the audio device.
+        for channel in list(self._channels):
+            sdl2.sdlmixer.Mix_UnregisterAllEffects(channel)
+        self._channels.clear()
+        self.set_post([])
+        self._spec = None
+
+class VoiceManager:
+    # NOTE: Mix_PlayChannel(-1, ...) drops a sound without a word when every channel is
+    # busy. here every group (Mix_GroupChannels) has its own channels, and when a group is
+    # full a new sound takes over its oldest or quietest voice, as long as that voice isn't
+    # more important than the new one. every voice played through the manager has a priority;
+    # channels playing something the manager didn't start count as priority 0.
+    def __init__(self, cooldown_ms: int = VOICE_COOLDOWN_MS, effects=None):
+        self.cooldown_ms = cooldown_ms
+        # EffectPipeline the effects passed to play() go to
+        self._effects = effects
+        # tag -> [first channel, channel count, steal policy]
+        self._groups = {}
+        self._channel_count = 0
+        # channel -> [priority, ticks it started at]
+        self._voices = {}
+        # address of the Mix_Chunk -> ticks it was last played at
+        self._last_played = {}
+        # address of the Mix_Chunk -> its own cooldown in ms
+        self._cooldowns = {}
+        self.plays = 0
+        self.steals = 0
+        self.drops = 0
+        self.duplicates = 0
+        # ticks of every steal and drop within the last VOICE_STATS_WINDOW_MS
+        self._steal_ticks = deque()
+        self._drop_ticks = deque()
+
+    def add_group(self, tag: int, channels: int, steal: int = VOICE_STEAL_OLDEST) -> bool:
+        first = self._channel_count
+        if sdl2.sdlmixer.Mix_AllocateChannels(first + channels) != first + channels:
+            print(f'Unable to allocate {channels} channels! SDL_mixer Error: {sdl2.sdlmixer.Mix_GetError().decode()}')
+            return False
+        if sdl2.sdlmixer.Mix_GroupChannels(first, first + channels - 1, tag) != channels:
+            print(f'Unable to group channels {first}-{first + channels - 1}! SDL_mixer Error: {sdl2.sdlmixer.Mix_GetError().decode()}')
+            return False
+        self._groups[tag] = [first, channels, steal]
+        self._channel_count = first + channels
+        return True
+
+    def set_cooldown(self, chunk, ms: int):
+        self._cooldowns[ctypes.addressof(chunk.contents)] = ms
+
+    def forget(self, chunk):
+        # NOTE: call this before freeing a chunk that went through the manager; a chunk
+        # allocated later at the same address would get its cooldown otherwise.
+        address = ctypes.addressof(chunk.contents)
+        self._last_played.pop(address, None)
+        self._cooldowns.pop(address, None)
+
+    def play(self, chunk, tag: int, priority: int = 0, loops: int = 0, effects=None) -> int:
+        # NOTE: returns the channel the sound plays on, or -1 if it was dropped. effects are
+        # put on the channel before the sound starts, so not even the first buffer of it
+        # is mixed without them; SDL_mixer takes them off again when the sound ends.
+        now = sdl2.SDL_GetTicks()
+        address = ctypes.addressof(chunk.contents)
+        last = self._last_played.get(address)
+        if last is not None and now - last < self._cooldowns.get(address, self.cooldown_ms):
+            self.duplicates += 1
+            return -1
+
+        channel = sdl2.sdlmixer.Mix_GroupAvailable(tag)
+        if channel == -1:
+            channel = self._find_victim(tag, priority)
+            if channel == -1:
+                self._drop(now)
+                return -1
+            sdl2.sdlmixer.Mix_HaltChannel(channel)
+            self.steals += 1
+            self._steal_ticks.append(now)
+        if effects and self._effects is not None:
+            self._effects.add(channel, effects)
+        if sdl2.sdlmixer.Mix_PlayChannel(channel, chunk, loops) == -1:
+            print(f'Unable to play sound! SDL_mixer Error: {sdl2.sdlmixer.Mix_GetError().decode()}')
+            if effects and self._effects is not None:
+                self._effects.remove(channel)
+            self._drop(now)
+            return -1
+        self.plays += 1
+        self._voices[channel] = [priority, now]
+        self._last_played[address] = now
+        return channel
+
+    def _drop(self, now: int):
+        self.drops += 1
+        self._drop_ticks.append(now)
+
+    def _find_victim(self, tag: int, priority: int) -> int:
+        group = self._groups.get(tag)
+        if group is None:
+            return -1
+        first, count, steal = group
+        victim = -1
+        victim_key = None
+        for channel in range(first, first + count):
+            voice_priority, started = self._voices.get(channel, (0, 0))
+            if voice_priority > priority:
+                continue
+            # NOTE: the least important voice goes first, then by the group's policy; ties
+            # are broken by age either way.
+            if steal == VOICE_STEAL_QUIETEST:
+                chunk = sdl2.sdlmixer.Mix_GetChunk(channel)
+                volume = sdl2.sdlmixer.Mix_Volume(channel, -1) * (sdl2.sdlmixer.Mix_VolumeChunk(chunk, -1) if chunk else 0)
+                key = (voice_priority, volume, started)
+            else:
+                key = (voice_priority, started)
+            if victim_key is None or key < victim_key:
+                victim = channel
+                victim_key = key
+        return victim
+
+    def get_stats(self):
+        now = sdl2.SDL_GetTicks()
+        for ticks in (self._steal_ticks, self._drop_ticks):
+            while ticks and now - ticks[0] >= VOICE_STATS_WINDOW_MS:
+                ticks.popleft()
+        per_second = 1000 / VOICE_STATS_WINDOW_MS
+        return {
+            'plays': self.plays,
+            'steals': self.steals,
+            'drops': self.drops,
+            'duplicates': self.duplicates,
+            'steals_per_second': len(self._steal_ticks) * per_second,
+            'drops_per_second': len(self._drop_ticks) * per_second,
+        }
+
+    def clear(self):
+        # NOTE: call this before closing the audio device.
+        sdl2.sdlmixer.Mix_HaltChannel(-1)
+        for first, count, _ in self._groups.values():
+            sdl2.sdlmixer.Mix_GroupChannels(first, first + count - 1, -1)
+        self._groups.clear()
+        self._channel_count = 0
+        self._voices.clear()
+        self._last_played.clear()
+        self._cooldowns.clear()
 
 g_window = None
 g_renderer = None
 g_texture = LTexture()
 g_music = None
 g_note = []
+g_effects = EffectPipeline()
+g_voices = VoiceManager(effects=g_effects)
+g_audio_bank = AudioBank(voices=g_voices)
 
 def init():
     global g_window, g_screen_surface, g_renderer
@@ -138,6 +740,10 @@ def init():
         # NOTE: yes, now it's Mix (instead of MIX) because it's not an abbreviation.
         if sdl2.sdlmixer.Mix_OpenAudio(44100, sdl2.sdlmixer.MIX_DEFAULT_FORMAT, 8, 2048) < 0:
             print(f'SDL_mixer could not initialize. SDL_mixer Error: {sdl2.sdlmixer.Mix_GetError().decode()}')    
+        else:
+            for tag, channels, steal in VOICE_GROUPS:
+                if not g_voices.add_group(tag, channels, steal):
+                    success = False
 
     return success
 
@@ -147,22 +753,26 @@ def load_media():
 
     success = True
 
+    # NOTE: the notes decode in the background while the music and the texture load.
+    note_paths = [f'note_{i:02}.wav' for i in range(1, 6)]
+    g_audio_bank.preload(note_paths)
+
     g_music = sdl2.sdlmixer.Mix_LoadMUS('influencia-do-jazz.mid'.encode())
     if not g_music:
         print(f'Failed to load music.')
         success = False
-    
-    for i in range(1, 6):
-        note = sdl2.sdlmixer.Mix_LoadWAV(f'note_{i:02}.wav'.encode())
-        if not note:
-            print(f'Failed to load note {i}')
-            success = False
-        g_note.append(note)
 
     if not g_texture.load_from_file('texture.png'):
         print(f'Failed to load texture.')
         success = False
 
+    for i, p in enumerate(note_paths, 1):
+        note = g_audio_bank.acquire(p)
+        if not note:
+            print(f'Failed to load note {i}')
+            success = False
+        g_note.append(note)
+
     return success
 
 def close():
@@ -171,9 +781,12 @@ def close():
     g_texture.free()
     g_texture = None
 
+    g_voices.clear()
+    g_effects.clear()
     for note in g_note:
-        if note: sdl2.sdlmixer.Mix_FreeChunk(note)
+        if note: g_audio_bank.release(note)
     g_note = None
+    g_audio_bank.clear()
 
     sdl2.sdlmixer.Mix_FreeMusic(g_music)
     g_music = None
@@ -222,8 +835,11 @@ def main():
                             sdl2.sdlmixer.Mix_HaltMusic()
                         elif e.key.keysym.sym in keys:
                             ix = keys.index(e.key.keysym.sym)
-                            sdl2.sdlmixer.Mix_PlayChannel(-1, g_note[ix], 0)
-                    
+                            effects = [VolumeEnvelope(NOTE_ENVELOPE), Pan(NOTE_PANS[ix])] if NUMPY_AVAILABLE else None
+                            g_voices.play(g_note[ix], VOICE_GROUP_NOTES, effects=effects)
+                        elif e.key.keysym.sym == sdl2.SDLK_l and NUMPY_AVAILABLE:
+                            g_effects.set_post([] if g_effects.has_post() else [LowPass()])
+
                 sdl2.SDL_SetRenderDrawColor(g_renderer, 0xff, 0xff, 0xff, 0xff)
                 sdl2.SDL_RenderClear(g_renderer)
                 g_texture.render(0, 0)
@@ -1,12 +1,55 @@
 import sys
+import math
+import array
 import ctypes
 import sdl2
 import sdl2.sdlimage
 import sdl2.sdlttf
+from collections import OrderedDict
 
 SCREEN_WIDTH = 640
 SCREEN_HEIGHT = 480
 
+class TextureRegistry:
+    # NOTE: every SDL_Texture an LTexture creates is handed over to this registry, and
+    # LTexture.free only gives its reference back. a texture is destroyed the moment its
+    # last reference is released, and whatever is left gets destroyed in close() before
+    # the renderer goes away.
+    def __init__(self):
+        # address of the SDL_Texture -> [texture, reference count, estimated bytes]
+        self._entries = {}
+
+    def adopt(self, texture):
+        fmt = ctypes.c_uint32()
+        w = ctypes.c_int()
+        h = ctypes.c_int()
+        sdl2.SDL_QueryTexture(texture, ctypes.byref(fmt), None, ctypes.byref(w), ctypes.byref(h))
+        self._entries[ctypes.addressof(texture.contents)] = [texture, 1, w.value * h.value * sdl2.SDL_BYTESPERPIXEL(fmt.value)]
+        return texture
+
+    def retain(self, texture):
+        self._entries[ctypes.addressof(texture.contents)][1] += 1
+        return texture
+
+    def release(self, texture):
+        key = ctypes.addressof(texture.contents)
+        entry = self._entries[key]
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self._entries[key]
+            sdl2.SDL_DestroyTexture(texture)
+
+    def get_live_count(self):
+        return len(self._entries)
+
+    def get_live_bytes(self):
+        return sum(entry[2] for entry in self._entries.values())
+
+    def destroy_all(self):
+        for texture, _, _ in self._entries.values():
+            sdl2.SDL_DestroyTexture(texture)
+        self._entries = {}
+
 class LTexture:
     def __init__(self):
         self._texture = None
@@ -37,24 +80,26 @@ class LTexture:
                 self._width = surface.contents.w
                 self._height = surface.contents.h
                 self._destroyed = False
-                self._texture = new_texture
+                self._texture = g_texture_registry.adopt(new_texture)
             sdl2.SDL_FreeSurface(surface)
         return new_texture is not None
 
-    def load_from_rendered_text(self, texture_text: str, color: sdl2.SDL_Color):
+    def load_from_rendered_text(self, texture_text: str, color: sdl2.SDL_Color, font=None):
         self.free()
-        text_surface = sdl2.sdlttf.TTF_RenderText_Solid(g_font, texture_text.encode(), color)
+        text_surface = sdl2.sdlttf.TTF_RenderText_Solid(g_font if font is None else font, texture_text.encode(), color)
         if not text_surface:
             print(f'Unable to render text surface! SDL_ttf Error: {sdl2.sdlttf.TTF_GetError().decode()}')
         else:
-            self._texture = sdl2.SDL_CreateTextureFromSurface(g_renderer, text_surface)
-            if not self._texture:
+            new_texture = sdl2.SDL_CreateTextureFromSurface(g_renderer, text_surface)
+            if not new_texture:
                 print(f'Unable to create texture from rendered text! SDL Error: {sdl2.SDL_GetError().decode()}')
             else:
                 self._width = text_surface.contents.w
                 self._height = text_surface.contents.h
+                self._destroyed = False
+                self._texture = g_texture_registry.adopt(new_texture)
             sdl2.SDL_FreeSurface(text_surface)
-        return self._texture is not None
+        return not self._destroyed
 
     def render(self,
             x: int, y: int,
@@ -83,11 +128,23 @@ class LTexture:
     def set_alpha(self, alpha: int):
         sdl2.SDL_SetTextureAlphaMod(self._texture, alpha)
     
+    def share(self, other):
+        # NOTE: both LTextures end up drawing the same SDL_Texture; it is only destroyed
+        # once both of them are freed.
+        self.free()
+        if not other._destroyed:
+            self._texture = g_texture_registry.retain(other._texture)
+            self._width = other._width
+            self._height = other._height
+            self._destroyed = False
+
     def free(self):
         if not self._destroyed and self._texture:
-            sdl2.SDL_DestroyTexture(self._texture)
+            g_texture_registry.release(self._texture)
+            self._texture = None
             self._width = 0
             self._height = 0
+        self._destroyed = True
 
 class LTimer:
     def __init__(self):
@@ -135,12 +192,306 @@ class LTimer:
 
     def is_paused(self):
         return self._paused
-        
+
+# NOTE: how many laps LHighResTimer remembers for get_percentile().
+TIMER_HISTORY_SIZE = 256
+
+class LHighResTimer:
+    # NOTE: same interface as LTimer but counts with SDL_GetPerformanceCounter, which is 64 bit
+    # and usually ticks in nanoseconds, instead of SDL_GetTicks' 32 bit milliseconds. at 144 Hz
+    # a frame is ~7 ms, so whole milliseconds are off by up to 15% per frame. get_ticks() returns
+    # milliseconds as a float.
+    def __init__(self, history_size: int = TIMER_HISTORY_SIZE):
+        self._frequency = sdl2.SDL_GetPerformanceFrequency()
+        self._start_counts = 0
+        self._paused_counts = 0
+        self._lap_counts = 0
+        self._paused = False
+        self._started = False
+
+        # NOTE: ring buffer of the most recent lap times in milliseconds.
+        self._laps = [0.0] * history_size
+        self._lap_index = 0
+        self._lap_count = 0
+
+    def start(self):
+        self._started = True
+        self._paused = False
+        self._start_counts = sdl2.SDL_GetPerformanceCounter()
+        self._paused_counts = 0
+        self._lap_counts = 0
+        self.clear_laps()
+
+    def stop(self):
+        self._started = False
+        self._paused = False
+        self._start_counts = 0
+        self._paused_counts = 0
+        self._lap_counts = 0
+
+    def pause(self):
+        if self._started and not self._paused:
+            self._paused = True
+            self._paused_counts = sdl2.SDL_GetPerformanceCounter() - self._start_counts
+            self._start_counts = 0
+
+    def resume(self):
+        if self._started and self._paused:
+            self._paused = False
+            self._start_counts = sdl2.SDL_GetPerformanceCounter() - self._paused_counts
+            self._paused_counts = 0
+
+    def _get_counts(self):
+        counts = 0
+        if self._started:
+            if self._paused:
+                counts = self._paused_counts
+            else:
+                counts = sdl2.SDL_GetPerformanceCounter() - self._start_counts
+        return counts
+
+    def get_ticks(self):
+        return self._get_counts() * 1000 / self._frequency
+
+    def is_started(self):
+        return self._started
+
+    def is_paused(self):
+        return self._paused
+
+    def lap(self):
+        # NOTE: milliseconds since the previous lap (or since start), not counting time spent
+        # paused. call it once per frame to get frame times.
+        counts = self._get_counts()
+        split = (counts - self._lap_counts) * 1000 / self._frequency
+        self._lap_counts = counts
+        self._laps[self._lap_index] = split
+        self._lap_index = (self._lap_index + 1) % len(self._laps)
+        self._lap_count = min(self._lap_count + 1, len(self._laps))
+        return split
+
+    def get_laps(self):
+        # NOTE: oldest first.
+        if self._lap_count < len(self._laps):
+            return self._laps[:self._lap_count]
+        return self._laps[self._lap_index:] + self._laps[:self._lap_index]
+
+    def clear_laps(self):
+        self._lap_index = 0
+        self._lap_count = 0
+
+    def get_percentile(self, percentile: float):
+        # NOTE: nearest-rank percentile of the remembered laps, e.g. get_percentile(99) is the
+        # frame time that 99% of the recent frames stayed within.
+        if not self._lap_count:
+            return 0
+        laps = sorted(self.get_laps())
+        rank = max(1, math.ceil(percentile / 100 * len(laps)))
+        return laps[min(rank, len(laps)) - 1]
+
+# NOTE: printable ASCII is all this lesson ever draws; anything else is skipped.
+ATLAS_CHARS = ''.join(chr(c) for c in range(32, 127))
+ATLAS_WIDTH = 512
+# NOTE: SDL_RenderGeometryRaw only exists since SDL 2.0.18; older versions get one
+# SDL_RenderCopy per glyph instead.
+USE_RENDER_GEOMETRY = sdl2.dll.version >= 2018
+# NOTE: strings drawn again reuse the vertices they were drawn with; this many of them are
+# kept, least recently drawn first out.
+ATLAS_STRING_CACHE_SIZE = 1024
+
+class LGlyphAtlas(LTexture):
+    # NOTE: load_from_rendered_text makes a new surface and a new texture every time the
+    # text changes, which for an FPS counter means every single frame. here every glyph is
+    # rasterized once into one texture and a string is drawn as a run of clipped copies.
+    # kerning is ignored, which is fine for a counter but not for a paragraph.
+    #
+    # the software renderer blends every pixel of every glyph copy in C, which costs more
+    # than rendering the string with SDL_ttf (bench_text.py in 25), so there the text still
+    # goes through load_from_rendered_text.
+    def __init__(self):
+        super().__init__()
+        self._clips = {}
+        self._quads = {}
+        self._line_height = 0
+        self._render_quad = sdl2.SDL_Rect()
+        self._indices = None
+        self._index_capacity = 0
+        # text -> [glyph count, xy, uv, where it was last drawn], oldest first
+        self._strings = OrderedDict()
+        self._font = None
+        # LTexture the text is rendered into on the software renderer, None elsewhere
+        self._text = None
+        self._text_key = None
+
+    def get_line_height(self):
+        return self._line_height
+
+    def load_from_font(self, font, chars: str = ATLAS_CHARS) -> bool:
+        self.free()
+        self._clips = {}
+        self._quads = {}
+        self._font = font
+        info = sdl2.SDL_RendererInfo()
+        if sdl2.SDL_GetRendererInfo(g_renderer, ctypes.byref(info)) == 0 and info.flags & sdl2.SDL_RENDERER_SOFTWARE:
+            self._text = LTexture()
+        white = sdl2.SDL_Color(r=0xff, g=0xff, b=0xff, a=0xff)
+        glyphs = []
+        for ch in chars:
+            glyph_surface = sdl2.sdlttf.TTF_RenderText_Solid(font, ch.encode(), white)
+            if not glyph_surface:
+                print(f'Unable to render glyph {ch!r}! SDL_ttf Error: {sdl2.sdlttf.TTF_GetError().decode()}')
+                continue
+            glyphs.append((ch, glyph_surface))
+
+        # simple shelf packing: glyphs go left to right and wrap to a new row when full.
+        x = 0
+        y = 0
+        row_height = 0
+        for ch, glyph_surface in glyphs:
+            w = glyph_surface.contents.w
+            h = glyph_surface.contents.h
+            if x + w > ATLAS_WIDTH:
+                x = 0
+                y += row_height
+                row_height = 0
+            self._clips[ch] = sdl2.SDL_Rect(x=x, y=y, w=w, h=h)
+            x += w
+            row_height = max(row_height, h)
+
+        atlas_surface = sdl2.SDL_CreateRGBSurfaceWithFormat(0, ATLAS_WIDTH, max(y + row_height, 1), 32, sdl2.SDL_PIXELFORMAT_RGBA32)
+        if not atlas_surface:
+            print(f'Unable to create glyph atlas surface! SDL Error: {sdl2.SDL_GetError().decode()}')
+        else:
+            # NOTE: solid text surfaces are color-keyed on their background, so blitting them
+            # onto a zero-filled RGBA surface leaves the background fully transparent.
+            for ch, glyph_surface in glyphs:
+                sdl2.SDL_BlitSurface(glyph_surface, None, atlas_surface, self._clips[ch])
+            new_texture = sdl2.SDL_CreateTextureFromSurface(g_renderer, atlas_surface)
+            if not new_texture:
+                print(f'Unable to create glyph atlas texture! SDL Error: {sdl2.SDL_GetError().decode()}')
+            else:
+                self._texture = g_texture_registry.adopt(new_texture)
+                self._width = atlas_surface.contents.w
+                self._height = atlas_surface.contents.h
+                self._destroyed = False
+                self._line_height = sdl2.sdlttf.TTF_FontHeight(font)
+                for ch, clip in self._clips.items():
+                    u0 = clip.x / self._width
+                    v0 = clip.y / self._height
+                    u1 = (clip.x + clip.w) / self._width
+                    v1 = (clip.y + clip.h) / self._height
+                    self._quads[ch] = (clip.w, clip.h, (u0, v0, u1, v0, u1, v1, u0, v1))
+            sdl2.SDL_FreeSurface(atlas_surface)
+        for _, glyph_surface in glyphs:
+            sdl2.SDL_FreeSurface(glyph_surface)
+        return not self._destroyed
+
+    def get_text_width(self, text: str):
+        clips = self._clips
+        return sum(clips[ch].w for ch in text if ch in clips)
+
+    def render_text(self, text: str, x: int, y: int, color: sdl2.SDL_Color):
+        if self._text is not None:
+            key = (text, color.r, color.g, color.b, color.a)
+            if key != self._text_key:
+                self._text_key = None
+                if text and self._text.load_from_rendered_text(text, color, self._font):
+                    self._text_key = key
+            if self._text_key is not None:
+                self._text.render(x, y)
+            return
+
+        # NOTE: glyphs are rasterized in white so any color is one color mod away.
+        if not USE_RENDER_GEOMETRY:
+            sdl2.SDL_SetTextureColorMod(self._texture, color.r, color.g, color.b)
+            render_quad = self._render_quad
+            render_quad.x = x
+            render_quad.y = y
+            for ch in text:
+                clip = self._clips.get(ch)
+                if clip is None:
+                    continue
+                render_quad.w = clip.w
+                render_quad.h = clip.h
+                sdl2.SDL_RenderCopy(g_renderer, self._texture, clip, render_quad)
+                render_quad.x += clip.w
+            return
+
+        entry = self._strings.get(text)
+        if entry is None:
+            entry = self._add_string(text, x, y)
+        else:
+            self._strings.move_to_end(text)
+        glyph_count, xy, uv, drawn_at = entry
+        if drawn_at != (x, y):
+            # NOTE: only the positions move; the texture coordinates stay as they are.
+            dx = x - drawn_at[0]
+            dy = y - drawn_at[1]
+            xy[0::2] = [vx + dx for vx in xy[0::2]]
+            xy[1::2] = [vy + dy for vy in xy[1::2]]
+            entry[3] = (x, y)
+        if not glyph_count:
+            return
+        # a stride of 0 for the color means every vertex shares the one color.
+        sdl2.SDL_RenderGeometryRaw(g_renderer, self._texture,
+            xy, 8,
+            ctypes.byref(color), 0,
+            uv, 8,
+            glyph_count * 4,
+            self._indices, glyph_count * 6, 4,
+        )
+
+    def _add_string(self, text: str, x: int, y: int):
+        # one quad (two triangles) per glyph, all of them submitted in a single call.
+        xy = []
+        uv = []
+        left = x
+        for ch in text:
+            quad = self._quads.get(ch)
+            if quad is None:
+                continue
+            w, h, tex_coords = quad
+            xy += (left, y, left+w, y, left+w, y+h, left, y+h)
+            uv += tex_coords
+            left += w
+        glyph_count = len(xy) // 8
+        if glyph_count > self._index_capacity:
+            self._grow_indices(glyph_count)
+        # NOTE: array.array converts the whole list in C, which is a lot cheaper than
+        # unpacking it into a ctypes array constructor. the ctypes arrays keep the
+        # array.arrays they're made from alive.
+        float_array = ctypes.c_float * len(xy)
+        entry = [glyph_count,
+            float_array.from_buffer(array.array('f', xy)),
+            float_array.from_buffer(array.array('f', uv)),
+            (x, y),
+        ]
+        self._strings[text] = entry
+        if len(self._strings) > ATLAS_STRING_CACHE_SIZE:
+            self._strings.popitem(last=False)
+        return entry
+
+    def _grow_indices(self, glyph_count: int):
+        self._index_capacity = max(glyph_count, self._index_capacity * 2)
+        indices = []
+        for i in range(0, self._index_capacity * 4, 4):
+            indices += (i, i+1, i+2, i, i+2, i+3)
+        self._indices = (ctypes.c_int * len(indices))(*indices)
+
+    def free(self):
+        super().free()
+        self._strings.clear()
+        if self._text is not None:
+            self._text.free()
+            self._text = None
+            self._text_key = None
+
 g_window = None
 g_renderer = None
+g_texture_registry = TextureRegistry()
 g_font = None
 g_prompt = LTexture()
-g_texture = LTexture()
+g_text_atlas = LGlyphAtlas()
 
 
 def init():
@@ -179,7 +530,7 @@ def init():
 
 
 def load_media():
-    global g_texture, g_font, g_prompt
+    global g_font, g_prompt
 
     success = True
     g_font = sdl2.sdlttf.TTF_OpenFont('CantoniaSerif.ttf'.encode(), 16)
@@ -191,13 +542,18 @@ def load_media():
     if not g_prompt.load_from_rendered_text('S - Start/stop timer  P - Pause/resume timer', text_color):
         print(f'Failed to render text texture!')
         success = False
+    if not g_text_atlas.load_from_font(g_font):
+        print(f'Failed to build glyph atlas!')
+        success = False
 
     return success
 
 def close():
     global g_window, g_renderer, g_font
 
-    g_texture.free()
+    g_prompt.free()
+    g_text_atlas.free()
+    g_texture_registry.destroy_all()
 
     sdl2.sdlttf.TTF_CloseFont(g_font)
     g_font = None
@@ -220,7 +576,7 @@ def main():
             e = sdl2.SDL_Event()
 
             color = sdl2.SDL_Color(r=0,g=0,b=0,a=255)
-            timer = LTimer()
+            timer = LHighResTimer()
             time_text = ''
 
             while not quit:
@@ -235,9 +591,7 @@ def main():
                             if timer.is_paused(): timer.resume()
                             else: timer.pause()
                 
-                time_text = f'Seconds since start time: {timer.get_ticks() / 1000}'
-                if not g_texture.load_from_rendered_text(time_text, color):
-                    print('Failed to render text.')
+                time_text = f'Seconds since start time: {timer.get_ticks() / 1000:.3f}'
 
                 sdl2.SDL_SetRenderDrawColor(g_renderer, 0xff, 0xff, 0xff, 0xff)
                 sdl2.SDL_RenderClear(g_renderer)
@@ -246,9 +600,11 @@ def main():
                     (SCREEN_WIDTH - g_prompt.get_width())//2,
                     0
                 )
-                g_texture.render(
-                    (SCREEN_WIDTH - g_texture.get_width())//2,
-                    (SCREEN_HEIGHT - g_texture.get_height())//2,
+                g_text_atlas.render_text(
+                    time_text,
+                    (SCREEN_WIDTH - g_text_atlas.get_text_width(time_text))//2,
+                    (SCREEN_HEIGHT - g_text_atlas.get_line_height())//2,
+                    color,
                 )
 
                 sdl2.SDL_RenderPresent(g_renderer)
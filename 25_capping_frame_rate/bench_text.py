@@ -0,0 +1,107 @@
+import sys
+import ctypes
+import sdl2
+import sdl2.sdlttf
+
+import main as lesson
+
+# NOTE: compares the old way of drawing a label (re-render the whole string with
+# load_from_rendered_text every frame) with drawing it from the glyph atlas, once with
+# labels that change every frame and once with labels that stay the same. the renderer
+# is created without PRESENTVSYNC so the numbers are not capped at the refresh rate, and
+# without SDL_RENDERER_ACCELERATED so it also runs with SDL_VIDEODRIVER=dummy (the software
+# renderer, where the atlas draws through load_from_rendered_text itself);
+# SDL_VIDEODRIVER=offscreen gets an OpenGL renderer where there is one.
+LABEL_COUNTS = [1, 100, 1000]
+BENCH_FRAMES = 100
+BENCH_SECONDS = 3
+
+def init():
+    if sdl2.SDL_Init(sdl2.SDL_INIT_VIDEO) < 0:
+        print(f'SDL could not initialize! SDL_Error: {sdl2.SDL_GetError().decode()}')
+        return False
+    lesson.g_window = sdl2.SDL_CreateWindow(
+        "SDL Turtorial".encode('utf-8'),
+        sdl2.SDL_WINDOWPOS_UNDEFINED, sdl2.SDL_WINDOWPOS_UNDEFINED,
+        lesson.SCREEN_WIDTH, lesson.SCREEN_HEIGHT,
+        sdl2.SDL_WINDOW_SHOWN,
+    )
+    if not lesson.g_window:
+        print(f'Window could not be created! SDL_Error: {sdl2.SDL_GetError().decode()}')
+        return False
+    lesson.g_renderer = sdl2.SDL_CreateRenderer(lesson.g_window, -1, 0)
+    if not lesson.g_renderer:
+        print(f'Renderer could not be created! SDL Error: {sdl2.SDL_GetError().decode()}')
+        return False
+    if sdl2.sdlttf.TTF_Init() == -1:
+        print(f'SDL_ttf could not initialize! SDL_ttf Error: {sdl2.sdlttf.TTF_GetError().decode()}')
+        return False
+    lesson.g_font = sdl2.sdlttf.TTF_OpenFont('CantoniaSerif.ttf'.encode(), 16)
+    if not lesson.g_font:
+        print(f'Failed to load font! SDL_ttf Error: {sdl2.sdlttf.TTF_GetError().decode()}')
+        return False
+    return True
+
+def label_position(i: int):
+    return (i * 37) % (lesson.SCREEN_WIDTH - 100), (i * 17) % (lesson.SCREEN_HEIGHT - 20)
+
+def get_label(i: int, frame: int, changing: bool):
+    return f'Label {i}: {frame}' if changing else f'Label {i}'
+
+def draw_rendered_text(labels, frame, color, changing):
+    for i, label in enumerate(labels):
+        label.load_from_rendered_text(get_label(i, frame, changing), color)
+        label.render(*label_position(i))
+
+def draw_glyph_atlas(atlas, label_count, frame, color, changing):
+    for i in range(label_count):
+        x, y = label_position(i)
+        atlas.render_text(get_label(i, frame, changing), x, y, color)
+
+def run(draw):
+    e = sdl2.SDL_Event()
+    frequency = sdl2.SDL_GetPerformanceFrequency()
+    start = sdl2.SDL_GetPerformanceCounter()
+    frames = 0
+    while frames < BENCH_FRAMES and (sdl2.SDL_GetPerformanceCounter() - start) < BENCH_SECONDS * frequency:
+        while sdl2.SDL_PollEvent(ctypes.byref(e)) != 0:
+            pass
+        sdl2.SDL_SetRenderDrawColor(lesson.g_renderer, 0xff, 0xff, 0xff, 0xff)
+        sdl2.SDL_RenderClear(lesson.g_renderer)
+        draw(frames)
+        sdl2.SDL_RenderPresent(lesson.g_renderer)
+        frames += 1
+    return frames * frequency / (sdl2.SDL_GetPerformanceCounter() - start)
+
+def main():
+    if not init():
+        print('Failed to initialize!')
+        lesson.close()
+        return 1
+
+    color = sdl2.SDL_Color(r=0, g=0, b=0, a=255)
+    atlas = lesson.LGlyphAtlas()
+    if not atlas.load_from_font(lesson.g_font):
+        print('Failed to build glyph atlas!')
+        lesson.close()
+        return 1
+
+    info = sdl2.SDL_RendererInfo()
+    sdl2.SDL_GetRendererInfo(lesson.g_renderer, ctypes.byref(info))
+    print(f'{info.name.decode()} renderer')
+    for changing in (True, False):
+        print(f'{"labels":>8} {"changing":>8} {"rendered text fps":>18} {"glyph atlas fps":>16} {"speedup":>8}')
+        for label_count in LABEL_COUNTS:
+            labels = [lesson.LTexture() for _ in range(label_count)]
+            old_fps = run(lambda frame: draw_rendered_text(labels, frame, color, changing))
+            for label in labels:
+                label.free()
+            new_fps = run(lambda frame: draw_glyph_atlas(atlas, label_count, frame, color, changing))
+            print(f'{label_count:>8} {"yes" if changing else "no":>8} {old_fps:>18.1f} {new_fps:>16.1f} {new_fps/old_fps:>7.1f}x')
+
+    atlas.free()
+    lesson.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+import os
+import sys
+import ctypes
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import sdl2
+
+import main as lesson
+import bench_text
+
+try:
+    import resource
+except ImportError:
+    # NOTE: no resource module on Windows; only the texture registry gets checked there.
+    resource = None
+
+# NOTE: runs the body of the capped frame rate loop (minus the cap) for a long time and
+# checks that nothing grows. the label is deliberately re-rendered with
+# load_from_rendered_text every frame since that is the path that used to leak a texture
+# per frame.
+SOAK_FRAMES = 100000
+WARMUP_FRAMES = 1000
+SAMPLE_EVERY = 10000
+RSS_TOLERANCE_KB = 8 * 1024
+# NOTE: the label texture is as wide as its text, so its size wobbles a little.
+BYTES_TOLERANCE = 16 * 1024
+
+def get_peak_rss_kb():
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # NOTE: linux reports kilobytes, macOS reports bytes.
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+def main():
+    if not bench_text.init():
+        print('Failed to initialize!')
+        lesson.close()
+        return 1
+    if not lesson.load_media():
+        print('Failed to load media!')
+        lesson.close()
+        return 1
+
+    e = sdl2.SDL_Event()
+    color = sdl2.SDL_Color(r=0, g=0, b=0, a=255)
+    label = lesson.LTexture()
+    fps_timer = lesson.LTimer()
+    fps_timer.start()
+    baseline = None
+    for frame in range(SOAK_FRAMES):
+        while sdl2.SDL_PollEvent(ctypes.byref(e)) != 0:
+            pass
+
+        time_text = f'Frame {frame} Ticks {fps_timer.get_ticks()}'
+        label.load_from_rendered_text(time_text, color)
+
+        sdl2.SDL_SetRenderDrawColor(lesson.g_renderer, 0xff, 0xff, 0xff, 0xff)
+        sdl2.SDL_RenderClear(lesson.g_renderer)
+        lesson.g_prompt.render((lesson.SCREEN_WIDTH - lesson.g_prompt.get_width())//2, 0)
+        label.render(0, lesson.SCREEN_HEIGHT//2)
+        lesson.g_text_atlas.render_text(time_text, 0, lesson.SCREEN_HEIGHT//2 + 20, color)
+        sdl2.SDL_RenderPresent(lesson.g_renderer)
+
+        if frame + 1 == WARMUP_FRAMES or (frame + 1) % SAMPLE_EVERY == 0:
+            sample = (
+                lesson.g_texture_registry.get_live_count(),
+                lesson.g_texture_registry.get_live_bytes(),
+                get_peak_rss_kb(),
+            )
+            print(f'frame {frame + 1:>7}: {sample[0]} live textures, {sample[1]} bytes, peak RSS {sample[2]} KB')
+            if baseline is None:
+                baseline = sample
+
+    label.free()
+    failed = False
+    if sample[0] != baseline[0] or sample[1] - baseline[1] > BYTES_TOLERANCE:
+        print(f'Texture registry grew from {baseline[0]} textures/{baseline[1]} bytes to {sample[0]}/{sample[1]}!')
+        failed = True
+    if sample[2] - baseline[2] > RSS_TOLERANCE_KB:
+        print(f'Peak RSS grew by {sample[2] - baseline[2]} KB (tolerance {RSS_TOLERANCE_KB} KB)!')
+        failed = True
+
+    lesson.close()
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,14 +1,155 @@
+import os
 import sys
 import ctypes
 import sdl2
 import sdl2.sdlimage
 import sdl2.sdlttf
+from collections import OrderedDict
 from dataclasses import dataclass
 
 SCREEN_WIDTH = 640
 SCREEN_HEIGHT = 480
 
 
+# NOTE: the cache keeps textures that nothing uses anymore around until it has to make
+# room, so loading the same file again (e.g. when switching back to a scene) is free.
+TEXTURE_CACHE_BUDGET = 64 * 1024 * 1024
+# NOTE: i switched to cyan here because bright magenta is killing my eyes
+DEFAULT_COLOR_KEY = (0, 0xff, 0xff)
+
+class TextureRegistry:
+    # NOTE: every SDL_Texture an LTexture creates is handed over to this registry, and
+    # LTexture.free only gives its reference back. a texture is destroyed the moment its
+    # last reference is released, and whatever is left gets destroyed in close() before
+    # the renderer goes away.
+    def __init__(self):
+        # address of the SDL_Texture -> [texture, reference count, estimated bytes]
+        self._entries = {}
+
+    def adopt(self, texture):
+        fmt = ctypes.c_uint32()
+        w = ctypes.c_int()
+        h = ctypes.c_int()
+        sdl2.SDL_QueryTexture(texture, ctypes.byref(fmt), None, ctypes.byref(w), ctypes.byref(h))
+        self._entries[ctypes.addressof(texture.contents)] = [texture, 1, w.value * h.value * sdl2.SDL_BYTESPERPIXEL(fmt.value)]
+        return texture
+
+    def retain(self, texture):
+        self._entries[ctypes.addressof(texture.contents)][1] += 1
+        return texture
+
+    def release(self, texture):
+        key = ctypes.addressof(texture.contents)
+        entry = self._entries[key]
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self._entries[key]
+            sdl2.SDL_DestroyTexture(texture)
+
+    def get_ref_count(self, texture):
+        return self._entries[ctypes.addressof(texture.contents)][1]
+
+    def get_live_count(self):
+        return len(self._entries)
+
+    def get_live_bytes(self):
+        return sum(entry[2] for entry in self._entries.values())
+
+    def destroy_all(self):
+        for texture, _, _ in self._entries.values():
+            sdl2.SDL_DestroyTexture(texture)
+        self._entries = {}
+
+class TextureCache:
+    # NOTE: textures belong to the renderer that created them, so the renderer is part of
+    # the key as well as the path, the file's mtime (so an edited file is loaded again) and
+    # the color key.
+    # the textures themselves are owned by g_texture_registry like any other LTexture
+    # texture. the cache holds one reference to each of them and retains another one for
+    # every acquire(), which LTexture.free gives back to the registry. a texture that only
+    # the cache still holds is unused and can be evicted.
+    def __init__(self, byte_budget: int = TEXTURE_CACHE_BUDGET):
+        self.byte_budget = byte_budget
+        # key -> [texture, width, height, estimated bytes], oldest first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def acquire(self, renderer, p: str, color_key=DEFAULT_COLOR_KEY):
+        try:
+            mtime = os.path.getmtime(p)
+        except OSError as e:
+            print(f'Unable to load image {p}! {e}')
+            return None
+        key = (ctypes.addressof(renderer.contents), os.path.abspath(p), mtime, color_key)
+        entry = self._entries.get(key)
+        if entry:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            g_texture_registry.retain(entry[0])
+            return entry
+
+        self.misses += 1
+        surface = sdl2.sdlimage.IMG_Load(p.encode())
+        if not surface:
+            print(f'Unable to load image {p}! SDL_image Error: {sdl2.sdlimage.IMG_GetError().decode()}')
+            return None
+        if color_key is not None:
+            sdl2.SDL_SetColorKey(surface, sdl2.SDL_TRUE, sdl2.SDL_MapRGB(surface.contents.format, *color_key))
+        new_texture = sdl2.SDL_CreateTextureFromSurface(renderer, surface)
+        if not new_texture:
+            print(f'Unable to create texture from {p}! SDL Error: {sdl2.SDL_GetError().decode()}')
+            entry = None
+        else:
+            # NOTE: SDL_CreateTextureFromSurface picks a 4-bytes-per-pixel format for
+            # everything we load, so this is a good enough estimate.
+            entry = [g_texture_registry.adopt(new_texture), surface.contents.w, surface.contents.h, surface.contents.w * surface.contents.h * 4]
+            self._entries[key] = entry
+            self._bytes += entry[3]
+            g_texture_registry.retain(new_texture)
+            self._evict()
+        sdl2.SDL_FreeSurface(surface)
+        return entry
+
+    def _evict(self):
+        # NOTE: textures that are still in use can't be evicted, so the cache can end up over
+        # budget if everything in it is in use. unused textures are only evicted when a new
+        # one is loaded.
+        if self._bytes <= self.byte_budget:
+            return
+        for key, entry in list(self._entries.items()):
+            if self._bytes <= self.byte_budget:
+                break
+            if g_texture_registry.get_ref_count(entry[0]) == 1:
+                self._remove(key)
+                self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry[3]
+        g_texture_registry.release(entry[0])
+
+    def clear(self, renderer):
+        # NOTE: call this before destroying the renderer. there's nothing to clear if
+        # creating the renderer failed. textures that are still in use stay alive until
+        # their LTextures free them.
+        if not renderer:
+            return
+        renderer_address = ctypes.addressof(renderer.contents)
+        for key in [key for key in self._entries if key[0] == renderer_address]:
+            self._remove(key)
+
+    def get_stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'textures': len(self._entries),
+            'bytes': self._bytes,
+        }
+
 class LTexture:
     def __init__(self):
         self._texture = None
@@ -16,6 +157,7 @@ class LTexture:
         self._height = None
 
         self._destroyed = True
+        self._render_quad = sdl2.SDL_Rect()
 
     def get_width(self):
         return self._width
@@ -23,25 +165,15 @@ class LTexture:
     def get_height(self):
         return self._height
 
-    def load_from_file(self, p: str) -> bool :
+    # NOTE: textures loaded from a file are shared through g_texture_cache, so changing the
+    # color/alpha/blend mode of one LTexture changes it for every LTexture of the same file.
+    def load_from_file(self, p: str, color_key=DEFAULT_COLOR_KEY) -> bool :
         self.free()
-        new_texture = None
-        surface = sdl2.sdlimage.IMG_Load(p.encode())
-        if not surface:
-            print(f'Unable to load image {p}! SDL_image Error: {sdl2.sdlimage.IMG_GetError().decode()}')
-        else:
-            # NOTE: i switched to cyan here because bright magenta is killing my eyes
-            sdl2.SDL_SetColorKey(surface, sdl2.SDL_TRUE, sdl2.SDL_MapRGB(surface.contents.format, 0, 0xff, 0xff))
-            new_texture = sdl2.SDL_CreateTextureFromSurface(g_renderer, surface)
-            if not new_texture:
-                print(f'Unable to create texture from {p}! SDL Error: {sdl2.SDL_GetError().decode()}')
-            else:
-                self._width = surface.contents.w
-                self._height = surface.contents.h
-                self._destroyed = False
-                self._texture = new_texture
-            sdl2.SDL_FreeSurface(surface)
-        return new_texture is not None
+        entry = g_texture_cache.acquire(g_renderer, p, color_key)
+        if entry:
+            self._texture, self._width, self._height = entry[0], entry[1], entry[2]
+            self._destroyed = False
+        return entry is not None
 
     def load_from_rendered_text(self, texture_text: str, color: sdl2.SDL_Color):
         self.free()
@@ -49,14 +181,16 @@ class LTexture:
         if not text_surface:
             print(f'Unable to render text surface! SDL_ttf Error: {sdl2.sdlttf.TTF_GetError().decode()}')
         else:
-            self._texture = sdl2.SDL_CreateTextureFromSurface(g_renderer, text_surface)
-            if not self._texture:
+            new_texture = sdl2.SDL_CreateTextureFromSurface(g_renderer, text_surface)
+            if not new_texture:
                 print(f'Unable to create texture from rendered text! SDL Error: {sdl2.SDL_GetError().decode()}')
             else:
                 self._width = text_surface.contents.w
                 self._height = text_surface.contents.h
+                self._destroyed = False
+                self._texture = g_texture_registry.adopt(new_texture)
             sdl2.SDL_FreeSurface(text_surface)
-        return self._texture is not None
+        return not self._destroyed
 
     def render(self,
             x: int, y: int,
@@ -65,16 +199,26 @@ class LTexture:
             center: sdl2.SDL_Point = None,
             flip: sdl2.SDL_RendererFlip = sdl2.SDL_FLIP_NONE
     ):
-        render_quad = sdl2.SDL_Rect(x=x,y=y,w=self._width, h=self._height)
+        # NOTE: the quad is reused instead of making a new SDL_Rect on every call, and the
+        # plain SDL_RenderCopy is enough when there's nothing to rotate or flip.
+        render_quad = self._render_quad
+        render_quad.x = x
+        render_quad.y = y
         if clip:
             render_quad.w = clip.w
             render_quad.h = clip.h
-        sdl2.SDL_RenderCopyEx(g_renderer, self._texture,
-            clip,
-            render_quad,
-            angle, center,
-            flip,
-        )
+        else:
+            render_quad.w = self._width
+            render_quad.h = self._height
+        if angle == 0 and flip == sdl2.SDL_FLIP_NONE:
+            sdl2.SDL_RenderCopy(g_renderer, self._texture, clip, render_quad)
+        else:
+            sdl2.SDL_RenderCopyEx(g_renderer, self._texture,
+                clip,
+                render_quad,
+                angle, center,
+                flip,
+            )
     
     def set_color(self, red: int, green: int, blue: int):
         sdl2.SDL_SetTextureColorMod(self._texture, red, green, blue)
@@ -85,19 +229,165 @@ class LTexture:
     def set_alpha(self, alpha: int):
         sdl2.SDL_SetTextureAlphaMod(self._texture, alpha)
     
+    def share(self, other):
+        # NOTE: both LTextures end up drawing the same SDL_Texture; it is only destroyed
+        # once both of them are freed.
+        self.free()
+        if not other._destroyed:
+            self._texture = g_texture_registry.retain(other._texture)
+            self._width = other._width
+            self._height = other._height
+            self._destroyed = False
+
     def free(self):
         if not self._destroyed and self._texture:
-            sdl2.SDL_DestroyTexture(self._texture)
+            g_texture_registry.release(self._texture)
+            self._texture = None
             self._width = 0
             self._height = 0
+        self._destroyed = True
+
+# NOTE: update() runs this many times per second no matter how fast frames are drawn.
+GAME_TICK_RATE = 60
+# NOTE: if a frame took so long that more updates than this are due, the rest are dropped
+# instead of caught up on; otherwise a slow update makes the next frame slower still and the
+# loop never recovers (the "spiral of death").
+GAME_MAX_UPDATES_PER_FRAME = 5
+# NOTE: SDL_Delay often oversleeps by a millisecond or two, so waiting for the next frame
+# sleeps until this close to the deadline and busy-waits the rest.
+GAME_SPIN_MS = 2
+
+GAME_PHASES = ('events', 'update', 'render', 'wait')
+
+class GameLoop:
+    # NOTE: fixed timestep loop. handle_events() returns False to quit, update(dt) advances
+    # the game by dt seconds and render(alpha) draws it, where alpha (0..1) is how far we are
+    # between the last update and the next one so positions can be interpolated.
+    # frame_rate=None leaves the pacing to vsync.
+    def __init__(self,
+            tick_rate: int = GAME_TICK_RATE,
+            frame_rate: int = None,
+            max_updates_per_frame: int = GAME_MAX_UPDATES_PER_FRAME,
+    ):
+        self._frequency = sdl2.SDL_GetPerformanceFrequency()
+        self._tick_rate = tick_rate
+        self._tick_counts = self._frequency / tick_rate
+        self._frame_counts = self._frequency / frame_rate if frame_rate else 0
+        self._max_updates_per_frame = max_updates_per_frame
+        self._running = False
+        self.reset_stats()
+
+    def reset_stats(self):
+        self._frames = 0
+        self._updates = 0
+        self._dropped_updates = 0
+        self._elapsed_counts = 0
+        # phase -> [total counts, worst counts]
+        self._phase_counts = {phase: [0, 0] for phase in GAME_PHASES}
+
+    def _add_phase(self, phase: str, counts: int):
+        total_and_worst = self._phase_counts[phase]
+        total_and_worst[0] += counts
+        if counts > total_and_worst[1]:
+            total_and_worst[1] = counts
+
+    def stop(self):
+        self._running = False
+
+    def run(self, handle_events, update, render):
+        get_counter = sdl2.SDL_GetPerformanceCounter
+        dt = 1 / self._tick_rate
+        tick_counts = self._tick_counts
+        frame_counts = self._frame_counts
+        accumulator = 0
+        previous = get_counter()
+        next_frame = previous + frame_counts
+        self._running = True
+        while self._running:
+            frame_start = get_counter()
+            accumulator += frame_start - previous
+            self._elapsed_counts += frame_start - previous
+            previous = frame_start
+
+            if not handle_events():
+                break
+            events_end = get_counter()
+
+            updates = 0
+            while accumulator >= tick_counts and updates < self._max_updates_per_frame:
+                update(dt)
+                accumulator -= tick_counts
+                updates += 1
+            if accumulator >= tick_counts:
+                dropped = int(accumulator // tick_counts)
+                self._dropped_updates += dropped
+                accumulator -= dropped * tick_counts
+            self._updates += updates
+            update_end = get_counter()
+
+            render(accumulator / tick_counts)
+            render_end = get_counter()
+
+            if frame_counts:
+                # NOTE: frames are scheduled on a fixed grid so rounding doesn't add up; after
+                # falling behind by more than a frame the grid restarts from now.
+                if render_end - next_frame > frame_counts:
+                    next_frame = render_end
+                else:
+                    self._wait_until(next_frame)
+                next_frame += frame_counts
+            wait_end = get_counter()
+
+            self._frames += 1
+            self._add_phase('events', events_end - frame_start)
+            self._add_phase('update', update_end - events_end)
+            self._add_phase('render', render_end - update_end)
+            self._add_phase('wait', wait_end - render_end)
+        self._running = False
+
+    def _wait_until(self, deadline):
+        get_counter = sdl2.SDL_GetPerformanceCounter
+        spin_counts = self._frequency * GAME_SPIN_MS / 1000
+        remaining = deadline - get_counter()
+        if remaining > spin_counts:
+            sdl2.SDL_Delay(int((remaining - spin_counts) * 1000 / self._frequency))
+        while get_counter() < deadline:
+            pass
+
+    def get_stats(self):
+        # NOTE: times are in milliseconds, averaged per frame.
+        to_ms = 1000 / self._frequency
+        frames = self._frames or 1
+        stats = {
+            'frames': self._frames,
+            'updates': self._updates,
+            'dropped_updates': self._dropped_updates,
+            'fps': self._frames / (self._elapsed_counts / self._frequency) if self._elapsed_counts else 0,
+        }
+        for phase, (total, worst) in self._phase_counts.items():
+            stats[f'{phase}_ms'] = total * to_ms / frames
+            stats[f'{phase}_max_ms'] = worst * to_ms
+        return stats
 
 g_window = None
 g_renderer = None
+g_texture_registry = TextureRegistry()
+g_texture_cache = TextureCache()
 g_dot_texture = LTexture()
 
 DOT_WIDTH = 20
 DOT_HEIGHT = 20
+# NOTE: pixels per update; updates run at GAME_TICK_RATE so the speed no longer depends on
+# the refresh rate of the display.
 DOT_VEL = 10
+# NOTE: key -> change of velocity, one dict lookup per key press instead of an if/elif
+# chain.
+DOT_KEY_VELOCITIES = {
+    sdl2.SDLK_UP: (0, -DOT_VEL),
+    sdl2.SDLK_DOWN: (0, DOT_VEL),
+    sdl2.SDLK_LEFT: (-DOT_VEL, 0),
+    sdl2.SDLK_RIGHT: (DOT_VEL, 0),
+}
 @dataclass
 class Dot:
     pos_x: int = 0
@@ -105,14 +395,22 @@ class Dot:
     vel_x: int = 0
     vel_y: int = 0
 
+    def __post_init__(self):
+        # NOTE: where the dot was before the last move, so render() can draw it in between.
+        self.prev_x = self.pos_x
+        self.prev_y = self.pos_y
+
     def handle_event(self, e):
         if e.type == sdl2.SDL_KEYDOWN and e.key.repeat == 0:
-            if e.key.keysym.sym == sdl2.SDLK_UP: self.vel_y -= DOT_VEL
-            elif e.key.keysym.sym == sdl2.SDLK_DOWN: self.vel_y += DOT_VEL
-            elif e.key.keysym.sym == sdl2.SDLK_LEFT: self.vel_x -= DOT_VEL
-            elif e.key.keysym.sym == sdl2.SDLK_RIGHT: self.vel_x += DOT_VEL
+            velocity = DOT_KEY_VELOCITIES.get(e.key.keysym.sym)
+            if velocity:
+                self.vel_x += velocity[0]
+                self.vel_y += velocity[1]
     
     def move(self):
+        self.prev_x = self.pos_x
+        self.prev_y = self.pos_y
+
         self.pos_x += self.vel_x
         if self.pos_x < 0 or (self.pos_x + DOT_WIDTH > SCREEN_WIDTH):
             self.pos_x -= self.vel_x
@@ -121,8 +419,10 @@ class Dot:
         if self.pos_y < 0 or (self.pos_y + DOT_HEIGHT > SCREEN_HEIGHT):
             self.pos_y -= self.vel_y
 
-    def render(self):
-        g_dot_texture.render(self.pos_x, self.pos_y)
+    def render(self, alpha: float = 1):
+        x = round(self.prev_x + (self.pos_x - self.prev_x) * alpha)
+        y = round(self.prev_y + (self.pos_y - self.prev_y) * alpha)
+        g_dot_texture.render(x, y)
 
 def init():
     global g_window, g_renderer
@@ -173,6 +473,8 @@ def close():
 
     g_dot_texture.free()
 
+    g_texture_cache.clear(g_renderer)
+    g_texture_registry.destroy_all()
     sdl2.SDL_DestroyRenderer(g_renderer)
     g_renderer = None
     sdl2.SDL_DestroyWindow(g_window)
@@ -188,23 +490,37 @@ def main():
         if not load_media():
             print('Failed to load media!')
         else:
-            quit = False
             e = sdl2.SDL_Event()
 
             dot = Dot()
-            while not quit:
+            loop = GameLoop()
+
+            def handle_events():
+                quit = False
                 while sdl2.SDL_PollEvent(ctypes.byref(e)) != 0:
                     if e.type == sdl2.SDL_QUIT:
                         quit = True
                     dot.handle_event(e)
+                return not quit
 
+            def update(dt: float):
                 dot.move()
+
+            def render(alpha: float):
                 sdl2.SDL_SetRenderDrawColor(g_renderer, 0xff, 0xff, 0xff, 0xff)
                 sdl2.SDL_RenderClear(g_renderer)
-                
-                dot.render()
+
+                dot.render(alpha)
 
                 sdl2.SDL_RenderPresent(g_renderer)
+
+            loop.run(handle_events, update, render)
+
+            # NOTE: where the frame time went, per phase: the average and the worst frame.
+            stats = loop.get_stats()
+            print(f'{stats["frames"]} frames at {stats["fps"]:.1f} FPS, {stats["updates"]} updates, {stats["dropped_updates"]} dropped')
+            for phase in GAME_PHASES:
+                print(f'{phase:>6} {stats[f"{phase}_ms"]:.2f} ms avg. {stats[f"{phase}_max_ms"]:.2f} ms max')
     
     close()
     return 0
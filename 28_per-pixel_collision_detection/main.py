@@ -1,13 +1,255 @@
+import os
 import sys
 import ctypes
 import sdl2
 import sdl2.sdlimage
 import sdl2.sdlttf
+from collections import OrderedDict
 from dataclasses import dataclass
 
 SCREEN_WIDTH = 640
 SCREEN_HEIGHT = 480
 
+# NOTE: the cache keeps textures that nothing uses anymore around until it has to make
+# room, so loading the same file again (e.g. when switching back to a scene) is free.
+TEXTURE_CACHE_BUDGET = 64 * 1024 * 1024
+# NOTE: i switched to cyan here because bright magenta is killing my eyes
+DEFAULT_COLOR_KEY = (0, 0xff, 0xff)
+
+# NOTE: pixels with at least this much alpha count as solid for collisions.
+MASK_ALPHA_THRESHOLD = 128
+MASK_ALPHA_TABLE = bytes(b'1'[0] if a >= MASK_ALPHA_THRESHOLD else b'0'[0] for a in range(256))
+
+class LBitmask:
+    # NOTE: one python int per row of the image, with bit x set when pixel x is solid.
+    # python ints AND a whole machine word at a time, so testing two masks against each
+    # other is one shift and one AND per overlapping row instead of a test per pixel.
+    def __init__(self, width: int, height: int, rows: list):
+        self._width = width
+        self._height = height
+        self._rows = rows
+
+    def get_width(self):
+        return self._width
+
+    def get_height(self):
+        return self._height
+
+    def overlaps(self, x: int, y: int, other, other_x: int, other_y: int):
+        dx = other_x - x
+        dy = other_y - y
+        if dx >= self._width or -dx >= other._width:
+            return False
+        top = max(0, dy)
+        bottom = min(self._height, dy + other._height)
+        rows = self._rows
+        other_rows = other._rows
+        if dx >= 0:
+            for row in range(top, bottom):
+                if rows[row] & (other_rows[row - dy] << dx):
+                    return True
+        else:
+            for row in range(top, bottom):
+                if rows[row] & (other_rows[row - dy] >> -dx):
+                    return True
+        return False
+
+    def get_rects(self):
+        # NOTE: cuts every row into runs of solid pixels and grows a rect downwards for as
+        # long as the next row has exactly the same run. the rects cover exactly the solid
+        # pixels; for round shapes like the dot that's one rect per distinct row width,
+        # though for arbitrary shapes it isn't always the fewest rects possible.
+        rects = []
+        open_rects = {}
+        for y, bits in enumerate(self._rows):
+            next_open_rects = {}
+            x = 0
+            while bits:
+                gap = (bits & -bits).bit_length() - 1
+                bits >>= gap
+                x += gap
+                run = (~bits & (bits + 1)).bit_length() - 1
+                rect = open_rects.pop((x, run), None)
+                if rect:
+                    rect[3] += 1
+                else:
+                    rect = [x, y, run, 1]
+                next_open_rects[(x, run)] = rect
+                bits >>= run
+                x += run
+            rects.extend(open_rects.values())
+            open_rects = next_open_rects
+        rects.extend(open_rects.values())
+        rects.sort(key=lambda rect: (rect[1], rect[0]))
+        return [sdl2.SDL_Rect(x=x, y=y, w=w, h=h) for x, y, w, h in rects]
+
+def create_bitmask_from_surface(surface):
+    # NOTE: converting to RGBA turns color-keyed pixels fully transparent, so this works for
+    # color-keyed and alpha images alike.
+    converted = sdl2.SDL_ConvertSurfaceFormat(surface, sdl2.SDL_PIXELFORMAT_RGBA32, 0)
+    if not converted:
+        print(f'Unable to convert surface for collision mask! SDL Error: {sdl2.SDL_GetError().decode()}')
+        return None
+    width = converted.contents.w
+    height = converted.contents.h
+    pitch = converted.contents.pitch
+    pixels = ctypes.string_at(converted.contents.pixels, pitch * height)
+    rows = []
+    for y in range(height):
+        # every 4th byte starting at 3 is alpha. reversed so that pixel 0 is the lowest bit.
+        alpha = pixels[y * pitch + 3 : y * pitch + width * 4 : 4]
+        rows.append(int(alpha.translate(MASK_ALPHA_TABLE)[::-1], 2) if width else 0)
+    sdl2.SDL_FreeSurface(converted)
+    return LBitmask(width, height, rows)
+
+class TextureRegistry:
+    # NOTE: every SDL_Texture an LTexture creates is handed over to this registry, and
+    # LTexture.free only gives its reference back. a texture is destroyed the moment its
+    # last reference is released, and whatever is left gets destroyed in close() before
+    # the renderer goes away.
+    def __init__(self):
+        # address of the SDL_Texture -> [texture, reference count, estimated bytes]
+        self._entries = {}
+
+    def adopt(self, texture):
+        fmt = ctypes.c_uint32()
+        w = ctypes.c_int()
+        h = ctypes.c_int()
+        sdl2.SDL_QueryTexture(texture, ctypes.byref(fmt), None, ctypes.byref(w), ctypes.byref(h))
+        self._entries[ctypes.addressof(texture.contents)] = [texture, 1, w.value * h.value * sdl2.SDL_BYTESPERPIXEL(fmt.value)]
+        return texture
+
+    def retain(self, texture):
+        self._entries[ctypes.addressof(texture.contents)][1] += 1
+        return texture
+
+    def release(self, texture):
+        key = ctypes.addressof(texture.contents)
+        entry = self._entries[key]
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self._entries[key]
+            sdl2.SDL_DestroyTexture(texture)
+
+    def get_ref_count(self, texture):
+        return self._entries[ctypes.addressof(texture.contents)][1]
+
+    def get_live_count(self):
+        return len(self._entries)
+
+    def get_live_bytes(self):
+        return sum(entry[2] for entry in self._entries.values())
+
+    def destroy_all(self):
+        for texture, _, _ in self._entries.values():
+            sdl2.SDL_DestroyTexture(texture)
+        self._entries = {}
+
+class TextureCache:
+    # NOTE: textures belong to the renderer that created them, so the renderer is part of
+    # the key as well as the path, the file's mtime (so an edited file is loaded again) and
+    # the color key.
+    # the textures themselves are owned by g_texture_registry like any other LTexture
+    # texture. the cache holds one reference to each of them and retains another one for
+    # every acquire(), which LTexture.free gives back to the registry. a texture that only
+    # the cache still holds is unused and can be evicted.
+    def __init__(self, byte_budget: int = TEXTURE_CACHE_BUDGET):
+        self.byte_budget = byte_budget
+        # key -> [texture, width, height, estimated bytes, LBitmask or None], oldest first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _load_surface(self, p: str, color_key):
+        surface = sdl2.sdlimage.IMG_Load(p.encode())
+        if not surface:
+            print(f'Unable to load image {p}! SDL_image Error: {sdl2.sdlimage.IMG_GetError().decode()}')
+            return None
+        if color_key is not None:
+            sdl2.SDL_SetColorKey(surface, sdl2.SDL_TRUE, sdl2.SDL_MapRGB(surface.contents.format, *color_key))
+        return surface
+
+    def acquire(self, renderer, p: str, color_key=DEFAULT_COLOR_KEY, with_mask: bool = False):
+        # NOTE: the collision mask is built from the same surface as the texture and kept with
+        # it, so every LTexture of a file shares one mask. asking for a mask on a texture that
+        # was loaded without one loads the surface a second time, once.
+        try:
+            mtime = os.path.getmtime(p)
+        except OSError as e:
+            print(f'Unable to load image {p}! {e}')
+            return None
+        key = (ctypes.addressof(renderer.contents), os.path.abspath(p), mtime, color_key)
+        entry = self._entries.get(key)
+        if entry:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            g_texture_registry.retain(entry[0])
+            if with_mask and entry[4] is None:
+                surface = self._load_surface(p, color_key)
+                if surface:
+                    entry[4] = create_bitmask_from_surface(surface)
+                    sdl2.SDL_FreeSurface(surface)
+            return entry
+
+        self.misses += 1
+        surface = self._load_surface(p, color_key)
+        if not surface:
+            return None
+        new_texture = sdl2.SDL_CreateTextureFromSurface(renderer, surface)
+        if not new_texture:
+            print(f'Unable to create texture from {p}! SDL Error: {sdl2.SDL_GetError().decode()}')
+            entry = None
+        else:
+            # NOTE: SDL_CreateTextureFromSurface picks a 4-bytes-per-pixel format for
+            # everything we load, so this is a good enough estimate.
+            mask = create_bitmask_from_surface(surface) if with_mask else None
+            entry = [g_texture_registry.adopt(new_texture), surface.contents.w, surface.contents.h, surface.contents.w * surface.contents.h * 4, mask]
+            self._entries[key] = entry
+            self._bytes += entry[3]
+            g_texture_registry.retain(new_texture)
+            self._evict()
+        sdl2.SDL_FreeSurface(surface)
+        return entry
+
+    def _evict(self):
+        # NOTE: textures that are still in use can't be evicted, so the cache can end up over
+        # budget if everything in it is in use. unused textures are only evicted when a new
+        # one is loaded.
+        if self._bytes <= self.byte_budget:
+            return
+        for key, entry in list(self._entries.items()):
+            if self._bytes <= self.byte_budget:
+                break
+            if g_texture_registry.get_ref_count(entry[0]) == 1:
+                self._remove(key)
+                self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry[3]
+        g_texture_registry.release(entry[0])
+
+    def clear(self, renderer):
+        # NOTE: call this before destroying the renderer. there's nothing to clear if
+        # creating the renderer failed. textures that are still in use stay alive until
+        # their LTextures free them.
+        if not renderer:
+            return
+        renderer_address = ctypes.addressof(renderer.contents)
+        for key in [key for key in self._entries if key[0] == renderer_address]:
+            self._remove(key)
+
+    def get_stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'textures': len(self._entries),
+            'bytes': self._bytes,
+        }
+
 class LTexture:
     def __init__(self):
         self._texture = None
@@ -15,6 +257,8 @@ class LTexture:
         self._height = None
 
         self._destroyed = True
+        self._mask = None
+        self._render_quad = sdl2.SDL_Rect()
 
     def get_width(self):
         return self._width
@@ -22,25 +266,18 @@ class LTexture:
     def get_height(self):
         return self._height
 
-    def load_from_file(self, p: str) -> bool :
+    def get_mask(self):
+        return self._mask
+
+    # NOTE: textures loaded from a file are shared through g_texture_cache, so changing the
+    # color/alpha/blend mode of one LTexture changes it for every LTexture of the same file.
+    def load_from_file(self, p: str, color_key=DEFAULT_COLOR_KEY, with_mask: bool = False) -> bool :
         self.free()
-        new_texture = None
-        surface = sdl2.sdlimage.IMG_Load(p.encode())
-        if not surface:
-            print(f'Unable to load image {p}! SDL_image Error: {sdl2.sdlimage.IMG_GetError().decode()}')
-        else:
-            # NOTE: i switched to cyan here because bright magenta is killing my eyes
-            sdl2.SDL_SetColorKey(surface, sdl2.SDL_TRUE, sdl2.SDL_MapRGB(surface.contents.format, 0, 0xff, 0xff))
-            new_texture = sdl2.SDL_CreateTextureFromSurface(g_renderer, surface)
-            if not new_texture:
-                print(f'Unable to create texture from {p}! SDL Error: {sdl2.SDL_GetError().decode()}')
-            else:
-                self._width = surface.contents.w
-                self._height = surface.contents.h
-                self._destroyed = False
-                self._texture = new_texture
-            sdl2.SDL_FreeSurface(surface)
-        return new_texture is not None
+        entry = g_texture_cache.acquire(g_renderer, p, color_key, with_mask)
+        if entry:
+            self._texture, self._width, self._height, self._mask = entry[0], entry[1], entry[2], entry[4]
+            self._destroyed = False
+        return entry is not None
 
     def load_from_rendered_text(self, texture_text: str, color: sdl2.SDL_Color):
         self.free()
@@ -48,14 +285,16 @@ class LTexture:
         if not text_surface:
             print(f'Unable to render text surface! SDL_ttf Error: {sdl2.sdlttf.TTF_GetError().decode()}')
         else:
-            self._texture = sdl2.SDL_CreateTextureFromSurface(g_renderer, text_surface)
-            if not self._texture:
+            new_texture = sdl2.SDL_CreateTextureFromSurface(g_renderer, text_surface)
+            if not new_texture:
                 print(f'Unable to create texture from rendered text! SDL Error: {sdl2.SDL_GetError().decode()}')
             else:
                 self._width = text_surface.contents.w
                 self._height = text_surface.contents.h
+                self._destroyed = False
+                self._texture = g_texture_registry.adopt(new_texture)
             sdl2.SDL_FreeSurface(text_surface)
-        return self._texture is not None
+        return not self._destroyed
 
     def render(self,
             x: int, y: int,
@@ -64,16 +303,26 @@ class LTexture:
             center: sdl2.SDL_Point = None,
             flip: sdl2.SDL_RendererFlip = sdl2.SDL_FLIP_NONE
     ):
-        render_quad = sdl2.SDL_Rect(x=x,y=y,w=self._width, h=self._height)
+        # NOTE: the quad is reused instead of making a new SDL_Rect on every call, and the
+        # plain SDL_RenderCopy is enough when there's nothing to rotate or flip.
+        render_quad = self._render_quad
+        render_quad.x = x
+        render_quad.y = y
         if clip:
             render_quad.w = clip.w
             render_quad.h = clip.h
-        sdl2.SDL_RenderCopyEx(g_renderer, self._texture,
-            clip,
-            render_quad,
-            angle, center,
-            flip,
-        )
+        else:
+            render_quad.w = self._width
+            render_quad.h = self._height
+        if angle == 0 and flip == sdl2.SDL_FLIP_NONE:
+            sdl2.SDL_RenderCopy(g_renderer, self._texture, clip, render_quad)
+        else:
+            sdl2.SDL_RenderCopyEx(g_renderer, self._texture,
+                clip,
+                render_quad,
+                angle, center,
+                flip,
+            )
     
     def set_color(self, red: int, green: int, blue: int):
         sdl2.SDL_SetTextureColorMod(self._texture, red, green, blue)
@@ -84,19 +333,141 @@ class LTexture:
     def set_alpha(self, alpha: int):
         sdl2.SDL_SetTextureAlphaMod(self._texture, alpha)
     
+    def share(self, other):
+        # NOTE: both LTextures end up drawing the same SDL_Texture; it is only destroyed
+        # once both of them are freed.
+        self.free()
+        if not other._destroyed:
+            self._texture = g_texture_registry.retain(other._texture)
+            self._width = other._width
+            self._height = other._height
+            self._mask = other._mask
+            self._destroyed = False
+
     def free(self):
         if not self._destroyed and self._texture:
-            sdl2.SDL_DestroyTexture(self._texture)
+            g_texture_registry.release(self._texture)
+            self._texture = None
             self._width = 0
             self._height = 0
+        self._destroyed = True
+        self._mask = None
+
+def get_bounding_box(colliders):
+    left = min(rect.x for rect in colliders)
+    top = min(rect.y for rect in colliders)
+    right = max(rect.x + rect.w for rect in colliders)
+    bottom = max(rect.y + rect.h for rect in colliders)
+    return left, top, right, bottom
+
+SPATIAL_HASH_CELL_SIZE = 64
+
+class SpatialHash:
+    # NOTE: broadphase for check_collision. the level is cut into a uniform grid and every
+    # collider is filed under each cell its bounding box touches, so only colliders sharing
+    # a cell ever get to check_collision. objects are keyed by id() because Dot is a
+    # dataclass and dataclasses aren't hashable.
+    def __init__(self, cell_size: int = SPATIAL_HASH_CELL_SIZE):
+        self._cell_size = cell_size
+        # (column, row) -> {id: object}
+        self._cells = {}
+        # id -> [object, collider, cell range]
+        self._entries = {}
+
+    def _get_cell_range(self, collider):
+        left, top, right, bottom = get_bounding_box(collider)
+        cell_size = self._cell_size
+        return int(left // cell_size), int(top // cell_size), int(right // cell_size), int(bottom // cell_size)
+
+    def update(self, obj, collider):
+        # NOTE: the first call inserts obj. after that the grid is only touched when obj
+        # has moved into a different set of cells, which for small steps is rarely.
+        key = id(obj)
+        cell_range = self._get_cell_range(collider)
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry[1] = collider
+            if entry[2] == cell_range:
+                return
+            self._unlink(key, entry[2])
+            entry[2] = cell_range
+        else:
+            self._entries[key] = [obj, collider, cell_range]
+        cells = self._cells
+        left, top, right, bottom = cell_range
+        for column in range(left, right + 1):
+            for row in range(top, bottom + 1):
+                cell = cells.get((column, row))
+                if cell is None:
+                    cell = cells[(column, row)] = {}
+                cell[key] = obj
+
+    def remove(self, obj):
+        entry = self._entries.pop(id(obj), None)
+        if entry is not None:
+            self._unlink(id(obj), entry[2])
+
+    def _unlink(self, key, cell_range):
+        cells = self._cells
+        left, top, right, bottom = cell_range
+        for column in range(left, right + 1):
+            for row in range(top, bottom + 1):
+                cell = cells[(column, row)]
+                del cell[key]
+                if not cell:
+                    del cells[(column, row)]
+
+    def query(self, collider):
+        # NOTE: returns (object, collider) for everything sharing a cell with collider,
+        # which may include the object the collider belongs to.
+        cells = self._cells
+        entries = self._entries
+        found = {}
+        left, top, right, bottom = self._get_cell_range(collider)
+        for column in range(left, right + 1):
+            for row in range(top, bottom + 1):
+                cell = cells.get((column, row))
+                if cell:
+                    found.update(cell)
+        return [(entries[key][0], entries[key][1]) for key in found]
+
+    def get_pairs(self):
+        # NOTE: every pair of objects sharing at least one cell, each pair only once.
+        entries = self._entries
+        seen = set()
+        pairs = []
+        for cell in self._cells.values():
+            if len(cell) < 2:
+                continue
+            keys = list(cell)
+            for i in range(len(keys)):
+                for j in range(i + 1, len(keys)):
+                    a = keys[i]
+                    b = keys[j]
+                    pair = (a, b) if a < b else (b, a)
+                    if pair not in seen:
+                        seen.add(pair)
+                        pairs.append(((entries[a][0], entries[a][1]), (entries[b][0], entries[b][1])))
+        return pairs
 
 g_window = None
 g_renderer = None
+g_texture_registry = TextureRegistry()
+g_texture_cache = TextureCache()
 g_dot_texture = LTexture()
+g_spatial_hash = SpatialHash()
 
 DOT_WIDTH = 20
 DOT_HEIGHT = 20
 DOT_VEL = 1
+# NOTE: key -> change of velocity, one dict lookup per key press instead of an if/elif
+# chain.
+DOT_KEY_VELOCITIES = {
+    sdl2.SDLK_UP: (0, -DOT_VEL),
+    sdl2.SDLK_DOWN: (0, DOT_VEL),
+    sdl2.SDLK_LEFT: (-DOT_VEL, 0),
+    sdl2.SDLK_RIGHT: (DOT_VEL, 0),
+}
 @dataclass
 class Dot:
     pos_x: int = 0
@@ -105,48 +476,52 @@ class Dot:
     vel_y: int = 0
 
     def __post_init__(self):
-        self._colliders = [
-            sdl2.SDL_Rect(x=self.pos_x,y=self.pos_y,w=6,h=1),
-            sdl2.SDL_Rect(x=self.pos_x,y=self.pos_y,w=10,h=1),
-            sdl2.SDL_Rect(x=self.pos_x,y=self.pos_y,w=14,h=1),
-            sdl2.SDL_Rect(x=self.pos_x,y=self.pos_y,w=16,h=2),
-            sdl2.SDL_Rect(x=self.pos_x,y=self.pos_y,w=18,h=2),
-            sdl2.SDL_Rect(x=self.pos_x,y=self.pos_y,w=20,h=6),
-            sdl2.SDL_Rect(x=self.pos_x,y=self.pos_y,w=18,h=2),
-            sdl2.SDL_Rect(x=self.pos_x,y=self.pos_y,w=16,h=2),
-            sdl2.SDL_Rect(x=self.pos_x,y=self.pos_y,w=14,h=1),
-            sdl2.SDL_Rect(x=self.pos_x,y=self.pos_y,w=10,h=1),
-            sdl2.SDL_Rect(x=self.pos_x,y=self.pos_y,w=6,h=1),
-        ]
+        # NOTE: the colliders come from the dot texture's collision mask instead of being typed
+        # in by hand, so they match whatever dot.png looks like. needs load_media() first.
+        self._mask = g_dot_texture.get_mask()
+        self._colliders = self._mask.get_rects()
+        self._collider_offsets = [(rect.x, rect.y) for rect in self._colliders]
         self.shift_colliders()
 
     def handle_event(self, e):
         if e.type == sdl2.SDL_KEYDOWN and e.key.repeat == 0:
-            if e.key.keysym.sym == sdl2.SDLK_UP: self.vel_y -= DOT_VEL
-            elif e.key.keysym.sym == sdl2.SDLK_DOWN: self.vel_y += DOT_VEL
-            elif e.key.keysym.sym == sdl2.SDLK_LEFT: self.vel_x -= DOT_VEL
-            elif e.key.keysym.sym == sdl2.SDLK_RIGHT: self.vel_x += DOT_VEL
+            velocity = DOT_KEY_VELOCITIES.get(e.key.keysym.sym)
+            if velocity:
+                self.vel_x += velocity[0]
+                self.vel_y += velocity[1]
 
     def shift_colliders(self):
-        r = 0
-        for rect in self._colliders:
-            rect.x = int(self.pos_x + (DOT_WIDTH - rect.w)/2)
-            rect.y = int(self.pos_y + r)
-            r += rect.h
+        for rect, (offset_x, offset_y) in zip(self._colliders, self._collider_offsets):
+            rect.x = self.pos_x + offset_x
+            rect.y = self.pos_y + offset_y
     
-    def move(self, wall):
+    def move(self, spatial_hash: SpatialHash):
         self.pos_x += self.vel_x
         self.shift_colliders()
-        if self.pos_x < 0 or (self.pos_x + DOT_WIDTH > SCREEN_WIDTH) or check_collision(self._colliders, wall):
+        if self.pos_x < 0 or (self.pos_x + DOT_WIDTH > SCREEN_WIDTH) or self.collides(spatial_hash):
             self.pos_x -= self.vel_x
         self.shift_colliders()
 
 
         self.pos_y += self.vel_y
         self.shift_colliders()
-        if self.pos_y < 0 or (self.pos_y + DOT_HEIGHT > SCREEN_HEIGHT) or check_collision(self._colliders, wall):
+        if self.pos_y < 0 or (self.pos_y + DOT_HEIGHT > SCREEN_HEIGHT) or self.collides(spatial_hash):
             self.pos_y -= self.vel_y
             self.shift_colliders()
+        spatial_hash.update(self, self._colliders)
+
+    def collides(self, spatial_hash: SpatialHash):
+        for other, colliders in spatial_hash.query(self._colliders):
+            if other is self:
+                continue
+            # NOTE: two dots are tested pixel for pixel with their masks; anything else
+            # only has rects.
+            if type(other) == Dot:
+                if self._mask.overlaps(self.pos_x, self.pos_y, other._mask, other.pos_x, other.pos_y):
+                    return True
+            elif check_collision(self._colliders, colliders):
+                return True
+        return False
 
     def render(self):
         g_dot_texture.render(self.pos_x, self.pos_y)
@@ -207,7 +582,7 @@ def check_collision(a_list, b_list):
 def load_media():
     success = True
     
-    if not g_dot_texture.load_from_file('dot.png'):
+    if not g_dot_texture.load_from_file('dot.png', with_mask=True):
         print(f'Failed to load dot texture')
         return False
 
@@ -218,6 +593,8 @@ def close():
 
     g_dot_texture.free()
 
+    g_texture_cache.clear(g_renderer)
+    g_texture_registry.destroy_all()
     sdl2.SDL_DestroyRenderer(g_renderer)
     g_renderer = None
     sdl2.SDL_DestroyWindow(g_window)
@@ -238,13 +615,15 @@ def main():
 
             dot = Dot(0, 0)
             dot2 = Dot(SCREEN_WIDTH//4, SCREEN_HEIGHT//4)
+            g_spatial_hash.update(dot, dot.get_colliders())
+            g_spatial_hash.update(dot2, dot2.get_colliders())
             while not quit:
                 while sdl2.SDL_PollEvent(ctypes.byref(e)) != 0:
                     if e.type == sdl2.SDL_QUIT:
                         quit = True
                     dot.handle_event(e)
 
-                dot.move(dot2.get_colliders())
+                dot.move(g_spatial_hash)
                 sdl2.SDL_SetRenderDrawColor(g_renderer, 0xff, 0xff, 0xff, 0xff)
                 sdl2.SDL_RenderClear(g_renderer)
 
@@ -0,0 +1,89 @@
+import sys
+import time
+import random
+
+import main as lesson
+
+# NOTE: compares finding every colliding pair of dots by testing all pairs against the grid
+# get_dot_overlaps files the dots in, over a DotStore of array.array columns and one of
+# numpy arrays. the level grows with the dot count so the density stays the same, which is
+# what happens in a real game: more dots, more level. testing all pairs of 10k dots takes
+# minutes in python, so above BRUTE_FORCE_LIMIT it is timed on a random sample of pairs and
+# extrapolated.
+DOT_COUNTS = [100, 1000, 10000]
+LEVEL_AREA_PER_DOT = 60 * 60
+BRUTE_FORCE_LIMIT = 1000
+BRUTE_FORCE_SAMPLE = 200000
+
+def make_rows(count: int, rng: random.Random):
+    side = int((count * LEVEL_AREA_PER_DOT) ** 0.5)
+    return [(rng.randrange(side), rng.randrange(side)) for _ in range(count)]
+
+def get_colliders(rows):
+    return [lesson.Circle(x=x, y=y, r=lesson.DOT_WIDTH//2) for x, y in rows]
+
+def brute_force_pairs(rows):
+    pairs = set()
+    colliders = get_colliders(rows)
+    for i in range(len(colliders)):
+        a = colliders[i]
+        for j in range(i + 1, len(colliders)):
+            if lesson.check_collision(a, colliders[j]):
+                pairs.add((i, j))
+    return pairs
+
+def brute_force_estimate(rows, rng: random.Random):
+    colliders = get_colliders(rows)
+    sample = [rng.sample(colliders, 2) for _ in range(BRUTE_FORCE_SAMPLE)]
+    start = time.perf_counter()
+    for a, b in sample:
+        lesson.check_collision(a, b)
+    elapsed = time.perf_counter() - start
+    total_pairs = len(rows) * (len(rows) - 1) // 2
+    return elapsed / BRUTE_FORCE_SAMPLE * total_pairs
+
+def grid_pairs(rows, use_numpy: bool):
+    store = lesson.DotStore(use_numpy=use_numpy)
+    for x, y in rows:
+        store.add(x, y)
+    every_row = lesson.numpy.arange(store.count) if use_numpy else range(store.count)
+    start = time.perf_counter()
+    owner, others = lesson.get_dot_overlaps(store, every_row)
+    elapsed = (time.perf_counter() - start) * 1000
+    # NOTE: every pair comes back once from each side; the row of the owner is its
+    # position here since every row was asked for.
+    pairs = {(int(a), int(b)) for a, b in zip(owner, others) if a < b}
+    return pairs, elapsed
+
+def main():
+    rng = random.Random(42)
+    numpy_header = 'grid numpy ms' if lesson.NUMPY_AVAILABLE else 'grid numpy ms (n/a)'
+    print(f'{"dots":>6} {"all pairs ms":>14} {"grid python ms":>15} {numpy_header:>14} {"collisions":>11}')
+    for count in DOT_COUNTS:
+        rows = make_rows(count, rng)
+
+        if count <= BRUTE_FORCE_LIMIT:
+            start = time.perf_counter()
+            expected = brute_force_pairs(rows)
+            brute_force = f'{(time.perf_counter() - start) * 1000:.1f}'
+        else:
+            expected = None
+            brute_force = f'~{brute_force_estimate(rows, rng) * 1000:.0f} (est.)'
+
+        found, python_ms = grid_pairs(rows, False)
+        if expected is not None and found != expected:
+            print(f'The grid found {len(found)} collisions, all pairs found {len(expected)}!')
+            return 1
+
+        numpy_ms = float('nan')
+        if lesson.NUMPY_AVAILABLE:
+            numpy_found, numpy_ms = grid_pairs(rows, True)
+            if numpy_found != found:
+                print(f'The grid found {len(numpy_found)} collisions with numpy, {len(found)} without!')
+                return 1
+
+        print(f'{count:>6} {brute_force:>14} {python_ms:>15.1f} {numpy_ms:>14.1f} {len(found):>11}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,48 @@
+import sys
+import time
+import random
+
+import main as lesson
+
+# NOTE: times one frame of movement for a lot of moving dots with the move_dots system,
+# once over a DotStore of array.array columns (what the lesson uses without numpy) and once
+# over one of numpy arrays, and checks that both end up with the dots in the same places.
+# the level grows with the dot count so the density stays the same.
+DOT_COUNTS = [100, 1000, 10000]
+LEVEL_AREA_PER_DOT = 60 * 60
+FRAMES = 10
+
+def make_rows(count: int, rng: random.Random):
+    side = int((count * LEVEL_AREA_PER_DOT) ** 0.5)
+    rows = [(rng.randrange(side), rng.randrange(side), rng.choice((-1, 1)), rng.choice((-1, 1))) for _ in range(count)]
+    return side, rows
+
+def time_system(side: int, rows, use_numpy: bool):
+    store = lesson.DotStore(use_numpy=use_numpy)
+    for row in rows:
+        store.add(*row)
+    start = time.perf_counter()
+    for _ in range(FRAMES):
+        lesson.move_dots(store, (), side, side)
+    elapsed = time.perf_counter() - start
+    n = store.count
+    return elapsed / FRAMES * 1000, [int(x) for x in store.pos_x[:n]], [int(y) for y in store.pos_y[:n]]
+
+def main():
+    rng = random.Random(42)
+    numpy_header = 'numpy ms' if lesson.NUMPY_AVAILABLE else 'numpy ms (n/a)'
+    print(f'{"dots":>6} {"python ms":>10} {numpy_header:>15}')
+    for count in DOT_COUNTS:
+        side, rows = make_rows(count, rng)
+        python_ms, xs, ys = time_system(side, rows, False)
+        numpy_ms = float('nan')
+        if lesson.NUMPY_AVAILABLE:
+            numpy_ms, numpy_xs, numpy_ys = time_system(side, rows, True)
+            if numpy_xs != xs or numpy_ys != ys:
+                print('move_dots moved the dots differently with numpy!')
+                return 1
+        print(f'{count:>6} {python_ms:>10.2f} {numpy_ms:>15.2f}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+import sys
+import time
+import random
+import sdl2
+
+import main as lesson
+
+# NOTE: times the narrow phase on the candidate pairs a uniform grid hands out, once with
+# check_collision per pair and once with ColliderArrays (plain python and numpy), and
+# checks that all three agree. a fifth of the colliders are rects so every kind of pair
+# (rect/rect, circle/circle, circle/rect) shows up.
+COLLIDER_COUNTS = [100, 1000, 10000, 100000]
+LEVEL_AREA_PER_COLLIDER = 40 * 40
+RECT_SHARE = 0.2
+CELL_SIZE = 64
+
+def make_colliders(count: int, rng: random.Random):
+    side = int((count * LEVEL_AREA_PER_COLLIDER) ** 0.5)
+    colliders = []
+    for _ in range(count):
+        if rng.random() < RECT_SHARE:
+            colliders.append(sdl2.SDL_Rect(x=rng.randrange(side), y=rng.randrange(side), w=rng.randrange(5, 60), h=rng.randrange(5, 60)))
+        else:
+            colliders.append(lesson.Circle(x=rng.randrange(side), y=rng.randrange(side), r=lesson.DOT_WIDTH//2))
+    return colliders
+
+def get_candidates(colliders):
+    # NOTE: every pair of colliders whose bounding boxes share a cell of CELL_SIZE, each
+    # pair once. the lesson's grid only takes dots, and these are rects as well.
+    cells = {}
+    for i, collider in enumerate(colliders):
+        if type(collider) == lesson.Circle:
+            left, top, right, bottom = collider.x - collider.r, collider.y - collider.r, collider.x + collider.r, collider.y + collider.r
+        else:
+            left, top, right, bottom = collider.x, collider.y, collider.x + collider.w, collider.y + collider.h
+        for column in range(left // CELL_SIZE, right // CELL_SIZE + 1):
+            for row in range(top // CELL_SIZE, bottom // CELL_SIZE + 1):
+                cells.setdefault((column, row), []).append(i)
+    seen = set()
+    a = []
+    b = []
+    for cell in cells.values():
+        for n, i in enumerate(cell):
+            for j in cell[n + 1:]:
+                if (i, j) not in seen:
+                    seen.add((i, j))
+                    a.append(i)
+                    b.append(j)
+    return a, b
+
+def check_each(colliders, a, b):
+    result = []
+    for i, j in zip(a, b):
+        first = colliders[i]
+        second = colliders[j]
+        # check_collision only handles a circle as its first argument.
+        if type(first) != lesson.Circle and type(second) == lesson.Circle:
+            first, second = second, first
+        result.append(lesson.check_collision(first, second))
+    return result
+
+def timed(f, *args):
+    start = time.perf_counter()
+    result = f(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+def main():
+    rng = random.Random(42)
+    numpy_header = 'numpy ms' if lesson.NUMPY_AVAILABLE else 'numpy ms (n/a)'
+    print(f'{"colliders":>9} {"pairs":>8} {"check_collision ms":>19} {"arrays python ms":>17} {numpy_header:>15} {"hits":>7}')
+    for count in COLLIDER_COUNTS:
+        colliders = make_colliders(count, rng)
+        a, b = get_candidates(colliders)
+
+        expected, each_ms = timed(check_each, colliders, a, b)
+
+        arrays = lesson.ColliderArrays(colliders, use_numpy=False)
+        python_result, python_ms = timed(arrays.check_pairs, a, b)
+        if python_result != expected:
+            print('ColliderArrays (python) disagrees with check_collision!')
+            return 1
+
+        numpy_ms = float('nan')
+        if lesson.NUMPY_AVAILABLE:
+            arrays = lesson.ColliderArrays(colliders, use_numpy=True)
+            numpy_result, numpy_ms = timed(arrays.check_pairs, a, b)
+            if numpy_result.tolist() != expected:
+                print('ColliderArrays (numpy) disagrees with check_collision!')
+                return 1
+
+        print(f'{count:>9} {len(a):>8} {each_ms:>19.2f} {python_ms:>17.2f} {numpy_ms:>15.2f} {sum(expected):>7}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,20 @@
+import os
 import sys
+import array
 import ctypes
 import sdl2
 import sdl2.sdlimage
 import sdl2.sdlttf
+from collections import OrderedDict
 from dataclasses import dataclass
 
+NUMPY_AVAILABLE = False
+try:
+    import numpy
+    NUMPY_AVAILABLE = True
+except ImportError:
+    pass
+
 SCREEN_WIDTH = 640
 SCREEN_HEIGHT = 480
 
@@ -14,6 +24,145 @@ class Circle:
     y: int = 0
     r: int = 0
 
+# NOTE: the cache keeps textures that nothing uses anymore around until it has to make
+# room, so loading the same file again (e.g. when switching back to a scene) is free.
+TEXTURE_CACHE_BUDGET = 64 * 1024 * 1024
+# NOTE: i switched to cyan here because bright magenta is killing my eyes
+DEFAULT_COLOR_KEY = (0, 0xff, 0xff)
+
+class TextureRegistry:
+    # NOTE: every SDL_Texture an LTexture creates is handed over to this registry, and
+    # LTexture.free only gives its reference back. a texture is destroyed the moment its
+    # last reference is released, and whatever is left gets destroyed in close() before
+    # the renderer goes away.
+    def __init__(self):
+        # address of the SDL_Texture -> [texture, reference count, estimated bytes]
+        self._entries = {}
+
+    def adopt(self, texture):
+        fmt = ctypes.c_uint32()
+        w = ctypes.c_int()
+        h = ctypes.c_int()
+        sdl2.SDL_QueryTexture(texture, ctypes.byref(fmt), None, ctypes.byref(w), ctypes.byref(h))
+        self._entries[ctypes.addressof(texture.contents)] = [texture, 1, w.value * h.value * sdl2.SDL_BYTESPERPIXEL(fmt.value)]
+        return texture
+
+    def retain(self, texture):
+        self._entries[ctypes.addressof(texture.contents)][1] += 1
+        return texture
+
+    def release(self, texture):
+        key = ctypes.addressof(texture.contents)
+        entry = self._entries[key]
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self._entries[key]
+            sdl2.SDL_DestroyTexture(texture)
+
+    def get_ref_count(self, texture):
+        return self._entries[ctypes.addressof(texture.contents)][1]
+
+    def get_live_count(self):
+        return len(self._entries)
+
+    def get_live_bytes(self):
+        return sum(entry[2] for entry in self._entries.values())
+
+    def destroy_all(self):
+        for texture, _, _ in self._entries.values():
+            sdl2.SDL_DestroyTexture(texture)
+        self._entries = {}
+
+class TextureCache:
+    # NOTE: textures belong to the renderer that created them, so the renderer is part of
+    # the key as well as the path, the file's mtime (so an edited file is loaded again) and
+    # the color key.
+    # the textures themselves are owned by g_texture_registry like any other LTexture
+    # texture. the cache holds one reference to each of them and retains another one for
+    # every acquire(), which LTexture.free gives back to the registry. a texture that only
+    # the cache still holds is unused and can be evicted.
+    def __init__(self, byte_budget: int = TEXTURE_CACHE_BUDGET):
+        self.byte_budget = byte_budget
+        # key -> [texture, width, height, estimated bytes], oldest first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def acquire(self, renderer, p: str, color_key=DEFAULT_COLOR_KEY):
+        try:
+            mtime = os.path.getmtime(p)
+        except OSError as e:
+            print(f'Unable to load image {p}! {e}')
+            return None
+        key = (ctypes.addressof(renderer.contents), os.path.abspath(p), mtime, color_key)
+        entry = self._entries.get(key)
+        if entry:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            g_texture_registry.retain(entry[0])
+            return entry
+
+        self.misses += 1
+        surface = sdl2.sdlimage.IMG_Load(p.encode())
+        if not surface:
+            print(f'Unable to load image {p}! SDL_image Error: {sdl2.sdlimage.IMG_GetError().decode()}')
+            return None
+        if color_key is not None:
+            sdl2.SDL_SetColorKey(surface, sdl2.SDL_TRUE, sdl2.SDL_MapRGB(surface.contents.format, *color_key))
+        new_texture = sdl2.SDL_CreateTextureFromSurface(renderer, surface)
+        if not new_texture:
+            print(f'Unable to create texture from {p}! SDL Error: {sdl2.SDL_GetError().decode()}')
+            entry = None
+        else:
+            # NOTE: SDL_CreateTextureFromSurface picks a 4-bytes-per-pixel format for
+            # everything we load, so this is a good enough estimate.
+            entry = [g_texture_registry.adopt(new_texture), surface.contents.w, surface.contents.h, surface.contents.w * surface.contents.h * 4]
+            self._entries[key] = entry
+            self._bytes += entry[3]
+            g_texture_registry.retain(new_texture)
+            self._evict()
+        sdl2.SDL_FreeSurface(surface)
+        return entry
+
+    def _evict(self):
+        # NOTE: textures that are still in use can't be evicted, so the cache can end up over
+        # budget if everything in it is in use. unused textures are only evicted when a new
+        # one is loaded.
+        if self._bytes <= self.byte_budget:
+            return
+        for key, entry in list(self._entries.items()):
+            if self._bytes <= self.byte_budget:
+                break
+            if g_texture_registry.get_ref_count(entry[0]) == 1:
+                self._remove(key)
+                self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry[3]
+        g_texture_registry.release(entry[0])
+
+    def clear(self, renderer):
+        # NOTE: call this before destroying the renderer. there's nothing to clear if
+        # creating the renderer failed. textures that are still in use stay alive until
+        # their LTextures free them.
+        if not renderer:
+            return
+        renderer_address = ctypes.addressof(renderer.contents)
+        for key in [key for key in self._entries if key[0] == renderer_address]:
+            self._remove(key)
+
+    def get_stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'textures': len(self._entries),
+            'bytes': self._bytes,
+        }
+
 class LTexture:
     def __init__(self):
         self._texture = None
@@ -21,6 +170,7 @@ class LTexture:
         self._height = None
 
         self._destroyed = True
+        self._render_quad = sdl2.SDL_Rect()
 
     def get_width(self):
         return self._width
@@ -28,25 +178,15 @@ class LTexture:
     def get_height(self):
         return self._height
 
-    def load_from_file(self, p: str) -> bool :
+    # NOTE: textures loaded from a file are shared through g_texture_cache, so changing the
+    # color/alpha/blend mode of one LTexture changes it for every LTexture of the same file.
+    def load_from_file(self, p: str, color_key=DEFAULT_COLOR_KEY) -> bool :
         self.free()
-        new_texture = None
-        surface = sdl2.sdlimage.IMG_Load(p.encode())
-        if not surface:
-            print(f'Unable to load image {p}! SDL_image Error: {sdl2.sdlimage.IMG_GetError().decode()}')
-        else:
-            # NOTE: i switched to cyan here because bright magenta is killing my eyes
-            sdl2.SDL_SetColorKey(surface, sdl2.SDL_TRUE, sdl2.SDL_MapRGB(surface.contents.format, 0, 0xff, 0xff))
-            new_texture = sdl2.SDL_CreateTextureFromSurface(g_renderer, surface)
-            if not new_texture:
-                print(f'Unable to create texture from {p}! SDL Error: {sdl2.SDL_GetError().decode()}')
-            else:
-                self._width = surface.contents.w
-                self._height = surface.contents.h
-                self._destroyed = False
-                self._texture = new_texture
-            sdl2.SDL_FreeSurface(surface)
-        return new_texture is not None
+        entry = g_texture_cache.acquire(g_renderer, p, color_key)
+        if entry:
+            self._texture, self._width, self._height = entry[0], entry[1], entry[2]
+            self._destroyed = False
+        return entry is not None
 
     def load_from_rendered_text(self, texture_text: str, color: sdl2.SDL_Color):
         self.free()
@@ -54,14 +194,16 @@ class LTexture:
         if not text_surface:
             print(f'Unable to render text surface! SDL_ttf Error: {sdl2.sdlttf.TTF_GetError().decode()}')
         else:
-            self._texture = sdl2.SDL_CreateTextureFromSurface(g_renderer, text_surface)
-            if not self._texture:
+            new_texture = sdl2.SDL_CreateTextureFromSurface(g_renderer, text_surface)
+            if not new_texture:
                 print(f'Unable to create texture from rendered text! SDL Error: {sdl2.SDL_GetError().decode()}')
             else:
                 self._width = text_surface.contents.w
                 self._height = text_surface.contents.h
+                self._destroyed = False
+                self._texture = g_texture_registry.adopt(new_texture)
             sdl2.SDL_FreeSurface(text_surface)
-        return self._texture is not None
+        return not self._destroyed
 
     def render(self,
             x: int, y: int,
@@ -70,16 +212,26 @@ class LTexture:
             center: sdl2.SDL_Point = None,
             flip: sdl2.SDL_RendererFlip = sdl2.SDL_FLIP_NONE
     ):
-        render_quad = sdl2.SDL_Rect(x=x,y=y,w=self._width, h=self._height)
+        # NOTE: the quad is reused instead of making a new SDL_Rect on every call, and the
+        # plain SDL_RenderCopy is enough when there's nothing to rotate or flip.
+        render_quad = self._render_quad
+        render_quad.x = x
+        render_quad.y = y
         if clip:
             render_quad.w = clip.w
             render_quad.h = clip.h
-        sdl2.SDL_RenderCopyEx(g_renderer, self._texture,
-            clip,
-            render_quad,
-            angle, center,
-            flip,
-        )
+        else:
+            render_quad.w = self._width
+            render_quad.h = self._height
+        if angle == 0 and flip == sdl2.SDL_FLIP_NONE:
+            sdl2.SDL_RenderCopy(g_renderer, self._texture, clip, render_quad)
+        else:
+            sdl2.SDL_RenderCopyEx(g_renderer, self._texture,
+                clip,
+                render_quad,
+                angle, center,
+                flip,
+            )
     
     def set_color(self, red: int, green: int, blue: int):
         sdl2.SDL_SetTextureColorMod(self._texture, red, green, blue)
@@ -90,66 +242,318 @@ class LTexture:
     def set_alpha(self, alpha: int):
         sdl2.SDL_SetTextureAlphaMod(self._texture, alpha)
     
+    def share(self, other):
+        # NOTE: both LTextures end up drawing the same SDL_Texture; it is only destroyed
+        # once both of them are freed.
+        self.free()
+        if not other._destroyed:
+            self._texture = g_texture_registry.retain(other._texture)
+            self._width = other._width
+            self._height = other._height
+            self._destroyed = False
+
     def free(self):
         if not self._destroyed and self._texture:
-            sdl2.SDL_DestroyTexture(self._texture)
+            g_texture_registry.release(self._texture)
+            self._texture = None
             self._width = 0
             self._height = 0
+        self._destroyed = True
 
 g_window = None
 g_renderer = None
+g_texture_registry = TextureRegistry()
+g_texture_cache = TextureCache()
 g_dot_texture = LTexture()
 
 DOT_WIDTH = 20
 DOT_HEIGHT = 20
 DOT_VEL = 1
-@dataclass
-class Dot:
-    pos_x: int = 0
-    pos_y: int = 0
-    vel_x: int = 0
-    vel_y: int = 0
+# NOTE: key -> change of velocity, one dict lookup per key press instead of an if/elif
+# chain.
+DOT_KEY_VELOCITIES = {
+    sdl2.SDLK_UP: (0, -DOT_VEL),
+    sdl2.SDLK_DOWN: (0, DOT_VEL),
+    sdl2.SDLK_LEFT: (-DOT_VEL, 0),
+    sdl2.SDLK_RIGHT: (DOT_VEL, 0),
+}
+# NOTE: the grid get_dot_overlaps files the dots in has cells at least this big, and at
+# least as big as the biggest collider.
+DOT_GRID_CELL_SIZE = 64
+# NOTE: with numpy, cell keys of that grid are column * stride + row; rows stay far below
+# this either way, so neighbouring cells are always key +- stride +- 1.
+DOT_GRID_KEY_STRIDE = 1 << 32
+DOT_GRID_NEIGHBOURS = [column * DOT_GRID_KEY_STRIDE + row for column in (-1, 0, 1) for row in (-1, 0, 1)]
+DOT_STORE_COLUMNS = ('pos_x', 'pos_y', 'vel_x', 'vel_y', 'collider_x', 'collider_y', 'collider_r')
+
+class DotStore:
+    # NOTE: all dots as rows of a few columns (DOT_STORE_COLUMNS) instead of one object
+    # each: numpy arrays when numpy is there, array.array otherwise. the systems below
+    # (move_dots, shift_dot_colliders, find_dot_collisions, render_dots) go over every row
+    # at once, so with numpy moving 10k dots is a handful of array operations rather than
+    # 10k method calls. Dot is a view of one row for code that wants an object per dot.
+    def __init__(self, use_numpy: bool = NUMPY_AVAILABLE):
+        self.use_numpy = use_numpy
+        self.count = 0
+        for name in DOT_STORE_COLUMNS:
+            setattr(self, name, numpy.zeros(0, dtype=numpy.int64) if use_numpy else array.array('q'))
+
+    def __len__(self):
+        return self.count
+
+    def add(self, pos_x: int, pos_y: int, vel_x: int = 0, vel_y: int = 0, r: int = DOT_WIDTH//2):
+        # NOTE: returns the row of the new dot. rows are never removed, so it stays valid.
+        values = (pos_x, pos_y, vel_x, vel_y, pos_x, pos_y, r)
+        index = self.count
+        if self.use_numpy:
+            if index == len(self.pos_x):
+                # NOTE: numpy arrays can't grow in place; doubling keeps adding amortized O(1).
+                capacity = max(64, index * 2)
+                for name in DOT_STORE_COLUMNS:
+                    column = numpy.zeros(capacity, dtype=numpy.int64)
+                    column[:index] = getattr(self, name)[:index]
+                    setattr(self, name, column)
+            for name, value in zip(DOT_STORE_COLUMNS, values):
+                getattr(self, name)[index] = value
+        else:
+            for name, value in zip(DOT_STORE_COLUMNS, values):
+                getattr(self, name).append(value)
+        self.count += 1
+        return index
+
+g_dots = DotStore()
+
+def shift_dot_colliders(store: DotStore):
+    # NOTE: a dot's collider is the circle around its position.
+    n = store.count
+    store.collider_x[:n] = store.pos_x[:n]
+    store.collider_y[:n] = store.pos_y[:n]
+
+def get_dot_colliders(store: DotStore):
+    # NOTE: the dots' colliders as ColliderArrays, over the store's own columns.
+    n = store.count
+    return ColliderArrays.from_circles(store.collider_x[:n], store.collider_y[:n], store.collider_r[:n], store.use_numpy)
+
+# NOTE: the systems below take the same steps over either kind of store, each step in one
+# go over the numpy columns, or as a loop over the array.array ones.
+
+def find_dot_collisions(store: DotStore, rows, statics):
+    # NOTE: for every row in rows whether its collider overlaps any other dot's or one of
+    # statics (a ColliderArrays of the colliders that aren't dots, like the wall), as a
+    # numpy bool array with numpy and a list of bools without.
+    count = len(statics)
+    if not store.use_numpy:
+        hits = [False] * len(rows)
+        if store.count > 1:
+            for i in get_dot_overlaps(store, rows)[0]:
+                hits[i] = True
+        if count and rows:
+            static_hits = get_dot_colliders(store).check_pairs(
+                [row for row in rows for _ in range(count)], list(range(count)) * len(rows), statics)
+            for i in range(len(rows)):
+                hits[i] = hits[i] or any(static_hits[i * count:(i + 1) * count])
+        return hits
+    hits = numpy.zeros(len(rows), dtype=bool)
+    if store.count > 1:
+        hits[get_dot_overlaps(store, rows)[0]] = True
+    if count and len(rows):
+        static_hits = get_dot_colliders(store).check_pairs(
+            numpy.repeat(rows, count), numpy.tile(numpy.arange(count), len(rows)), statics)
+        hits |= static_hits.reshape(len(rows), count).any(axis=1)
+    return hits
+
+def _get_biggest_dot_radius(store: DotStore):
+    n = store.count
+    if n == 0:
+        return 0
+    return int(store.collider_r[:n].max() if store.use_numpy else max(store.collider_r))
+
+def _get_dot_cell_size(store: DotStore):
+    return max(DOT_GRID_CELL_SIZE, 2 * _get_biggest_dot_radius(store))
+
+def get_dot_overlaps(store: DotStore, rows, candidates=None):
+    # NOTE: (position in rows, other row) for every pair of a row in rows and a different
+    # dot in candidates (all dots when None) whose colliders overlap. this is the
+    # broadphase: the candidates are put in a grid with cells at least as big as the
+    # biggest collider, so only the ones in the 3x3 cells around a row can touch it, and
+    # those pairs go through ColliderArrays.
+    if not store.use_numpy:
+        return _get_dot_overlaps_python(store, rows, candidates)
+    n = store.count
+    x = store.collider_x[:n]
+    y = store.collider_y[:n]
+    pool = numpy.arange(n) if candidates is None else candidates
+    if not len(rows) or not len(pool):
+        return numpy.zeros(0, dtype=numpy.intp), numpy.zeros(0, dtype=numpy.intp)
+    cell_size = _get_dot_cell_size(store)
+    # NOTE: the grid is sorted arrays here: the candidates sorted by cell key, and a cell
+    # is the run of them with its key.
+    pool_keys = x[pool] // cell_size * DOT_GRID_KEY_STRIDE + y[pool] // cell_size
+    pool_order = numpy.argsort(pool_keys, kind='stable')
+    sorted_keys = pool_keys[pool_order]
+    order = pool[pool_order]
+    # NOTE: all 9 neighbouring cells of every row looked up in one go, in key order;
+    # searchsorted is several times faster on sorted needles than on random ones.
+    row_keys = x[rows] // cell_size * DOT_GRID_KEY_STRIDE + y[rows] // cell_size
+    targets = (row_keys[:, None] + DOT_GRID_NEIGHBOURS).ravel()
+    needle_order = numpy.argsort(targets)
+    needles = targets[needle_order]
+    first = numpy.searchsorted(sorted_keys, needles, 'left')
+    counts = numpy.searchsorted(sorted_keys, needles, 'right') - first
+    total = int(counts.sum())
+    # every candidate filed under a neighbouring cell, expanded to (owner, other) pairs.
+    owner = numpy.repeat(needle_order // len(DOT_GRID_NEIGHBOURS), counts)
+    others = order[numpy.repeat(first - (numpy.cumsum(counts) - counts), counts) + numpy.arange(total)]
+    mine = rows[owner]
+    overlap = get_dot_colliders(store).check_pairs(mine, others) & (others != mine)
+    return owner[overlap], others[overlap]
+
+def _get_dot_overlaps_python(store: DotStore, rows, candidates):
+    # NOTE: the same grid as a dict of (column, row) -> the candidates in that cell. one at
+    # a time there's no need to look at all 3x3 cells around a row, only at the ones a
+    # collider touching it could be filed under, which is mostly one to four.
+    x = store.collider_x
+    y = store.collider_y
+    r = store.collider_r
+    biggest = _get_biggest_dot_radius(store)
+    cell_size = _get_dot_cell_size(store)
+    cells = {}
+    for other in (range(store.count) if candidates is None else candidates):
+        cells.setdefault((x[other] // cell_size, y[other] // cell_size), []).append(other)
+    owner = []
+    mine = []
+    others = []
+    for i, row in enumerate(rows):
+        reach = r[row] + biggest
+        top = (y[row] - reach) // cell_size
+        bottom = (y[row] + reach) // cell_size + 1
+        for column in range((x[row] - reach) // cell_size, (x[row] + reach) // cell_size + 1):
+            for cell_row in range(top, bottom):
+                for other in cells.get((column, cell_row), ()):
+                    if other != row:
+                        owner.append(i)
+                        mine.append(row)
+                        others.append(other)
+    overlap = get_dot_colliders(store).check_pairs(mine, others)
+    return [i for i, hit in zip(owner, overlap) if hit], [other for other, hit in zip(others, overlap) if hit]
+
+def move_dots(store: DotStore, statics=(), width: int = SCREEN_WIDTH, height: int = SCREEN_HEIGHT):
+    # NOTE: Dot.move for every dot at once: first along x, then along y, and a dot that
+    # ends up outside of width x height or overlapping something goes back. the dots move
+    # at the same time instead of one after the other, so whether one blocks another
+    # doesn't depend on which moved first. a dot going back can land on one that was
+    # allowed to move, which then has to go back as well, and so on; after the first check
+    # only the dots that just went back need looking at.
+    n = store.count
+    statics = ColliderArrays(statics, store.use_numpy)
+    for pos, vel, size, limit in (
+            (store.pos_x, store.vel_x, DOT_WIDTH, width),
+            (store.pos_y, store.vel_y, DOT_HEIGHT, height),
+    ):
+        if not store.use_numpy:
+            _move_dots_python(store, statics, pos, vel, size, limit)
+            continue
+        pos = pos[:n]
+        vel = vel[:n]
+        moving = numpy.flatnonzero(vel)
+        if not len(moving):
+            continue
+        pos[moving] += vel[moving]
+        outside = (pos[moving] < 0) | (pos[moving] + size > limit)
+        pos[moving[outside]] -= vel[moving[outside]]
+        moving = moving[~outside]
+        shift_dot_colliders(store)
+        hits = find_dot_collisions(store, moving, statics)
+        blocked = moving[hits]
+        moving = moving[~hits]
+        while len(blocked):
+            pos[blocked] -= vel[blocked]
+            shift_dot_colliders(store)
+            blocked = numpy.unique(get_dot_overlaps(store, blocked, moving)[1])
+            moving = numpy.setdiff1d(moving, blocked, assume_unique=True)
+
+def _move_dots_python(store: DotStore, statics, pos, vel, size: int, limit: int):
+    # NOTE: one axis of move_dots, step for step, over array.array columns.
+    moving = []
+    for i in range(store.count):
+        if vel[i]:
+            pos[i] += vel[i]
+            if pos[i] < 0 or pos[i] + size > limit:
+                pos[i] -= vel[i]
+            else:
+                moving.append(i)
+    if not moving:
+        return
+    shift_dot_colliders(store)
+    hits = find_dot_collisions(store, moving, statics)
+    blocked = [i for i, hit in zip(moving, hits) if hit]
+    moving = [i for i, hit in zip(moving, hits) if not hit]
+    while blocked:
+        for i in blocked:
+            pos[i] -= vel[i]
+        shift_dot_colliders(store)
+        blocked = set(get_dot_overlaps(store, blocked, moving)[1])
+        moving = [i for i in moving if i not in blocked]
+
+def render_dots(store: DotStore):
+    n = store.count
+    xs = store.pos_x[:n]
+    ys = store.pos_y[:n]
+    rs = store.collider_r[:n]
+    if store.use_numpy:
+        # NOTE: python ints; numpy scalars are slow to hand to ctypes one at a time.
+        xs = xs.tolist(); ys = ys.tolist(); rs = rs.tolist()
+    for x, y, r in zip(xs, ys, rs):
+        g_dot_texture.render(x - r, y - r)
+
+def _dot_column(name: str):
+    def get(self):
+        return int(getattr(self._store, name)[self.index])
+    def set(self, value):
+        getattr(self._store, name)[self.index] = value
+    return property(get, set)
 
-    def __post_init__(self):
-        self._collider = Circle(x=self.pos_x, y=self.pos_y, r=DOT_WIDTH//2)
-        self.shift_colliders()
+class Dot:
+    # NOTE: one row of a DotStore (g_dots by default) that works like Dot did when it was a
+    # dataclass holding its own fields. the fields read and write the store's columns, so a
+    # Dot and the systems see the same dot; moving is left to move_dots. it has its own
+    # Circle for get_collider(), synced from the columns whenever it's asked for.
+    pos_x = _dot_column('pos_x')
+    pos_y = _dot_column('pos_y')
+    vel_x = _dot_column('vel_x')
+    vel_y = _dot_column('vel_y')
+
+    def __init__(self, pos_x: int = 0, pos_y: int = 0, vel_x: int = 0, vel_y: int = 0, store: DotStore = None):
+        self._store = g_dots if store is None else store
+        self.index = self._store.add(pos_x, pos_y, vel_x, vel_y)
+        self._collider = Circle(x=pos_x, y=pos_y, r=DOT_WIDTH//2)
+
+    def __repr__(self):
+        return f'Dot(pos_x={self.pos_x}, pos_y={self.pos_y}, vel_x={self.vel_x}, vel_y={self.vel_y})'
 
     def handle_event(self, e):
         if e.type == sdl2.SDL_KEYDOWN and e.key.repeat == 0:
-            if e.key.keysym.sym == sdl2.SDLK_UP: self.vel_y -= DOT_VEL
-            elif e.key.keysym.sym == sdl2.SDLK_DOWN: self.vel_y += DOT_VEL
-            elif e.key.keysym.sym == sdl2.SDLK_LEFT: self.vel_x -= DOT_VEL
-            elif e.key.keysym.sym == sdl2.SDLK_RIGHT: self.vel_x += DOT_VEL
+            velocity = DOT_KEY_VELOCITIES.get(e.key.keysym.sym)
+            if velocity:
+                self.vel_x += velocity[0]
+                self.vel_y += velocity[1]
     
-    def move(self, square, circle):
-        self.pos_x += self.vel_x
-        self.shift_colliders()
-        if (self.pos_x < 0
-                or (self.pos_x + DOT_WIDTH > SCREEN_WIDTH)
-                or check_collision(self._collider, square)
-                or check_collision(self._collider, circle)):
-            self.pos_x -= self.vel_x
-            self.shift_colliders()
-
-        self.pos_y += self.vel_y
-        self.shift_colliders()
-        if (self.pos_y < 0
-                or (self.pos_y + DOT_HEIGHT > SCREEN_HEIGHT)
-                or check_collision(self._collider, square)
-                or check_collision(self._collider, circle)):
-            self.pos_y -= self.vel_y
-            self.shift_colliders()
-
     def shift_colliders(self):
         # NOTE: the blog post actually did not have the code for this method
         # but it's easy enough to figure it out yourself.
-        self._collider.x = self.pos_x
-        self._collider.y = self.pos_y
+        store = self._store
+        store.collider_x[self.index] = store.pos_x[self.index]
+        store.collider_y[self.index] = store.pos_y[self.index]
 
     def render(self):
         g_dot_texture.render(self.pos_x - self._collider.r, self.pos_y - self._collider.r)
 
-    def get_collider(self): return self._collider
+    def get_collider(self):
+        store = self._store
+        self._collider.x = int(store.collider_x[self.index])
+        self._collider.y = int(store.collider_y[self.index])
+        self._collider.r = int(store.collider_r[self.index])
+        return self._collider
 
 def init():
     global g_window, g_renderer
@@ -222,6 +626,138 @@ def check_collision(a, b):
             or left_a >= right_b): return False
         return True    
 
+COLLIDER_RECT = 0
+COLLIDER_CIRCLE = 1
+
+class ColliderArrays:
+    # NOTE: check_collision does one interpreted comparison (plus a type() dispatch) per
+    # pair. this keeps every collider as columns (kind, x, y, w, h, r) and tests a whole
+    # list of pairs at once, with numpy when it's there and with plain loops when it isn't;
+    # both give the same answers as check_collision. unlike check_collision the order
+    # inside a pair doesn't matter, so a rect can be tested against a circle either way.
+    def __init__(self, colliders=(), use_numpy: bool = NUMPY_AVAILABLE):
+        self._use_numpy = use_numpy
+        self.set_colliders(colliders)
+
+    def set_colliders(self, colliders):
+        self.kind = []
+        self.x = []
+        self.y = []
+        self.w = []
+        self.h = []
+        self.r = []
+        for collider in colliders:
+            if type(collider) == Circle:
+                self.kind.append(COLLIDER_CIRCLE)
+                self.x.append(collider.x)
+                self.y.append(collider.y)
+                self.w.append(0)
+                self.h.append(0)
+                self.r.append(collider.r)
+            else:
+                self.kind.append(COLLIDER_RECT)
+                self.x.append(collider.x)
+                self.y.append(collider.y)
+                self.w.append(collider.w)
+                self.h.append(collider.h)
+                self.r.append(0)
+        if self._use_numpy:
+            # NOTE: float64 holds any int a collider here will ever have exactly, so the
+            # comparisons come out exactly like the integer ones in check_collision.
+            self.kind = numpy.array(self.kind, dtype=numpy.int8)
+            self.x = numpy.array(self.x, dtype=numpy.float64)
+            self.y = numpy.array(self.y, dtype=numpy.float64)
+            self.w = numpy.array(self.w, dtype=numpy.float64)
+            self.h = numpy.array(self.h, dtype=numpy.float64)
+            self.r = numpy.array(self.r, dtype=numpy.float64)
+
+    @classmethod
+    def from_circles(cls, x, y, r, use_numpy: bool = NUMPY_AVAILABLE):
+        # NOTE: circles that are already kept as columns, like the colliders of a DotStore,
+        # without making a Circle for every one of them. with numpy the columns are used as
+        # they are, not copied.
+        arrays = cls(use_numpy=use_numpy)
+        n = len(x)
+        if use_numpy:
+            arrays.kind = numpy.full(n, COLLIDER_CIRCLE, dtype=numpy.int8)
+            arrays.w = arrays.h = numpy.zeros(n, dtype=numpy.int64)
+        else:
+            arrays.kind = [COLLIDER_CIRCLE] * n
+            arrays.w = arrays.h = [0] * n
+        arrays.x = x
+        arrays.y = y
+        arrays.r = r
+        return arrays
+
+    def __len__(self):
+        return len(self.kind)
+
+    def check_pairs(self, a, b, other=None):
+        # NOTE: a and b are equally long sequences of indices; the result says for every
+        # (a[i], b[i]) whether those two colliders overlap. it's a numpy bool array with
+        # numpy and a list of bools without. b indexes other instead of these colliders if
+        # it's given, so colliders kept apart (moving dots and the static level, say) can be
+        # tested against each other.
+        other = self if other is None else other
+        if self._use_numpy:
+            return self._check_pairs_numpy(numpy.asarray(a, dtype=numpy.intp), other, numpy.asarray(b, dtype=numpy.intp))
+        return self._check_pairs_python(a, other, b)
+
+    def _check_pairs_numpy(self, a, other, b):
+        a_rect = self.kind[a] == COLLIDER_RECT
+        b_rect = other.kind[b] == COLLIDER_RECT
+        ax = self.x[a]; ay = self.y[a]; ar = self.r[a]
+        bx = other.x[b]; by = other.y[b]; br = other.r[b]
+        circle_circle = (bx - ax) ** 2 + (by - ay) ** 2 < (ar + br) ** 2
+        if not a_rect.any() and not b_rect.any():
+            # NOTE: only circles (dots against dots, say), so that's all there is to test.
+            return circle_circle
+        aw = self.w[a]; ah = self.h[a]
+        bw = other.w[b]; bh = other.h[b]
+
+        rect_rect = ~((ay + ah <= by) | (ay >= by + bh) | (ax + aw <= bx) | (ax >= bx + bw))
+        # mixed pairs are tested with the circle's center clamped to the rect, whichever
+        # side the circle is on.
+        cx = numpy.clip(ax, bx, bx + bw)
+        cy = numpy.clip(ay, by, by + bh)
+        circle_rect = (cx - ax) ** 2 + (cy - ay) ** 2 < ar ** 2
+        cx = numpy.clip(bx, ax, ax + aw)
+        cy = numpy.clip(by, ay, ay + ah)
+        rect_circle = (cx - bx) ** 2 + (cy - by) ** 2 < br ** 2
+
+        return numpy.where(
+            a_rect,
+            numpy.where(b_rect, rect_rect, rect_circle),
+            numpy.where(b_rect, circle_rect, circle_circle),
+        )
+
+    def _check_pairs_python(self, a, other, b):
+        kind = self.kind
+        xs = self.x; ys = self.y; ws = self.w; hs = self.h; rs = self.r
+        other_kind = other.kind
+        other_xs = other.x; other_ys = other.y; other_ws = other.w; other_hs = other.h; other_rs = other.r
+        result = []
+        for i, j in zip(a, b):
+            ax = xs[i]; ay = ys[i]
+            bx = other_xs[j]; by = other_ys[j]
+            if kind[i] == COLLIDER_RECT:
+                if other_kind[j] == COLLIDER_RECT:
+                    result.append(not (ay + hs[i] <= by
+                        or ay >= by + other_hs[j]
+                        or ax + ws[i] <= bx
+                        or ax >= bx + other_ws[j]))
+                else:
+                    cx = ax if bx < ax else ax + ws[i] if bx > ax + ws[i] else bx
+                    cy = ay if by < ay else ay + hs[i] if by > ay + hs[i] else by
+                    result.append((cx - bx) ** 2 + (cy - by) ** 2 < other_rs[j] ** 2)
+            elif other_kind[j] == COLLIDER_CIRCLE:
+                result.append((bx - ax) ** 2 + (by - ay) ** 2 < (rs[i] + other_rs[j]) ** 2)
+            else:
+                cx = bx if ax < bx else bx + other_ws[j] if ax > bx + other_ws[j] else ax
+                cy = by if ay < by else by + other_hs[j] if ay > by + other_hs[j] else ay
+                result.append((cx - ax) ** 2 + (cy - ay) ** 2 < rs[i] ** 2)
+        return result
+
 def load_media():
     success = True
     
@@ -236,6 +772,8 @@ def close():
 
     g_dot_texture.free()
 
+    g_texture_cache.clear(g_renderer)
+    g_texture_registry.destroy_all()
     sdl2.SDL_DestroyRenderer(g_renderer)
     g_renderer = None
     sdl2.SDL_DestroyWindow(g_window)
@@ -257,20 +795,20 @@ def main():
             dot = Dot(DOT_WIDTH//2, DOT_HEIGHT//2)
             dot2 = Dot(SCREEN_HEIGHT//4, SCREEN_HEIGHT//4)
             wall = sdl2.SDL_Rect(x=300,y=40,w=40,h=400)
+            statics = [wall]
             while not quit:
                 while sdl2.SDL_PollEvent(ctypes.byref(e)) != 0:
                     if e.type == sdl2.SDL_QUIT:
                         quit = True
                     dot.handle_event(e)
 
-                dot.move(wall, dot2.get_collider())
+                move_dots(g_dots, statics)
                 sdl2.SDL_SetRenderDrawColor(g_renderer, 0xff, 0xff, 0xff, 0xff)
                 sdl2.SDL_RenderClear(g_renderer)
 
                 sdl2.SDL_SetRenderDrawColor(g_renderer, 0, 0, 0, 0xff)
                 sdl2.SDL_RenderDrawRect(g_renderer, wall)
-                dot.render()
-                dot2.render()
+                render_dots(g_dots)
 
                 sdl2.SDL_RenderPresent(g_renderer)
     
@@ -0,0 +1,125 @@
+import os
+import sys
+import time
+import array
+import ctypes
+import random
+import sdl2
+
+import main as lesson
+
+# NOTE: scrolls a camera over a generated 100k x 100k tile level (3.2M pixels a side at 32
+# pixel tiles, a texture of which would be about 40 TB) and times drawing it once through
+# the chunk cache of Tilemap and once tile by tile, culled to the camera but without any
+# caching. the camera pans like the dot does, and every JUMP_EVERY frames jumps somewhere
+# else entirely, which is the worst case for the cache: everything visible is new.
+#
+#     cd 30_scrolling && python bench_tilemap.py
+LEVEL_TILES = 100000
+FRAMES = 600
+PAN_SPEED = 10
+JUMP_EVERY = 150
+
+class GeneratedGrid:
+    # NOTE: same interface as TileGridFile; tile ids are a hash of the position, so nothing
+    # but the chunks asked for is ever made.
+    def __init__(self, width: int, height: int, tile_size: int, chunk_size: int, tile_count: int):
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.chunk_size = chunk_size
+        self.tile_count = tile_count
+        self.chunks_read = 0
+
+    def get_tile(self, x: int, y: int):
+        return (x * 73856093 ^ y * 19349663) % self.tile_count
+
+    def get_chunk(self, chunk_x: int, chunk_y: int):
+        self.chunks_read += 1
+        size = self.chunk_size
+        ids = array.array('H')
+        for y in range(chunk_y * size, (chunk_y + 1) * size):
+            for x in range(chunk_x * size, (chunk_x + 1) * size):
+                ids.append(self.get_tile(x, y) if x < self.width and y < self.height else lesson.TILE_EMPTY)
+        return ids
+
+def render_tiles(grid, tileset: lesson.LTexture, camera: sdl2.SDL_Rect):
+    # NOTE: the baseline: one SDL_RenderCopy per tile overlapping the camera, every frame.
+    tile_size = grid.tile_size
+    columns = tileset.get_width() // tile_size
+    src = sdl2.SDL_Rect(w=tile_size, h=tile_size)
+    dst = sdl2.SDL_Rect(w=tile_size, h=tile_size)
+    left = camera.x // tile_size
+    top = camera.y // tile_size
+    right = min(grid.width - 1, (camera.x + camera.w - 1) // tile_size)
+    bottom = min(grid.height - 1, (camera.y + camera.h - 1) // tile_size)
+    for y in range(top, bottom + 1):
+        dst.y = y * tile_size - camera.y
+        for x in range(left, right + 1):
+            tile_id = grid.get_tile(x, y)
+            src.x = tile_id % columns * tile_size
+            src.y = tile_id // columns * tile_size
+            dst.x = x * tile_size - camera.x
+            sdl2.SDL_RenderCopy(lesson.g_renderer, tileset._texture, src, dst)
+
+def get_camera_path(level_pixels: int, rng: random.Random):
+    x = y = level_pixels // 2
+    path = []
+    for frame in range(FRAMES):
+        if frame and frame % JUMP_EVERY == 0:
+            x = rng.randrange(level_pixels - lesson.SCREEN_WIDTH)
+            y = rng.randrange(level_pixels - lesson.SCREEN_HEIGHT)
+        else:
+            x += PAN_SPEED
+            y += PAN_SPEED // 2
+        path.append((x, y))
+    return path
+
+def timed_frames(path, draw):
+    camera = sdl2.SDL_Rect(w=lesson.SCREEN_WIDTH, h=lesson.SCREEN_HEIGHT)
+    times = []
+    for camera.x, camera.y in path:
+        start = time.perf_counter()
+        sdl2.SDL_SetRenderDrawColor(lesson.g_renderer, 0xff, 0xff, 0xff, 0xff)
+        sdl2.SDL_RenderClear(lesson.g_renderer)
+        draw(camera)
+        sdl2.SDL_RenderPresent(lesson.g_renderer)
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return times
+
+def main():
+    # NOTE: the software renderer, so the numbers don't depend on the GPU driver and this
+    # also runs with SDL_VIDEODRIVER=dummy.
+    create_renderer = sdl2.SDL_CreateRenderer
+    sdl2.SDL_CreateRenderer = lambda window, index, flags: create_renderer(window, -1, sdl2.SDL_RENDERER_SOFTWARE)
+    if not lesson.init():
+        print('Failed to initialize!')
+        return 1
+    tilemap = lesson.Tilemap()
+    if not tilemap.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'level.tiles')):
+        lesson.close()
+        return 1
+    tileset = tilemap._tileset
+    level = tilemap._grid
+    # NOTE: the last row of the tileset may be partly empty; ids only go up to the full rows.
+    tile_count = (tileset.get_width() // level.tile_size) * (tileset.get_height() // level.tile_size - 1)
+    grid = GeneratedGrid(LEVEL_TILES, LEVEL_TILES, level.tile_size, level.chunk_size, tile_count)
+    tilemap.set_grid(grid)
+    path = get_camera_path(LEVEL_TILES * grid.tile_size, random.Random(42))
+
+    print(f'{LEVEL_TILES}x{LEVEL_TILES} tiles, {FRAMES} frames, a jump every {JUMP_EVERY} frames')
+    print(f'{"":>10} {"p50 ms":>8} {"p99 ms":>8} {"max ms":>8} {"chunks composed":>16} {"cache MiB":>10}')
+    chunked = timed_frames(path, tilemap.render)
+    print(f'{"chunked":>10} {chunked[len(chunked) // 2]:>8.2f} {chunked[len(chunked) * 99 // 100]:>8.2f} {chunked[-1]:>8.2f}'
+        f' {tilemap.chunks_composed:>16} {tilemap.get_cached_bytes() / (1024 * 1024):>10.1f}')
+    per_tile = timed_frames(path, lambda camera: render_tiles(grid, tileset, camera))
+    print(f'{"per tile":>10} {per_tile[len(per_tile) // 2]:>8.2f} {per_tile[len(per_tile) * 99 // 100]:>8.2f} {per_tile[-1]:>8.2f}'
+        f' {"-":>16} {"-":>10}')
+
+    tilemap.free()
+    lesson.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
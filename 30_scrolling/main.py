@@ -1,8 +1,12 @@
+import os
 import sys
+import array
 import ctypes
+import struct
 import sdl2
 import sdl2.sdlimage
 import sdl2.sdlttf
+from collections import OrderedDict
 from dataclasses import dataclass
 
 LEVEL_WIDTH = 1280
@@ -10,6 +14,145 @@ LEVEL_HEIGHT = 960
 SCREEN_WIDTH = 640
 SCREEN_HEIGHT = 480
 
+# NOTE: the cache keeps textures that nothing uses anymore around until it has to make
+# room, so loading the same file again (e.g. when switching back to a scene) is free.
+TEXTURE_CACHE_BUDGET = 64 * 1024 * 1024
+# NOTE: i switched to cyan here because bright magenta is killing my eyes
+DEFAULT_COLOR_KEY = (0, 0xff, 0xff)
+
+class TextureRegistry:
+    # NOTE: every SDL_Texture an LTexture creates is handed over to this registry, and
+    # LTexture.free only gives its reference back. a texture is destroyed the moment its
+    # last reference is released, and whatever is left gets destroyed in close() before
+    # the renderer goes away.
+    def __init__(self):
+        # address of the SDL_Texture -> [texture, reference count, estimated bytes]
+        self._entries = {}
+
+    def adopt(self, texture):
+        fmt = ctypes.c_uint32()
+        w = ctypes.c_int()
+        h = ctypes.c_int()
+        sdl2.SDL_QueryTexture(texture, ctypes.byref(fmt), None, ctypes.byref(w), ctypes.byref(h))
+        self._entries[ctypes.addressof(texture.contents)] = [texture, 1, w.value * h.value * sdl2.SDL_BYTESPERPIXEL(fmt.value)]
+        return texture
+
+    def retain(self, texture):
+        self._entries[ctypes.addressof(texture.contents)][1] += 1
+        return texture
+
+    def release(self, texture):
+        key = ctypes.addressof(texture.contents)
+        entry = self._entries[key]
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self._entries[key]
+            sdl2.SDL_DestroyTexture(texture)
+
+    def get_ref_count(self, texture):
+        return self._entries[ctypes.addressof(texture.contents)][1]
+
+    def get_live_count(self):
+        return len(self._entries)
+
+    def get_live_bytes(self):
+        return sum(entry[2] for entry in self._entries.values())
+
+    def destroy_all(self):
+        for texture, _, _ in self._entries.values():
+            sdl2.SDL_DestroyTexture(texture)
+        self._entries = {}
+
+class TextureCache:
+    # NOTE: textures belong to the renderer that created them, so the renderer is part of
+    # the key as well as the path, the file's mtime (so an edited file is loaded again) and
+    # the color key.
+    # the textures themselves are owned by g_texture_registry like any other LTexture
+    # texture. the cache holds one reference to each of them and retains another one for
+    # every acquire(), which LTexture.free gives back to the registry. a texture that only
+    # the cache still holds is unused and can be evicted.
+    def __init__(self, byte_budget: int = TEXTURE_CACHE_BUDGET):
+        self.byte_budget = byte_budget
+        # key -> [texture, width, height, estimated bytes], oldest first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def acquire(self, renderer, p: str, color_key=DEFAULT_COLOR_KEY):
+        try:
+            mtime = os.path.getmtime(p)
+        except OSError as e:
+            print(f'Unable to load image {p}! {e}')
+            return None
+        key = (ctypes.addressof(renderer.contents), os.path.abspath(p), mtime, color_key)
+        entry = self._entries.get(key)
+        if entry:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            g_texture_registry.retain(entry[0])
+            return entry
+
+        self.misses += 1
+        surface = sdl2.sdlimage.IMG_Load(p.encode())
+        if not surface:
+            print(f'Unable to load image {p}! SDL_image Error: {sdl2.sdlimage.IMG_GetError().decode()}')
+            return None
+        if color_key is not None:
+            sdl2.SDL_SetColorKey(surface, sdl2.SDL_TRUE, sdl2.SDL_MapRGB(surface.contents.format, *color_key))
+        new_texture = sdl2.SDL_CreateTextureFromSurface(renderer, surface)
+        if not new_texture:
+            print(f'Unable to create texture from {p}! SDL Error: {sdl2.SDL_GetError().decode()}')
+            entry = None
+        else:
+            # NOTE: SDL_CreateTextureFromSurface picks a 4-bytes-per-pixel format for
+            # everything we load, so this is a good enough estimate.
+            entry = [g_texture_registry.adopt(new_texture), surface.contents.w, surface.contents.h, surface.contents.w * surface.contents.h * 4]
+            self._entries[key] = entry
+            self._bytes += entry[3]
+            g_texture_registry.retain(new_texture)
+            self._evict()
+        sdl2.SDL_FreeSurface(surface)
+        return entry
+
+    def _evict(self):
+        # NOTE: textures that are still in use can't be evicted, so the cache can end up over
+        # budget if everything in it is in use. unused textures are only evicted when a new
+        # one is loaded.
+        if self._bytes <= self.byte_budget:
+            return
+        for key, entry in list(self._entries.items()):
+            if self._bytes <= self.byte_budget:
+                break
+            if g_texture_registry.get_ref_count(entry[0]) == 1:
+                self._remove(key)
+                self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry[3]
+        g_texture_registry.release(entry[0])
+
+    def clear(self, renderer):
+        # NOTE: call this before destroying the renderer. there's nothing to clear if
+        # creating the renderer failed. textures that are still in use stay alive until
+        # their LTextures free them.
+        if not renderer:
+            return
+        renderer_address = ctypes.addressof(renderer.contents)
+        for key in [key for key in self._entries if key[0] == renderer_address]:
+            self._remove(key)
+
+    def get_stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'textures': len(self._entries),
+            'bytes': self._bytes,
+        }
+
 class LTexture:
     def __init__(self):
         self._texture = None
@@ -17,6 +160,7 @@ class LTexture:
         self._height = None
 
         self._destroyed = True
+        self._render_quad = sdl2.SDL_Rect()
 
     def get_width(self):
         return self._width
@@ -24,25 +168,15 @@ class LTexture:
     def get_height(self):
         return self._height
 
-    def load_from_file(self, p: str) -> bool :
+    # NOTE: textures loaded from a file are shared through g_texture_cache, so changing the
+    # color/alpha/blend mode of one LTexture changes it for every LTexture of the same file.
+    def load_from_file(self, p: str, color_key=DEFAULT_COLOR_KEY) -> bool :
         self.free()
-        new_texture = None
-        surface = sdl2.sdlimage.IMG_Load(p.encode())
-        if not surface:
-            print(f'Unable to load image {p}! SDL_image Error: {sdl2.sdlimage.IMG_GetError().decode()}')
-        else:
-            # NOTE: i switched to cyan here because bright magenta is killing my eyes
-            sdl2.SDL_SetColorKey(surface, sdl2.SDL_TRUE, sdl2.SDL_MapRGB(surface.contents.format, 0, 0xff, 0xff))
-            new_texture = sdl2.SDL_CreateTextureFromSurface(g_renderer, surface)
-            if not new_texture:
-                print(f'Unable to create texture from {p}! SDL Error: {sdl2.SDL_GetError().decode()}')
-            else:
-                self._width = surface.contents.w
-                self._height = surface.contents.h
-                self._destroyed = False
-                self._texture = new_texture
-            sdl2.SDL_FreeSurface(surface)
-        return new_texture is not None
+        entry = g_texture_cache.acquire(g_renderer, p, color_key)
+        if entry:
+            self._texture, self._width, self._height = entry[0], entry[1], entry[2]
+            self._destroyed = False
+        return entry is not None
 
     def load_from_rendered_text(self, texture_text: str, color: sdl2.SDL_Color):
         self.free()
@@ -50,14 +184,16 @@ class LTexture:
         if not text_surface:
             print(f'Unable to render text surface! SDL_ttf Error: {sdl2.sdlttf.TTF_GetError().decode()}')
         else:
-            self._texture = sdl2.SDL_CreateTextureFromSurface(g_renderer, text_surface)
-            if not self._texture:
+            new_texture = sdl2.SDL_CreateTextureFromSurface(g_renderer, text_surface)
+            if not new_texture:
                 print(f'Unable to create texture from rendered text! SDL Error: {sdl2.SDL_GetError().decode()}')
             else:
                 self._width = text_surface.contents.w
                 self._height = text_surface.contents.h
+                self._destroyed = False
+                self._texture = g_texture_registry.adopt(new_texture)
             sdl2.SDL_FreeSurface(text_surface)
-        return self._texture is not None
+        return not self._destroyed
 
     def render(self,
             x: int, y: int,
@@ -66,16 +202,26 @@ class LTexture:
             center: sdl2.SDL_Point = None,
             flip: sdl2.SDL_RendererFlip = sdl2.SDL_FLIP_NONE
     ):
-        render_quad = sdl2.SDL_Rect(x=x,y=y,w=self._width, h=self._height)
+        # NOTE: the quad is reused instead of making a new SDL_Rect on every call, and the
+        # plain SDL_RenderCopy is enough when there's nothing to rotate or flip.
+        render_quad = self._render_quad
+        render_quad.x = x
+        render_quad.y = y
         if clip:
             render_quad.w = clip.w
             render_quad.h = clip.h
-        sdl2.SDL_RenderCopyEx(g_renderer, self._texture,
-            clip,
-            render_quad,
-            angle, center,
-            flip,
-        )
+        else:
+            render_quad.w = self._width
+            render_quad.h = self._height
+        if angle == 0 and flip == sdl2.SDL_FLIP_NONE:
+            sdl2.SDL_RenderCopy(g_renderer, self._texture, clip, render_quad)
+        else:
+            sdl2.SDL_RenderCopyEx(g_renderer, self._texture,
+                clip,
+                render_quad,
+                angle, center,
+                flip,
+            )
     
     def set_color(self, red: int, green: int, blue: int):
         sdl2.SDL_SetTextureColorMod(self._texture, red, green, blue)
@@ -86,20 +232,264 @@ class LTexture:
     def set_alpha(self, alpha: int):
         sdl2.SDL_SetTextureAlphaMod(self._texture, alpha)
     
+    def share(self, other):
+        # NOTE: both LTextures end up drawing the same SDL_Texture; it is only destroyed
+        # once both of them are freed.
+        self.free()
+        if not other._destroyed:
+            self._texture = g_texture_registry.retain(other._texture)
+            self._width = other._width
+            self._height = other._height
+            self._destroyed = False
+
     def free(self):
         if not self._destroyed and self._texture:
-            sdl2.SDL_DestroyTexture(self._texture)
+            g_texture_registry.release(self._texture)
+            self._texture = None
             self._width = 0
             self._height = 0
+        self._destroyed = True
+
+TILEMAP_MAGIC = b'LTILEMAP'
+TILEMAP_VERSION = 1
+TILEMAP_HEADER = struct.Struct('<8sHHIIHH')
+TILE_EMPTY = 0xffff
+# NOTE: composed chunks kept around as textures, least recently drawn ones go first. with
+# make_tilemap.py's defaults (16x16 tiles of 32 pixels) a chunk is 512x512, 1 MiB, and the
+# camera sees at most 3x2 of them.
+TILEMAP_CHUNK_CACHE_SIZE = 24
+# NOTE: chunks around the visible ones are composed ahead of time, at most this many per
+# frame, so scrolling into new chunks doesn't stall one frame composing all of them.
+TILEMAP_PREFETCH_PER_FRAME = 1
+
+class TileGridFile:
+    # NOTE: reads the chunks of a .tiles file (see make_tilemap.py) when they're asked for,
+    # so only the header is kept in memory no matter how big the level is.
+    def __init__(self):
+        self._file = None
+        self._data_offset = 0
+        self.tileset_name = ''
+        self.tile_size = 0
+        self.width = 0
+        self.height = 0
+        self.chunk_size = 0
+
+    def open(self, p: str) -> bool:
+        self.close()
+        try:
+            f = open(p, 'rb')
+        except OSError as e:
+            print(f'Unable to load tilemap {p}! {e}')
+            return False
+        header = f.read(TILEMAP_HEADER.size)
+        if len(header) == TILEMAP_HEADER.size:
+            magic, version, self.tile_size, self.width, self.height, self.chunk_size, name_length = TILEMAP_HEADER.unpack(header)
+        if len(header) != TILEMAP_HEADER.size or magic != TILEMAP_MAGIC or version != TILEMAP_VERSION:
+            print(f'Unable to load tilemap {p}! Not a tilemap or unknown version.')
+            f.close()
+            return False
+        self.tileset_name = f.read(name_length).decode()
+        self._data_offset = TILEMAP_HEADER.size + name_length
+        self._file = f
+        return True
+
+    def get_chunk(self, chunk_x: int, chunk_y: int):
+        # NOTE: chunk_size * chunk_size tile ids, row by row.
+        chunk_columns = -(-self.width // self.chunk_size)
+        count = self.chunk_size * self.chunk_size
+        self._file.seek(self._data_offset + (chunk_y * chunk_columns + chunk_x) * count * 2)
+        ids = array.array('H')
+        ids.frombytes(self._file.read(count * 2))
+        if sys.byteorder == 'big':
+            ids.byteswap()
+        return ids
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+class Tilemap:
+    # NOTE: draws a tile grid through a cache of chunk textures. a chunk is composed from the
+    # tileset into its own target texture the first time it's visible and after that costs
+    # one RenderCopy per frame; only chunks overlapping the camera are drawn. the grid can be
+    # anything with tile_size, width, height, chunk_size and get_chunk(chunk_x, chunk_y),
+    # which is how the benchmark feeds it a generated level too big for any file.
+    def __init__(self, chunk_cache_size: int = TILEMAP_CHUNK_CACHE_SIZE):
+        self._grid = None
+        self._tileset = LTexture()
+        self._tileset_columns = 0
+        # (chunk x, chunk y) -> SDL_Texture, least recently drawn first
+        self._chunks = OrderedDict()
+        # chunks whose texture has to be composed again before it's drawn
+        self._dirty_chunks = set()
+        self._chunk_cache_size = chunk_cache_size
+        self._src = sdl2.SDL_Rect()
+        self._dst = sdl2.SDL_Rect()
+        self.chunks_composed = 0
+
+    def load(self, p: str) -> bool:
+        self.free()
+        grid = TileGridFile()
+        if not grid.open(p):
+            return False
+        # NOTE: no color key; tiles are copied exactly as they were in the level image.
+        if not self._tileset.load_from_file(os.path.join(os.path.dirname(p), grid.tileset_name), color_key=None):
+            grid.close()
+            return False
+        self.set_grid(grid)
+        return True
+
+    def set_grid(self, grid):
+        self.free_chunks()
+        if isinstance(self._grid, TileGridFile):
+            self._grid.close()
+        self._grid = grid
+        self._tileset_columns = self._tileset.get_width() // grid.tile_size
+
+    def get_width(self):
+        return self._grid.width * self._grid.tile_size
+
+    def get_height(self):
+        return self._grid.height * self._grid.tile_size
+
+    def handle_event(self, e):
+        # NOTE: target textures lose their contents when the renderer is reset, so every
+        # cached chunk is composed again the next time it's drawn.
+        if e.type in (sdl2.SDL_RENDER_TARGETS_RESET, sdl2.SDL_RENDER_DEVICE_RESET):
+            self._dirty_chunks.update(self._chunks)
+
+    def get_cached_bytes(self):
+        chunk_pixels = self._grid.tile_size * self._grid.chunk_size if self._grid else 0
+        return len(self._chunks) * chunk_pixels * chunk_pixels * 4
+
+    def _get_chunk_texture(self, key):
+        texture = self._chunks.get(key)
+        if texture:
+            self._chunks.move_to_end(key)
+            if key in self._dirty_chunks:
+                self._dirty_chunks.discard(key)
+                self._compose_chunk(texture, *key)
+            return texture
+        if len(self._chunks) >= self._chunk_cache_size:
+            # NOTE: the chunk that went unseen the longest hands its texture over.
+            old_key, texture = self._chunks.popitem(last=False)
+            self._dirty_chunks.discard(old_key)
+        else:
+            # NOTE: same pixel format as the tileset, which is what the renderer picked for
+            # it; a different one makes every copy of a chunk convert pixels.
+            chunk_pixels = self._grid.tile_size * self._grid.chunk_size
+            pixel_format = ctypes.c_uint32()
+            sdl2.SDL_QueryTexture(self._tileset._texture, ctypes.byref(pixel_format), None, None, None)
+            texture = sdl2.SDL_CreateTexture(g_renderer,
+                pixel_format.value, sdl2.SDL_TEXTUREACCESS_TARGET,
+                chunk_pixels, chunk_pixels,
+            )
+            if not texture:
+                print(f'Unable to create chunk texture! SDL Error: {sdl2.SDL_GetError().decode()}')
+                return None
+            sdl2.SDL_SetTextureBlendMode(texture, sdl2.SDL_BLENDMODE_BLEND)
+        self._compose_chunk(texture, *key)
+        self._chunks[key] = texture
+        return texture
+
+    def _compose_chunk(self, texture, chunk_x: int, chunk_y: int):
+        grid = self._grid
+        tile_size = grid.tile_size
+        chunk_size = grid.chunk_size
+        columns = self._tileset_columns
+        tileset = self._tileset._texture
+        src = sdl2.SDL_Rect(w=tile_size, h=tile_size)
+        dst = sdl2.SDL_Rect(w=tile_size, h=tile_size)
+
+        sdl2.SDL_SetRenderTarget(g_renderer, texture)
+        sdl2.SDL_SetRenderDrawColor(g_renderer, 0, 0, 0, 0)
+        sdl2.SDL_RenderClear(g_renderer)
+        for i, tile_id in enumerate(grid.get_chunk(chunk_x, chunk_y)):
+            if tile_id == TILE_EMPTY:
+                continue
+            src.x = tile_id % columns * tile_size
+            src.y = tile_id // columns * tile_size
+            dst.x = i % chunk_size * tile_size
+            dst.y = i // chunk_size * tile_size
+            sdl2.SDL_RenderCopy(g_renderer, tileset, src, dst)
+        sdl2.SDL_SetRenderTarget(g_renderer, None)
+        self.chunks_composed += 1
+
+    def render(self, camera: sdl2.SDL_Rect):
+        # NOTE: draws the part of the level under camera at the top left of the screen.
+        grid = self._grid
+        chunk_pixels = grid.tile_size * grid.chunk_size
+        chunk_columns = -(-grid.width // grid.chunk_size)
+        chunk_rows = -(-grid.height // grid.chunk_size)
+        left = max(0, camera.x // chunk_pixels)
+        top = max(0, camera.y // chunk_pixels)
+        right = min(chunk_columns - 1, (camera.x + camera.w - 1) // chunk_pixels)
+        bottom = min(chunk_rows - 1, (camera.y + camera.h - 1) // chunk_pixels)
+
+        src = self._src
+        dst = self._dst
+        for chunk_y in range(top, bottom + 1):
+            y = chunk_y * chunk_pixels
+            src.y = max(camera.y - y, 0)
+            src.h = min(camera.y + camera.h, y + chunk_pixels) - y - src.y
+            dst.y = y + src.y - camera.y
+            dst.h = src.h
+            for chunk_x in range(left, right + 1):
+                texture = self._get_chunk_texture((chunk_x, chunk_y))
+                if not texture:
+                    continue
+                x = chunk_x * chunk_pixels
+                src.x = max(camera.x - x, 0)
+                src.w = min(camera.x + camera.w, x + chunk_pixels) - x - src.x
+                dst.x = x + src.x - camera.x
+                dst.w = src.w
+                sdl2.SDL_RenderCopy(g_renderer, texture, src, dst)
+
+        # NOTE: prefetching only makes sense while the ring around the view fits in the cache
+        # next to the visible chunks; otherwise it would evict what's on screen.
+        if (right - left + 3) * (bottom - top + 3) > self._chunk_cache_size:
+            return
+        budget = TILEMAP_PREFETCH_PER_FRAME
+        for chunk_y in range(max(0, top - 1), min(chunk_rows, bottom + 2)):
+            for chunk_x in range(max(0, left - 1), min(chunk_columns, right + 2)):
+                if budget == 0:
+                    return
+                if (chunk_x, chunk_y) not in self._chunks:
+                    self._get_chunk_texture((chunk_x, chunk_y))
+                    budget -= 1
+
+    def free_chunks(self):
+        for texture in self._chunks.values():
+            sdl2.SDL_DestroyTexture(texture)
+        self._chunks.clear()
+        self._dirty_chunks.clear()
+
+    def free(self):
+        self.free_chunks()
+        self._tileset.free()
+        if isinstance(self._grid, TileGridFile):
+            self._grid.close()
+        self._grid = None
 
 g_window = None
 g_renderer = None
+g_texture_registry = TextureRegistry()
+g_texture_cache = TextureCache()
 g_dot_texture = LTexture()
-g_bg = LTexture()
+g_tilemap = Tilemap()
 
 DOT_WIDTH = 20
 DOT_HEIGHT = 20
 DOT_VEL = 10
+# NOTE: key -> change of velocity, one dict lookup per key press instead of an if/elif
+# chain.
+DOT_KEY_VELOCITIES = {
+    sdl2.SDLK_UP: (0, -DOT_VEL),
+    sdl2.SDLK_DOWN: (0, DOT_VEL),
+    sdl2.SDLK_LEFT: (-DOT_VEL, 0),
+    sdl2.SDLK_RIGHT: (DOT_VEL, 0),
+}
 @dataclass
 class Dot:
     pos_x: int = 0
@@ -109,10 +499,10 @@ class Dot:
 
     def handle_event(self, e):
         if e.type == sdl2.SDL_KEYDOWN and e.key.repeat == 0:
-            if e.key.keysym.sym == sdl2.SDLK_UP: self.vel_y -= DOT_VEL
-            elif e.key.keysym.sym == sdl2.SDLK_DOWN: self.vel_y += DOT_VEL
-            elif e.key.keysym.sym == sdl2.SDLK_LEFT: self.vel_x -= DOT_VEL
-            elif e.key.keysym.sym == sdl2.SDLK_RIGHT: self.vel_x += DOT_VEL
+            velocity = DOT_KEY_VELOCITIES.get(e.key.keysym.sym)
+            if velocity:
+                self.vel_x += velocity[0]
+                self.vel_y += velocity[1]
     
     def move(self):
         self.pos_x += self.vel_x
@@ -168,17 +558,20 @@ def load_media():
     if not g_dot_texture.load_from_file('dot.png'):
         print(f'Failed to load dot texture')
         return False
-    if not g_bg.load_from_file('bg.png'):
-        print(f'Failed to load bg texture')
+    if not g_tilemap.load('level.tiles'):
+        print(f'Failed to load tilemap')
+        success = False
 
     return success
 
 def close():
     global g_window, g_renderer
 
-    g_bg.free()
+    g_tilemap.free()
     g_dot_texture.free()
 
+    g_texture_cache.clear(g_renderer)
+    g_texture_registry.destroy_all()
     sdl2.SDL_DestroyRenderer(g_renderer)
     g_renderer = None
     sdl2.SDL_DestroyWindow(g_window)
@@ -203,6 +596,7 @@ def main():
                 while sdl2.SDL_PollEvent(ctypes.byref(e)) != 0:
                     if e.type == sdl2.SDL_QUIT:
                         quit = True
+                    g_tilemap.handle_event(e)
                     dot.handle_event(e)
 
                 dot.move()
@@ -216,7 +610,7 @@ def main():
                 sdl2.SDL_SetRenderDrawColor(g_renderer, 0xff, 0xff, 0xff, 0xff)
                 sdl2.SDL_RenderClear(g_renderer)
                 
-                g_bg.render(0, 0, camera)
+                g_tilemap.render(camera)
                 dot.render(camera.x, camera.y)
 
                 sdl2.SDL_RenderPresent(g_renderer)
@@ -59,6 +59,7 @@ class LTexture:
             else:
                 self._width = text_surface.contents.w
                 self._height = text_surface.contents.h
+                self._destroyed = False
             sdl2.SDL_FreeSurface(text_surface)
         return self._texture is not None
 
@@ -94,6 +95,119 @@ class LTexture:
             sdl2.SDL_DestroyTexture(self._texture)
             self._width = 0
             self._height = 0
+        self._destroyed = True
+
+class CompositeTexture(LTexture):
+    # NOTE: a group of texture draws and lines rendered once into a target texture, so drawing
+    # the whole group is one SDL_RenderCopy until something in it changes. children are placed
+    # relative to the composite's top left corner; call invalidate() after changing a child
+    # texture (e.g. re-rendering its text) so the composite is drawn again on its next render().
+    def __init__(self):
+        super().__init__()
+        # ('texture', texture, x, y) or ('line', x1, y1, x2, y2, color)
+        self._children = []
+        self._dirty = True
+        # NOTE: the target texture only ever grows, so typing doesn't reallocate it every key.
+        self._capacity_width = 0
+        self._capacity_height = 0
+        self._content_clip = sdl2.SDL_Rect()
+
+    def clear(self):
+        self._children = []
+        self._dirty = True
+
+    def add_texture(self, texture: LTexture, x: int, y: int):
+        self._children.append(('texture', texture, x, y))
+        self._dirty = True
+
+    def add_line(self, x1: int, y1: int, x2: int, y2: int, color: tuple = (0, 0, 0, 0xff)):
+        self._children.append(('line', x1, y1, x2, y2, color))
+        self._dirty = True
+
+    def invalidate(self):
+        self._dirty = True
+
+    def handle_event(self, e):
+        # NOTE: target textures lose their contents when the renderer is reset.
+        if e.type in (sdl2.SDL_RENDER_TARGETS_RESET, sdl2.SDL_RENDER_DEVICE_RESET):
+            self._dirty = True
+
+    def _get_content_size(self):
+        width = 0
+        height = 0
+        for child in self._children:
+            if child[0] == 'texture':
+                _, texture, x, y = child
+                if texture.get_width() and texture.get_height():
+                    width = max(width, x + texture.get_width())
+                    height = max(height, y + texture.get_height())
+            else:
+                _, x1, y1, x2, y2, _ = child
+                # lines include their end points
+                width = max(width, x1 + 1, x2 + 1)
+                height = max(height, y1 + 1, y2 + 1)
+        return width, height
+
+    def update(self) -> bool:
+        if not self._dirty:
+            return True
+        width, height = self._get_content_size()
+        if width > self._capacity_width or height > self._capacity_height:
+            if self._texture:
+                sdl2.SDL_DestroyTexture(self._texture)
+            self._capacity_width = max(width, self._capacity_width)
+            self._capacity_height = max(height, self._capacity_height)
+            self._texture = sdl2.SDL_CreateTexture(g_renderer,
+                sdl2.SDL_PIXELFORMAT_RGBA8888, sdl2.SDL_TEXTUREACCESS_TARGET,
+                self._capacity_width, self._capacity_height,
+            )
+            if not self._texture:
+                print(f'Unable to create composite texture! SDL Error: {sdl2.SDL_GetError().decode()}')
+                self._capacity_width = 0
+                self._capacity_height = 0
+                self._destroyed = True
+                return False
+            sdl2.SDL_SetTextureBlendMode(self._texture, sdl2.SDL_BLENDMODE_BLEND)
+            self._destroyed = False
+        self._width = width
+        self._height = height
+        self._content_clip.w = width
+        self._content_clip.h = height
+
+        sdl2.SDL_SetRenderTarget(g_renderer, self._texture)
+        sdl2.SDL_SetRenderDrawColor(g_renderer, 0, 0, 0, 0)
+        sdl2.SDL_RenderClear(g_renderer)
+        for child in self._children:
+            if child[0] == 'texture':
+                _, texture, x, y = child
+                if texture.get_width() and texture.get_height():
+                    texture.render(x, y)
+            else:
+                _, x1, y1, x2, y2, color = child
+                sdl2.SDL_SetRenderDrawColor(g_renderer, *color)
+                sdl2.SDL_RenderDrawLine(g_renderer, x1, y1, x2, y2)
+        sdl2.SDL_SetRenderTarget(g_renderer, None)
+        self._dirty = False
+        return True
+
+    def render(self,
+            x: int, y: int,
+            clip: sdl2.SDL_Rect = None,
+            angle: float = 0,
+            center: sdl2.SDL_Point = None,
+            flip: sdl2.SDL_RendererFlip = sdl2.SDL_FLIP_NONE
+    ):
+        if not self.update() or not self._width or not self._height:
+            return
+        # NOTE: the target may be bigger than what's drawn in it.
+        super().render(x, y, clip or self._content_clip, angle, center, flip)
+
+    def free(self):
+        super().free()
+        self._texture = None
+        self._capacity_width = 0
+        self._capacity_height = 0
+        self._dirty = True
 
 g_window = None
 g_renderer = None
@@ -103,6 +217,7 @@ g_text_piece1 = LTexture()
 g_text_piece2 = LTexture()
 g_composition_piece1 = LTexture()
 g_composition_piece2 = LTexture()
+g_input_line = CompositeTexture()
 
 def init():
     global g_window, g_screen_surface, g_renderer
@@ -160,6 +275,7 @@ def load_media():
 def close():
     global g_window, g_renderer, g_font
 
+    g_input_line.free()
     g_text_piece1.free()
     g_text_piece2.free()
 
@@ -189,11 +305,13 @@ def main():
             composition = ''
             composition_caret = 0
             candidate_list_ui_location = sdl2.SDL_Rect(x=0,y=0)
+            total_width = 0
             sdl2.SDL_StartTextInput()
             while not quit:
                 should_render_text = False
                 should_render_composition = False
                 while sdl2.SDL_PollEvent(ctypes.byref(e)) != 0:
+                    g_input_line.handle_event(e)
                     composition_mode = len(composition) > 0
                     if e.type == sdl2.SDL_QUIT:
                         quit = True
@@ -266,58 +384,38 @@ def main():
                     g_composition_piece2.load_from_rendered_text(composition_piece2 or ' ', color)
                     if not composition_piece1: g_composition_piece1.force_size(0, 0)
                     if not composition_piece2: g_composition_piece2.force_size(0, 0)
-                    
+
+                # NOTE: the four pieces plus caret and underline are laid out into g_input_line
+                # only when one of them changed; every other frame it's a single RenderCopy.
+                if should_render_text or should_render_composition:
+                    caret_x = g_text_piece1.get_width() + g_composition_piece1.get_width()
+                    composition_end_x = caret_x + g_composition_piece2.get_width()
+                    underline_y = max(g_text_piece1.get_height(), g_composition_piece1.get_height())
+
+                    g_input_line.clear()
+                    g_input_line.add_texture(g_text_piece1, 0, 0)
+                    g_input_line.add_texture(g_composition_piece1, g_text_piece1.get_width(), 0)
+                    if underline_y != 0:
+                        g_input_line.add_line(caret_x, 0, caret_x, underline_y)
+                    if composition:
+                        g_input_line.add_line(g_text_piece1.get_width(), underline_y, composition_end_x, underline_y)
+                    g_input_line.add_texture(g_composition_piece2, caret_x, 0)
+                    g_input_line.add_texture(g_text_piece2, composition_end_x, 0)
+                    total_width = composition_end_x + g_text_piece2.get_width()
+
+                    if composition:
+                        candidate_list_ui_location.x = (SCREEN_WIDTH - total_width)//2+g_text_piece1.get_width()
+                        candidate_list_ui_location.y = (SCREEN_HEIGHT - g_text_piece1.get_height())//2 + underline_y
+                        sdl2.SDL_SetTextInputRect(candidate_list_ui_location)
+
                 g_prompt.render(
                     (SCREEN_WIDTH - g_prompt.get_width())//2,
                     0,
                 )
-                total_width = (
-                    g_text_piece1.get_width()
-                    + g_composition_piece1.get_width()
-                    + g_composition_piece2.get_width()
-                    + g_text_piece2.get_width()
-                )
-                starting_x = (SCREEN_WIDTH - total_width)//2
-                starting_y = (SCREEN_HEIGHT - g_text_piece1.get_height())//2
-                underline_y = max(
-                    starting_y + g_text_piece1.get_height(),
-                    starting_y + g_composition_piece1.get_height()
+                g_input_line.render(
+                    (SCREEN_WIDTH - total_width)//2,
+                    (SCREEN_HEIGHT - g_text_piece1.get_height())//2,
                 )
-                g_text_piece1.render(starting_x, starting_y)
-                g_composition_piece1.render(
-                    starting_x+g_text_piece1.get_width(),
-                    starting_y
-                )
-                sdl2.SDL_SetRenderDrawColor(g_renderer, 0, 0, 0, 0xff)
-                if starting_y != underline_y:
-                    sdl2.SDL_RenderDrawLine(
-                        g_renderer,
-                        starting_x + g_text_piece1.get_width() + g_composition_piece1.get_width(),
-                        starting_y,
-                        starting_x + g_text_piece1.get_width() + g_composition_piece1.get_width(),
-                        underline_y,
-                    )
-                if composition_mode:
-                    sdl2.SDL_RenderDrawLine(
-                        g_renderer,
-                        starting_x + g_text_piece1.get_width(),
-                        underline_y,
-                        starting_x + g_text_piece1.get_width() + g_composition_piece1.get_width() + g_composition_piece2.get_width(),
-                        underline_y,
-                    )
-                g_composition_piece2.render(
-                    starting_x+g_text_piece1.get_width()+g_composition_piece1.get_width(),
-                    starting_y
-                )
-                g_text_piece2.render(
-                    starting_x+g_text_piece1.get_width()+g_composition_piece1.get_width()+g_composition_piece2.get_width(),
-                    starting_y
-                )
-
-                if composition:
-                    candidate_list_ui_location.x = (SCREEN_WIDTH - total_width)//2+g_text_piece1.get_width()
-                    candidate_list_ui_location.y = underline_y
-                    sdl2.SDL_SetTextInputRect(candidate_list_ui_location)
                 
                 sdl2.SDL_RenderPresent(g_renderer)
 
@@ -54,6 +54,7 @@ class LTexture:
             else:
                 self._width = text_surface.contents.w
                 self._height = text_surface.contents.h
+                self._destroyed = False
             sdl2.SDL_FreeSurface(text_surface)
         return self._texture is not None
 
@@ -89,6 +90,7 @@ class LTexture:
             sdl2.SDL_DestroyTexture(self._texture)
             self._width = 0
             self._height = 0
+        self._destroyed = True
 
 g_window = None
 g_renderer = None
@@ -1,5 +1,6 @@
 import os
 import sys
+import time
 import ctypes
 import sdl2
 import sdl2.sdlimage
@@ -8,6 +9,83 @@ import sdl2.sdlttf
 SCREEN_WIDTH = 640
 SCREEN_HEIGHT = 480
 
+# NOTE: (subtype, window id) of an event for EventRouter. the subtype is whatever handlers
+# of that type would otherwise switch on: the window event, the key or the mouse button.
+EVENT_ROUTE_FIELDS = {
+    sdl2.SDL_WINDOWEVENT: lambda e: (e.window.event, e.window.windowID),
+    sdl2.SDL_KEYDOWN: lambda e: (e.key.keysym.sym, e.key.windowID),
+    sdl2.SDL_KEYUP: lambda e: (e.key.keysym.sym, e.key.windowID),
+    sdl2.SDL_MOUSEMOTION: lambda e: (None, e.motion.windowID),
+    sdl2.SDL_MOUSEBUTTONDOWN: lambda e: (e.button.button, e.button.windowID),
+    sdl2.SDL_MOUSEBUTTONUP: lambda e: (e.button.button, e.button.windowID),
+    sdl2.SDL_MOUSEWHEEL: lambda e: (None, e.wheel.windowID),
+    sdl2.SDL_TEXTEDITING: lambda e: (None, e.edit.windowID),
+    sdl2.SDL_TEXTINPUT: lambda e: (None, e.text.windowID),
+}
+
+class EventRouter:
+    # NOTE: handlers are filed under (event type, subtype, window id) and an event only
+    # reaches the ones filed under its own, instead of every window walking an if/elif
+    # chain for every event. a handler added with subtype or window_id None gets every
+    # subtype or every window; the most specific ones are called first. every handler
+    # counts its calls and the time spent in it, see get_stats().
+    def __init__(self):
+        # (type, subtype, window id) -> [[handler, calls, seconds]]
+        self._routes = {}
+        # event types anything is filed under; the rest (mouse motion, mostly) goes
+        # without even reading the event's fields.
+        self._types = set()
+
+    def add(self, handler, event_type: int, subtype: int = None, window_id: int = None):
+        self._routes.setdefault((event_type, subtype, window_id), []).append([handler, 0, 0.0])
+        self._types.add(event_type)
+
+    def remove_window(self, window_id: int):
+        for key in [key for key in self._routes if key[2] == window_id]:
+            del self._routes[key]
+        self._types = {key[0] for key in self._routes}
+
+    def dispatch(self, e) -> bool:
+        # NOTE: returns whether any handler got the event.
+        event_type = e.type
+        if event_type not in self._types:
+            return False
+        get_fields = EVENT_ROUTE_FIELDS.get(event_type)
+        subtype, window_id = get_fields(e) if get_fields else (None, None)
+        routes = self._routes
+        handled = False
+        for key in (
+                (event_type, subtype, window_id),
+                (event_type, None, window_id) if subtype is not None else None,
+                (event_type, subtype, None) if window_id is not None else None,
+                (event_type, None, None) if subtype is not None and window_id is not None else None,
+        ):
+            entries = routes.get(key)
+            if entries:
+                handled = True
+                for entry in entries:
+                    start = time.perf_counter()
+                    entry[0](e)
+                    entry[1] += 1
+                    entry[2] += time.perf_counter() - start
+        return handled
+
+    def get_stats(self):
+        # NOTE: one dict per handler, the ones that took the most time first.
+        stats = []
+        for (event_type, subtype, window_id), entries in self._routes.items():
+            for handler, calls, seconds in entries:
+                stats.append({
+                    'handler': getattr(handler, '__qualname__', repr(handler)),
+                    'type': event_type,
+                    'subtype': subtype,
+                    'window_id': window_id,
+                    'calls': calls,
+                    'ms': seconds * 1000,
+                })
+        stats.sort(key=lambda stat: stat['ms'], reverse=True)
+        return stats
+
 class LWindow:
     def __init__(self):
         self._window = None
@@ -58,74 +136,90 @@ class LWindow:
             print(f'Window could not be created. SDL Error: {sdl2.SDL_GetError().decode()}')
         return bool(self._window) and bool(self._renderer)
 
-    def handle_event(self, e):
-        update_caption = False
-        if e.type == sdl2.SDL_WINDOWEVENT and e.window.windowID == self._window_id:
-            if e.window.event == sdl2.SDL_WINDOWEVENT_MOVED:
-                self._window_display_id = sdl2.SDL_GetWindowDisplayIndex(self._window)
-                update_caption = True
-            elif e.window.event == sdl2.SDL_WINDOWEVENT_SHOWN:
-                self._shown = True
-            elif e.window.event == sdl2.SDL_WINDOWEVENT_HIDDEN:
-                self._shown = False
-            elif e.window.event == sdl2.SDL_WINDOWEVENT_SIZE_CHANGED:
-                self._width = e.window.data1
-                self._height = e.window.data2
-                sdl2.SDL_RenderPresent(g_renderer)
-            elif e.window.event == sdl2.SDL_WINDOWEVENT_EXPOSED:
-                sdl2.SDL_RenderPresent(g_renderer)
-            elif e.window.event == sdl2.SDL_WINDOWEVENT_ENTER:
-                self._mouse_focus = True
-                update_caption = True
-            elif e.window.event == sdl2.SDL_WINDOWEVENT_LEAVE:
-                self._mouse_focus = False
-                update_caption = True
-            elif e.window.event == sdl2.SDL_WINDOWEVENT_FOCUS_GAINED:
-                self._keyboard_focus = True
-                update_caption = True
-            elif e.window.event == sdl2.SDL_WINDOWEVENT_FOCUS_LOST:
-                self._keyboard_focus = False
-                update_caption = True
-            elif e.window.event == sdl2.SDL_WINDOWEVENT_MINIMIZED:
-                self._minimized = True
-            elif e.window.event == sdl2.SDL_WINDOWEVENT_MAXIMIZED:
-                self._minimized = False
-            elif e.window.event == sdl2.SDL_WINDOWEVENT_RESTORED:
-                self._minimized = False
-            elif e.window.event == sdl2.SDL_WINDOWEVENT_CLOSE:
-                sdl2.SDL_HideWindow(self._window)
-
-        elif e.type == sdl2.SDL_KEYDOWN:
-            switch_display = False
-            if e.key.keysym.sym == sdl2.SDLK_RETURN:
-                if self._full_screen:
-                    sdl2.SDL_SetWindowFullscreen(self._window, sdl2.SDL_FALSE)
-                    self._full_screen = False
-                else:
-                    sdl2.SDL_SetWindowFullscreen(self._window, sdl2.SDL_TRUE)
-                    self._full_screen = True
-                    self._minimized = False
-            elif e.key.keysym.sym == sdl2.SDLK_UP:
-                self._window_display_id += 1
-                switch_display = True
-            elif e.key.keysym.sym == sdl2.SDLK_DOWN:
-                self._window_display_id -= 1
-                switch_display = True
-
-            if switch_display:
-                if self._window_display_id < 0:
-                    self._window_display_id = g_total_displays - 1
-                elif self._window_display_id >= g_total_displays:
-                    self._window_display_id = 0
-                
-                sdl2.SDL_SetWindowPosition(
-                    self._window,
-                    g_display_bounds[self._window_display_id].x + (g_display_bounds[self._window_display_id].w - self._width) // 2,
-                    g_display_bounds[self._window_display_id].y + (g_display_bounds[self._window_display_id].h - self._height) // 2,
-                )
-                update_caption = True
-        if update_caption:
-            sdl2.SDL_SetWindowTitle(self._window, f'SDL Turtorial - ID {self._window_id} Display {self._window_display_id} MouseFocus {"On" if self._mouse_focus else "Off"} KeyFocus {"On" if self._keyboard_focus else "Off"}'.encode())
+    def register(self, router: EventRouter):
+        # NOTE: files the handlers of this window under its window id, so it only gets its
+        # own events.
+        window_id = self._window_id
+        for subtype, handler in (
+                (sdl2.SDL_WINDOWEVENT_MOVED, self._on_moved),
+                (sdl2.SDL_WINDOWEVENT_SHOWN, self._on_shown),
+                (sdl2.SDL_WINDOWEVENT_HIDDEN, self._on_hidden),
+                (sdl2.SDL_WINDOWEVENT_SIZE_CHANGED, self._on_size_changed),
+                (sdl2.SDL_WINDOWEVENT_EXPOSED, self._on_exposed),
+                (sdl2.SDL_WINDOWEVENT_ENTER, self._on_enter),
+                (sdl2.SDL_WINDOWEVENT_LEAVE, self._on_leave),
+                (sdl2.SDL_WINDOWEVENT_FOCUS_GAINED, self._on_focus_gained),
+                (sdl2.SDL_WINDOWEVENT_FOCUS_LOST, self._on_focus_lost),
+                (sdl2.SDL_WINDOWEVENT_MINIMIZED, self._on_minimized),
+                (sdl2.SDL_WINDOWEVENT_MAXIMIZED, self._on_restored),
+                (sdl2.SDL_WINDOWEVENT_RESTORED, self._on_restored),
+                (sdl2.SDL_WINDOWEVENT_CLOSE, self._on_close),
+        ):
+            router.add(handler, sdl2.SDL_WINDOWEVENT, subtype, window_id)
+        router.add(self._toggle_full_screen, sdl2.SDL_KEYDOWN, sdl2.SDLK_RETURN, window_id)
+        router.add(self._next_display, sdl2.SDL_KEYDOWN, sdl2.SDLK_UP, window_id)
+        router.add(self._previous_display, sdl2.SDL_KEYDOWN, sdl2.SDLK_DOWN, window_id)
+
+    def _on_shown(self, e): self._shown = True
+    def _on_hidden(self, e): self._shown = False
+    def _on_minimized(self, e): self._minimized = True
+    def _on_restored(self, e): self._minimized = False
+    def _on_close(self, e): sdl2.SDL_HideWindow(self._window)
+    def _on_exposed(self, e): sdl2.SDL_RenderPresent(self._renderer)
+
+    def _on_moved(self, e):
+        self._window_display_id = sdl2.SDL_GetWindowDisplayIndex(self._window)
+        self._update_caption()
+
+    def _on_size_changed(self, e):
+        self._width = e.window.data1
+        self._height = e.window.data2
+        sdl2.SDL_RenderPresent(self._renderer)
+
+    def _on_enter(self, e):
+        self._mouse_focus = True
+        self._update_caption()
+
+    def _on_leave(self, e):
+        self._mouse_focus = False
+        self._update_caption()
+
+    def _on_focus_gained(self, e):
+        self._keyboard_focus = True
+        self._update_caption()
+
+    def _on_focus_lost(self, e):
+        self._keyboard_focus = False
+        self._update_caption()
+
+    def _update_caption(self):
+        sdl2.SDL_SetWindowTitle(self._window, f'SDL Turtorial - ID {self._window_id} Display {self._window_display_id} MouseFocus {"On" if self._mouse_focus else "Off"} KeyFocus {"On" if self._keyboard_focus else "Off"}'.encode())
+
+    def _toggle_full_screen(self, e):
+        if self._full_screen:
+            sdl2.SDL_SetWindowFullscreen(self._window, sdl2.SDL_FALSE)
+            self._full_screen = False
+        else:
+            sdl2.SDL_SetWindowFullscreen(self._window, sdl2.SDL_TRUE)
+            self._full_screen = True
+            self._minimized = False
+
+    def _next_display(self, e): self._switch_display(self._window_display_id + 1)
+    def _previous_display(self, e): self._switch_display(self._window_display_id - 1)
+
+    def _switch_display(self, display_id: int):
+        if display_id < 0:
+            display_id = g_total_displays - 1
+        elif display_id >= g_total_displays:
+            display_id = 0
+        self._window_display_id = display_id
+
+        sdl2.SDL_SetWindowPosition(
+            self._window,
+            g_display_bounds[self._window_display_id].x + (g_display_bounds[self._window_display_id].w - self._width) // 2,
+            g_display_bounds[self._window_display_id].y + (g_display_bounds[self._window_display_id].h - self._height) // 2,
+        )
+        self._update_caption()
 
     def focus(self):
         if not self._shown:
@@ -192,6 +286,7 @@ class LTexture:
             else:
                 self._width = text_surface.contents.w
                 self._height = text_surface.contents.h
+                self._destroyed = False
             sdl2.SDL_FreeSurface(text_surface)
         return self._texture is not None
 
@@ -227,6 +322,7 @@ class LTexture:
             sdl2.SDL_DestroyTexture(self._texture)
             self._width = 0
             self._height = 0
+        self._destroyed = True
 
 g_window = LWindow()
 g_total_displays = 0
@@ -234,6 +330,7 @@ g_display_bounds = []
 g_renderer = None
 g_font = None
 g_texture = LTexture()
+g_event_router = EventRouter()
 
 def init():
     global g_window, g_renderer, g_total_displays, g_display_bounds
@@ -288,6 +385,7 @@ def main():
         if not load_media():
             print('Failed to load media!')
         else:
+            g_window.register(g_event_router)
             quit = False
             e = sdl2.SDL_Event()
 
@@ -296,7 +394,7 @@ def main():
                     if e.type == sdl2.SDL_QUIT:
                         quit = True
                     
-                    g_window.handle_event(e)
+                    g_event_router.dispatch(e)
 
                 g_window.render()
 
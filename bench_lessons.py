@@ -0,0 +1,268 @@
+import os
+import sys
+import json
+import time
+import runpy
+import ctypes
+import argparse
+import subprocess
+
+import event_log
+
+try:
+    import resource
+except ImportError:
+    # NOTE: no resource module on Windows; peak RSS is reported as 0 there.
+    resource = None
+
+# NOTE: runs the main() of every lesson without a display, feeds it a scripted set of
+# events and reports how fast it ran as JSON, so a slowdown in LTexture, the collision code
+# or the text rendering shows up as a number. every lesson runs in its own process so one
+# crashing or hanging doesn't take the rest down and peak RSS is per lesson.
+#
+#     python bench_lessons.py                              # every lesson, 300 frames each
+#     python bench_lessons.py 26_motion 28_per-pixel_collision_detection -n 1000 -o bench.json
+#
+# lessons ask for an accelerated (and often vsynced) renderer, which the dummy and offscreen
+# video drivers can't give, so SDL_CreateRenderer is redirected to the software renderer.
+# a frame is one SDL_RenderPresent or SDL_UpdateWindowSurface, or one SDL_WaitEventTimeout of
+# a lesson that had nothing to redraw (those don't wait here and are counted as idle frames).
+# after the last frame an SDL_QUIT is pushed. events are pushed with SDL_PushEvent, which doesn't touch
+# SDL_GetKeyboardState, so lessons polling the keyboard state (18) don't see the key presses.
+# with --events the scripted events are replaced by a log recorded with event_log.py and the
+# run ends when the lesson quits (or after --frames frames).
+
+BENCH_FRAMES = 300
+BENCH_TIMEOUT = 120
+BENCH_RESULT_PREFIX = 'BENCH_RESULT '
+
+# NOTE: (frame, event) pairs, pushed right after that frame was presented. every lesson gets
+# the default script; lessons that react to something more specific get theirs on top.
+DEFAULT_SCRIPT = [
+    (10, ('key', 'Right', True)), (40, ('key', 'Right', False)),
+    (40, ('key', 'Down', True)), (70, ('key', 'Down', False)),
+    (70, ('key', 'Left', True)), (100, ('key', 'Left', False)),
+    (100, ('key', 'Up', True)), (130, ('key', 'Up', False)),
+    (140, ('motion', 200, 150)), (150, ('button', 200, 150, True)), (155, ('button', 200, 150, False)),
+]
+LESSON_SCRIPTS = {
+    '12_color_modulation': [(20, ('key', 'Q', True)), (21, ('key', 'Q', False)), (30, ('key', 'A', True)), (31, ('key', 'A', False))],
+    '13_alpha_blending': [(20, ('key', 'W', True)), (21, ('key', 'W', False)), (30, ('key', 'S', True)), (31, ('key', 'S', False))],
+    '23_advanced_timers': [(5, ('key', 'S', True)), (6, ('key', 'S', False)), (60, ('key', 'P', True)), (61, ('key', 'P', False))],
+    '32_text_input_and_clipboard_handling': [(20, ('text', 'hello')), (30, ('key', 'Backspace', True)), (31, ('key', 'Backspace', False))],
+    '32.5_cjk_input': [(20, ('text', 'hello')), (30, ('key', 'Backspace', True)), (31, ('key', 'Backspace', False))],
+}
+
+def get_peak_rss_kb():
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # NOTE: linux reports kilobytes, macOS reports bytes.
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+def get_percentile(values: list, percentile: float):
+    if not values:
+        return 0
+    values = sorted(values)
+    rank = max(1, -(-len(values) * percentile // 100))
+    return values[min(int(rank), len(values)) - 1]
+
+def find_lessons(root: str):
+    return sorted(
+        d for d in os.listdir(root)
+        if os.path.isfile(os.path.join(root, d, 'main.py'))
+    )
+
+def make_event(sdl2, spec):
+    e = sdl2.SDL_Event()
+    kind = spec[0]
+    if kind == 'key':
+        _, name, down = spec
+        e.type = sdl2.SDL_KEYDOWN if down else sdl2.SDL_KEYUP
+        e.key.state = sdl2.SDL_PRESSED if down else sdl2.SDL_RELEASED
+        e.key.keysym.sym = sdl2.SDL_GetKeyFromName(name.encode())
+        e.key.keysym.scancode = sdl2.SDL_GetScancodeFromName(name.encode())
+    elif kind == 'motion':
+        _, x, y = spec
+        e.type = sdl2.SDL_MOUSEMOTION
+        e.motion.x = x
+        e.motion.y = y
+    elif kind == 'button':
+        _, x, y, down = spec
+        e.type = sdl2.SDL_MOUSEBUTTONDOWN if down else sdl2.SDL_MOUSEBUTTONUP
+        e.button.button = sdl2.SDL_BUTTON_LEFT
+        e.button.state = sdl2.SDL_PRESSED if down else sdl2.SDL_RELEASED
+        e.button.x = x
+        e.button.y = y
+    elif kind == 'text':
+        e.type = sdl2.SDL_TEXTINPUT
+        e.text.text = spec[1].encode()
+    return e
+
+def run_lesson(lesson_dir: str, frames: int, events_path: str = None):
+    # NOTE: runs in the child process. patches sdl2 before the lesson imports it; the
+    # lessons call everything as sdl2.X so replacing the module attributes is enough.
+    import sdl2
+
+    name = os.path.basename(os.path.abspath(lesson_dir))
+    script = {}
+    if events_path:
+        events = event_log.load_event_log(events_path, ctypes.sizeof(sdl2.SDL_Event))
+        if events is None:
+            return {'lesson': name, 'exit_code': 1, 'error': f'unable to load {events_path}'}
+        event_log.EventReplayer(events).install(sdl2)
+    else:
+        for frame, spec in DEFAULT_SCRIPT + LESSON_SCRIPTS.get(name, []):
+            script.setdefault(frame, []).append(spec)
+
+    frame_times = []
+    textures = {'live': 0, 'peak': 0}
+    last_frame = [None]
+    idle_frames = [0]
+
+    def on_frame():
+        now = time.perf_counter()
+        if last_frame[0] is not None:
+            frame_times.append((now - last_frame[0]) * 1000)
+        last_frame[0] = now
+        frame = len(frame_times) + 1
+        for spec in script.get(frame, []):
+            sdl2.SDL_PushEvent(ctypes.byref(make_event(sdl2, spec)))
+        if frame == frames:
+            e = sdl2.SDL_Event()
+            e.type = sdl2.SDL_QUIT
+            sdl2.SDL_PushEvent(ctypes.byref(e))
+
+    create_renderer = sdl2.SDL_CreateRenderer
+    render_present = sdl2.SDL_RenderPresent
+    update_window_surface = sdl2.SDL_UpdateWindowSurface
+
+    def present(renderer):
+        render_present(renderer)
+        on_frame()
+
+    def update_surface(window):
+        result = update_window_surface(window)
+        on_frame()
+        return result
+
+    wait_event_timeout = sdl2.SDL_WaitEventTimeout
+    def wait_idle(event, timeout):
+        result = wait_event_timeout(event, 0)
+        idle_frames[0] += 1
+        on_frame()
+        return result
+
+    def counted(create):
+        def wrapper(*args):
+            texture = create(*args)
+            if texture:
+                textures['live'] += 1
+                textures['peak'] = max(textures['peak'], textures['live'])
+            return texture
+        return wrapper
+
+    destroy_texture = sdl2.SDL_DestroyTexture
+    def destroy(texture):
+        if texture:
+            textures['live'] -= 1
+        destroy_texture(texture)
+
+    sdl2.SDL_CreateRenderer = lambda window, index, flags: create_renderer(window, -1, sdl2.SDL_RENDERER_SOFTWARE)
+    sdl2.SDL_RenderPresent = present
+    sdl2.SDL_UpdateWindowSurface = update_surface
+    sdl2.SDL_WaitEventTimeout = wait_idle
+    sdl2.SDL_CreateTexture = counted(sdl2.SDL_CreateTexture)
+    sdl2.SDL_CreateTextureFromSurface = counted(sdl2.SDL_CreateTextureFromSurface)
+    sdl2.SDL_DestroyTexture = destroy
+
+    os.chdir(lesson_dir)
+    sys.path.insert(0, os.getcwd())
+    sys.argv = ['main.py']
+    exit_code = 0
+    error = None
+    start = time.perf_counter()
+    try:
+        runpy.run_path('main.py', run_name='__main__')
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else 0 if e.code is None else 1
+    except Exception as e:
+        exit_code = 1
+        error = f'{type(e).__name__}: {e}'
+    seconds = time.perf_counter() - start
+
+    frame_count = len(frame_times) + (last_frame[0] is not None)
+    if not frame_count and error is None:
+        # NOTE: the lessons print why and return 0 when init() or load_media() fails.
+        error = 'no frames rendered'
+    return {
+        'lesson': name,
+        'exit_code': exit_code,
+        'error': error,
+        'frames': frame_count,
+        'idle_frames': idle_frames[0],
+        'seconds': seconds,
+        'fps': len(frame_times) / (sum(frame_times) / 1000) if frame_times and sum(frame_times) else 0,
+        'frame_ms': {
+            'p50': get_percentile(frame_times, 50),
+            'p95': get_percentile(frame_times, 95),
+            'p99': get_percentile(frame_times, 99),
+            'max': max(frame_times, default=0),
+        },
+        'peak_rss_kb': get_peak_rss_kb(),
+        # NOTE: textures not destroyed by the time main() returned. SDL frees them with the
+        # renderer, but the lesson lost track of them.
+        'live_textures': textures['live'],
+        'peak_textures': textures['peak'],
+    }
+
+def bench_lesson(root: str, lesson: str, frames: int, driver: str, timeout: int, events_path: str = None):
+    env = dict(os.environ, SDL_VIDEODRIVER=driver, SDL_AUDIODRIVER='dummy')
+    command = [sys.executable, os.path.abspath(__file__), '--child', os.path.join(root, lesson), '-n', str(frames)]
+    if events_path:
+        command += ['--events', os.path.abspath(events_path)]
+    try:
+        child = subprocess.run(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout, text=True)
+    except subprocess.TimeoutExpired:
+        return {'lesson': lesson, 'exit_code': None, 'error': f'timed out after {timeout} s'}
+    for line in reversed(child.stdout.splitlines()):
+        if line.startswith(BENCH_RESULT_PREFIX):
+            return json.loads(line[len(BENCH_RESULT_PREFIX):])
+    stderr = child.stderr.strip().splitlines()
+    return {'lesson': lesson, 'exit_code': child.returncode, 'error': stderr[-1] if stderr else 'no result'}
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the lessons headless and report frame times as JSON.')
+    parser.add_argument('lessons', nargs='*', help='lesson directories (default: all of them)')
+    parser.add_argument('-n', '--frames', type=int, default=BENCH_FRAMES)
+    parser.add_argument('-o', '--output', help='write the JSON here instead of stdout')
+    parser.add_argument('--driver', choices=('dummy', 'offscreen'), default='dummy')
+    parser.add_argument('--timeout', type=int, default=BENCH_TIMEOUT, help='seconds per lesson')
+    parser.add_argument('--events', help='replay this event log (see event_log.py) instead of the scripted events')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_lesson(args.child, args.frames, args.events)
+        print(BENCH_RESULT_PREFIX + json.dumps(result))
+        return 0
+
+    root = os.path.dirname(os.path.abspath(__file__))
+    lessons = [os.path.basename(os.path.abspath(l)) for l in args.lessons] or find_lessons(root)
+    results = []
+    for lesson in lessons:
+        result = bench_lesson(root, lesson, args.frames, args.driver, args.timeout, args.events)
+        print(f'{lesson}: {result.get("fps", 0):.1f} fps, {result.get("frames", 0)} frames'
+            + (f', {result["error"]}' if result.get('error') else ''), file=sys.stderr)
+        results.append(result)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return 0 if all(r.get('exit_code') == 0 and not r.get('error') for r in results) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,226 @@
+import os
+import sys
+import runpy
+import ctypes
+import struct
+import argparse
+
+# NOTE: records the events a lesson polls, together with the frame they were polled in, and
+# plays them back into the queue at the same frames, so an interactive run (moving the dot
+# around, clicking buttons, typing with an IME) can be repeated exactly for benchmarks.
+#
+#     python event_log.py record 26_motion -o motion.evlog
+#     python event_log.py replay 26_motion motion.evlog
+#     python bench_lessons.py 26_motion --events motion.evlog
+#
+# the log is a header followed by one record per event: the frame number as a 32 bit int and
+# the raw SDL_Event. a frame is one SDL_RenderPresent or SDL_UpdateWindowSurface, like in
+# bench_lessons.py. events taken off the queue with SDL_PeepEvents (17's EventPump) count as
+# polled too. replayed events go through SDL_PushEvent, which doesn't update
+# SDL_GetKeyboardState, so lessons reading the keyboard state (18) don't see them.
+
+EVENT_LOG_MAGIC = b'SDLEVLOG'
+EVENT_LOG_VERSION = 1
+EVENT_LOG_HEADER = struct.Struct('<8sHH')
+EVENT_LOG_FRAME = struct.Struct('<I')
+
+def is_recordable(event_type: int, sdl2):
+    # NOTE: drop and user events carry pointers, which mean nothing in another process.
+    return not (sdl2.SDL_DROPFILE <= event_type <= sdl2.SDL_DROPCOMPLETE
+        or event_type == sdl2.SDL_SYSWMEVENT
+        or event_type >= sdl2.SDL_USEREVENT)
+
+def save_event_log(p: str, events: list, event_size: int) -> bool:
+    try:
+        with open(p, 'wb') as f:
+            f.write(EVENT_LOG_HEADER.pack(EVENT_LOG_MAGIC, EVENT_LOG_VERSION, event_size))
+            for frame, data in events:
+                f.write(EVENT_LOG_FRAME.pack(frame))
+                f.write(data)
+    except OSError as e:
+        print(f'Unable to save event log {p}! {e}')
+        return False
+    return True
+
+def load_event_log(p: str, event_size: int):
+    # NOTE: returns [(frame, raw event bytes)] or None. the event size is checked so a log
+    # from a different SDL_Event layout isn't replayed as garbage.
+    try:
+        with open(p, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        print(f'Unable to load event log {p}! {e}')
+        return None
+    if len(data) < EVENT_LOG_HEADER.size:
+        print(f'Unable to load event log {p}! File is too short.')
+        return None
+    magic, version, size = EVENT_LOG_HEADER.unpack_from(data)
+    if magic != EVENT_LOG_MAGIC or version != EVENT_LOG_VERSION:
+        print(f'Unable to load event log {p}! Not an event log or unknown version.')
+        return None
+    if size != event_size:
+        print(f'Unable to load event log {p}! Recorded with {size} byte events, SDL_Event is {event_size} bytes.')
+        return None
+    events = []
+    record_size = EVENT_LOG_FRAME.size + size
+    for offset in range(EVENT_LOG_HEADER.size, len(data) - record_size + 1, record_size):
+        frame, = EVENT_LOG_FRAME.unpack_from(data, offset)
+        events.append((frame, data[offset + EVENT_LOG_FRAME.size : offset + record_size]))
+    return events
+
+class FrameCounter:
+    # NOTE: counts presented frames by wrapping the sdl2 module functions. the lessons call
+    # everything as sdl2.X, so install() has to run before the lesson does.
+    def __init__(self):
+        self.frame = 0
+
+    def install(self, sdl2):
+        render_present = sdl2.SDL_RenderPresent
+        update_window_surface = sdl2.SDL_UpdateWindowSurface
+
+        def present(renderer):
+            render_present(renderer)
+            self.frame += 1
+
+        def update_surface(window):
+            result = update_window_surface(window)
+            self.frame += 1
+            return result
+
+        sdl2.SDL_RenderPresent = present
+        sdl2.SDL_UpdateWindowSurface = update_surface
+
+class EventRecorder(FrameCounter):
+    def __init__(self):
+        super().__init__()
+        # [(frame, raw event bytes)]
+        self.events = []
+        self.event_size = 0
+
+    def install(self, sdl2):
+        super().install(sdl2)
+        self.event_size = ctypes.sizeof(sdl2.SDL_Event)
+        poll_event = sdl2.SDL_PollEvent
+
+        def poll(event):
+            result = poll_event(event)
+            if result and event:
+                # NOTE: the lessons pass ctypes.byref(e); _obj is the SDL_Event behind it.
+                target = event._obj if hasattr(event, '_obj') else event.contents
+                if is_recordable(target.type, sdl2):
+                    self.events.append((self.frame, ctypes.string_at(ctypes.addressof(target), self.event_size)))
+            return result
+
+        peep_events = sdl2.SDL_PeepEvents
+
+        def peep(events, numevents, action, min_type, max_type):
+            count = peep_events(events, numevents, action, min_type, max_type)
+            if action == sdl2.SDL_GETEVENT and count > 0:
+                address = get_event_address(events)
+                for i in range(count):
+                    data = ctypes.string_at(address + i * self.event_size, self.event_size)
+                    if is_recordable(sdl2.SDL_Event.from_buffer_copy(data).type, sdl2):
+                        self.events.append((self.frame, data))
+            return count
+
+        sdl2.SDL_PollEvent = poll
+        sdl2.SDL_PeepEvents = peep
+
+    def save(self, p: str) -> bool:
+        return save_event_log(p, self.events, self.event_size)
+
+class EventReplayer(FrameCounter):
+    # NOTE: before the first poll of every frame, pushes everything recorded up to that frame.
+    # events are pushed on polling rather than on presenting so the ones recorded before the
+    # first frame (frame 0) go in after the lesson has initialized SDL. whatever the system
+    # queued on its own (window, keyboard, mouse events...) is thrown away first, since the
+    # recording already has its own copy of those; only SDL_QUIT is kept so a run can still
+    # be stopped from outside.
+    def __init__(self, events: list):
+        super().__init__()
+        self.events = events
+        self.pushed = 0
+        self._pushed_frame = -1
+
+    def is_done(self):
+        return self.pushed == len(self.events)
+
+    def install(self, sdl2):
+        super().install(sdl2)
+        poll_event = sdl2.SDL_PollEvent
+        peep_events = sdl2.SDL_PeepEvents
+
+        def begin_frame():
+            if self._pushed_frame != self.frame:
+                self._pushed_frame = self.frame
+                sdl2.SDL_PumpEvents()
+                sdl2.SDL_FlushEvents(sdl2.SDL_QUIT + 1, sdl2.SDL_LASTEVENT)
+                self.push_due(sdl2)
+
+        def poll(event):
+            begin_frame()
+            return poll_event(event)
+
+        def peep(events, numevents, action, min_type, max_type):
+            if action == sdl2.SDL_GETEVENT:
+                begin_frame()
+            return peep_events(events, numevents, action, min_type, max_type)
+
+        sdl2.SDL_PollEvent = poll
+        sdl2.SDL_PeepEvents = peep
+
+    def push_due(self, sdl2):
+        events = self.events
+        while self.pushed < len(events) and events[self.pushed][0] <= self.frame:
+            e = sdl2.SDL_Event.from_buffer_copy(events[self.pushed][1])
+            sdl2.SDL_PushEvent(ctypes.byref(e))
+            self.pushed += 1
+
+def get_event_address(events):
+    # NOTE: SDL_PeepEvents gets either an SDL_Event array or a pointer to one.
+    if isinstance(events, ctypes.Array):
+        return ctypes.addressof(events)
+    return ctypes.cast(events, ctypes.c_void_p).value
+
+def run_lesson_main(lesson_dir: str):
+    os.chdir(lesson_dir)
+    sys.path.insert(0, os.getcwd())
+    sys.argv = ['main.py']
+    try:
+        runpy.run_path('main.py', run_name='__main__')
+    except SystemExit:
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description='Record the events of a lesson run or play them back.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    record = commands.add_parser('record', help='run a lesson and record the events it polls')
+    record.add_argument('lesson')
+    record.add_argument('-o', '--output', help='event log path (default: <lesson>/events.evlog)')
+    replay = commands.add_parser('replay', help='run a lesson with a recorded event log')
+    replay.add_argument('lesson')
+    replay.add_argument('events')
+    args = parser.parse_args()
+
+    import sdl2
+
+    if args.command == 'record':
+        output = os.path.abspath(args.output or os.path.join(args.lesson, 'events.evlog'))
+        recorder = EventRecorder()
+        recorder.install(sdl2)
+        run_lesson_main(args.lesson)
+        if not recorder.save(output):
+            return 1
+        print(f'Recorded {len(recorder.events)} events over {recorder.frame} frames to {output}')
+    else:
+        events = load_event_log(args.events, ctypes.sizeof(sdl2.SDL_Event))
+        if events is None:
+            return 1
+        replayer = EventReplayer(events)
+        replayer.install(sdl2)
+        run_lesson_main(args.lesson)
+        print(f'Replayed {replayer.pushed} of {len(events)} events over {replayer.frame} frames')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+import os
+import sys
+import math
+import ctypes
+import struct
+import argparse
+import sdl2
+import sdl2.sdlimage
+
+# NOTE: cuts a level image into tiles, keeps every distinct tile once in a tileset PNG and
+# writes the level as a grid of tile ids, so a level no longer has to fit into one texture.
+#
+#     python make_tilemap.py 30_scrolling/bg.png -o 30_scrolling/level
+#
+# writes 30_scrolling/level.tiles and 30_scrolling/level_tileset.png.
+#
+# the .tiles file is little-endian binary: a header (TILEMAP_HEADER: magic, version, tile
+# size in pixels, level width and height in tiles, chunk size in tiles, length of the tileset
+# file name), the tileset file name (utf-8, relative to the .tiles file), then the tile ids
+# as u16, chunk by chunk in row-major order, each chunk chunk_size * chunk_size ids in
+# row-major order. chunks stick out past the right and bottom edge of the level when its
+# size isn't a multiple of the chunk size; those tiles are TILE_EMPTY. storing chunks whole
+# means a chunk is one seek and one read, whatever the size of the level.
+
+TILEMAP_MAGIC = b'LTILEMAP'
+TILEMAP_VERSION = 1
+TILEMAP_HEADER = struct.Struct('<8sHHIIHH')
+TILE_EMPTY = 0xffff
+DEFAULT_TILE_SIZE = 32
+DEFAULT_CHUNK_SIZE = 16
+
+def write_tilemap(p: str, tileset_name: str, tile_size: int, width: int, height: int, chunk_size: int, get_tile):
+    # NOTE: get_tile(x, y) returns the id of the tile at column x, row y of the level.
+    name = tileset_name.encode()
+    chunk_columns = -(-width // chunk_size)
+    chunk_rows = -(-height // chunk_size)
+    with open(p, 'wb') as f:
+        f.write(TILEMAP_HEADER.pack(TILEMAP_MAGIC, TILEMAP_VERSION, tile_size, width, height, chunk_size, len(name)))
+        f.write(name)
+        for chunk_y in range(chunk_rows):
+            for chunk_x in range(chunk_columns):
+                ids = []
+                for y in range(chunk_y * chunk_size, (chunk_y + 1) * chunk_size):
+                    for x in range(chunk_x * chunk_size, (chunk_x + 1) * chunk_size):
+                        ids.append(get_tile(x, y) if x < width and y < height else TILE_EMPTY)
+                f.write(struct.pack(f'<{len(ids)}H', *ids))
+
+def make_tilemap(image: str, output: str, tile_size: int, chunk_size: int) -> bool:
+    surface = sdl2.sdlimage.IMG_Load(image.encode())
+    if not surface:
+        print(f'Unable to load image {image}! SDL_image Error: {sdl2.sdlimage.IMG_GetError().decode()}')
+        return False
+    converted = sdl2.SDL_ConvertSurfaceFormat(surface, sdl2.SDL_PIXELFORMAT_RGBA32, 0)
+    sdl2.SDL_FreeSurface(surface)
+    if not converted:
+        print(f'Unable to convert {image}! SDL Error: {sdl2.SDL_GetError().decode()}')
+        return False
+
+    w = converted.contents.w
+    h = converted.contents.h
+    if w % tile_size or h % tile_size:
+        print(f'{image} is {w}x{h}, which is not a multiple of the tile size {tile_size}!')
+        sdl2.SDL_FreeSurface(converted)
+        return False
+    pitch = converted.contents.pitch
+    pixels = ctypes.string_at(converted.contents.pixels, pitch * h)
+
+    # tile pixels -> id, and the position of every distinct tile in the image
+    ids = {}
+    sources = []
+    grid = []
+    for y in range(h // tile_size):
+        row = []
+        for x in range(w // tile_size):
+            tile = b''.join(
+                pixels[(y * tile_size + line) * pitch + x * tile_size * 4 : (y * tile_size + line) * pitch + (x + 1) * tile_size * 4]
+                for line in range(tile_size)
+            )
+            tile_id = ids.get(tile)
+            if tile_id is None:
+                tile_id = ids[tile] = len(sources)
+                sources.append((x, y))
+            row.append(tile_id)
+        grid.append(row)
+    if len(sources) >= TILE_EMPTY:
+        print(f'{image} has {len(sources)} distinct tiles, at most {TILE_EMPTY - 1} are supported!')
+        sdl2.SDL_FreeSurface(converted)
+        return False
+
+    columns = math.ceil(math.sqrt(len(sources)))
+    rows = math.ceil(len(sources) / columns)
+    tileset = sdl2.SDL_CreateRGBSurfaceWithFormat(0, columns * tile_size, rows * tile_size, 32, sdl2.SDL_PIXELFORMAT_RGBA32)
+    if not tileset:
+        print(f'Unable to create tileset surface! SDL Error: {sdl2.SDL_GetError().decode()}')
+        sdl2.SDL_FreeSurface(converted)
+        return False
+    sdl2.SDL_SetSurfaceBlendMode(converted, sdl2.SDL_BLENDMODE_NONE)
+    for tile_id, (x, y) in enumerate(sources):
+        src = sdl2.SDL_Rect(x=x * tile_size, y=y * tile_size, w=tile_size, h=tile_size)
+        dst = sdl2.SDL_Rect(x=tile_id % columns * tile_size, y=tile_id // columns * tile_size, w=tile_size, h=tile_size)
+        sdl2.SDL_BlitSurface(converted, src, tileset, dst)
+
+    success = True
+    tileset_path = output + '_tileset.png'
+    if sdl2.sdlimage.IMG_SavePNG(tileset, tileset_path.encode()) != 0:
+        print(f'Unable to save {tileset_path}! SDL_image Error: {sdl2.sdlimage.IMG_GetError().decode()}')
+        success = False
+    else:
+        write_tilemap(output + '.tiles', os.path.basename(tileset_path),
+            tile_size, w // tile_size, h // tile_size, chunk_size,
+            lambda x, y: grid[y][x],
+        )
+        print(f'Wrote {output}.tiles ({w // tile_size}x{h // tile_size} tiles) and {tileset_path} ({len(sources)} distinct tiles)')
+    sdl2.SDL_FreeSurface(tileset)
+    sdl2.SDL_FreeSurface(converted)
+    return success
+
+def main():
+    parser = argparse.ArgumentParser(description='Cut a level image into a tileset and a tile grid.')
+    parser.add_argument('image')
+    parser.add_argument('-o', '--output', help='output path without extension (default: <image directory>/level)')
+    parser.add_argument('--tile-size', type=int, default=DEFAULT_TILE_SIZE)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='tiles per chunk side')
+    args = parser.parse_args()
+    output = args.output or os.path.join(os.path.dirname(args.image), 'level')
+
+    if not (sdl2.sdlimage.IMG_Init(sdl2.sdlimage.IMG_INIT_PNG) & sdl2.sdlimage.IMG_INIT_PNG):
+        print(f'SDL_image could not initialize! SDL_image Error: {sdl2.sdlimage.IMG_GetError().decode()}')
+        return 1
+    success = make_tilemap(args.image, output, args.tile_size, args.chunk_size)
+    sdl2.sdlimage.IMG_Quit()
+    return 0 if success else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,162 @@
+import os
+import sys
+import math
+import argparse
+import sdl2
+import sdl2.sdlimage
+
+# NOTE: packs every image of a directory into one PNG plus an index file so a lesson can
+# load all of them with a single decode and a single texture upload. the index is plain
+# text: the first line is the name of the atlas image (relative to the index file), then
+# one "name x y w h" line per packed image, where name is the file name without extension.
+#
+#     python pack_atlas.py 18_key_states -o 18_key_states/atlas
+#
+# writes 18_key_states/atlas.png and 18_key_states/atlas.idx.
+
+IMAGE_EXTENSIONS = ('.png', '.bmp')
+ATLAS_MAX_WIDTH = 4096
+# NOTE: one pixel of empty space around every image keeps linear filtering from bleeding
+# neighbours into each other.
+ATLAS_PADDING = 1
+
+def skyline_pack(sizes: list, width: int):
+    # NOTE: bottom-left skyline packing. the skyline is a list of [x, y, w] segments
+    # covering the whole atlas width; every image goes where its top edge ends up lowest.
+    skyline = [[0, 0, width]]
+    positions = [None] * len(sizes)
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0]))
+    for i in order:
+        w, h = sizes[i]
+        best = None
+        for start in range(len(skyline)):
+            x = skyline[start][0]
+            if x + w > width:
+                break
+            y = 0
+            covered = 0
+            end = start
+            while covered < w:
+                y = max(y, skyline[end][1])
+                covered += skyline[end][2] - (x - skyline[end][0] if end == start else 0)
+                end += 1
+            if best is None or (y + h, x) < (best[1] + h, best[0]):
+                best = (x, y, start)
+        if best is None:
+            return None
+        x, y, start = best
+        positions[i] = (x, y)
+
+        # replace the segments under the image with one segment on top of it.
+        new_segments = [[x, y + h, w]]
+        right = x + w
+        for segment in skyline[start:]:
+            segment_right = segment[0] + segment[2]
+            if segment_right > right:
+                new_segments.append([max(segment[0], right), segment[1], segment_right - max(segment[0], right)])
+        skyline = skyline[:start] + new_segments
+        # merge neighbours of the same height so the skyline stays short.
+        merged = [skyline[0]]
+        for segment in skyline[1:]:
+            if segment[1] == merged[-1][1]:
+                merged[-1][2] += segment[2]
+            else:
+                merged.append(segment)
+        skyline = merged
+    return positions
+
+def choose_layout(sizes: list):
+    # NOTE: try a few atlas widths around the square root of the total area (plus the
+    # widths of whole rows of the widest images) and keep the squarest result.
+    widest = max(w for w, _ in sizes)
+    area = sum(w * h for w, h in sizes)
+    candidates = {int(math.sqrt(area) * f) for f in (1, 1.25, 1.5, 2)}
+    row_width = 0
+    for w in sorted((w for w, _ in sizes), reverse=True):
+        row_width += w
+        candidates.add(row_width)
+    best = (None, None, None)
+    for width in sorted(c for c in candidates if widest <= c <= ATLAS_MAX_WIDTH) or [widest]:
+        positions = skyline_pack(sizes, width)
+        if positions is None:
+            continue
+        height = max(y + h for (_, y), (_, h) in zip(positions, sizes))
+        if best[2] is None or (max(width, height), width * height) < (max(best[0], best[1]), best[0] * best[1]):
+            best = (width, height, positions)
+    return best
+
+def pack_directory(directory: str, output: str) -> bool:
+    # NOTE: skip the atlas itself in case it is written into the same directory.
+    atlas_path = os.path.abspath(output + '.png')
+    names = sorted(
+        f for f in os.listdir(directory)
+        if f.lower().endswith(IMAGE_EXTENSIONS)
+        and os.path.abspath(os.path.join(directory, f)) != atlas_path
+    )
+    if not names:
+        print(f'No images found in {directory}!')
+        return False
+
+    surfaces = []
+    for name in names:
+        surface = sdl2.sdlimage.IMG_Load(os.path.join(directory, name).encode())
+        if not surface:
+            print(f'Unable to load image {name}! SDL_image Error: {sdl2.sdlimage.IMG_GetError().decode()}')
+            for _, s in surfaces:
+                sdl2.SDL_FreeSurface(s)
+            return False
+        surfaces.append((os.path.splitext(name)[0], surface))
+
+    sizes = [(s.contents.w + ATLAS_PADDING * 2, s.contents.h + ATLAS_PADDING * 2) for _, s in surfaces]
+    width, height, positions = choose_layout(sizes)
+    if positions is None:
+        print(f'Images do not fit into an atlas {ATLAS_MAX_WIDTH} pixels wide!')
+        for _, s in surfaces:
+            sdl2.SDL_FreeSurface(s)
+        return False
+
+    success = True
+    atlas = sdl2.SDL_CreateRGBSurfaceWithFormat(0, width, height, 32, sdl2.SDL_PIXELFORMAT_RGBA32)
+    if not atlas:
+        print(f'Unable to create atlas surface! SDL Error: {sdl2.SDL_GetError().decode()}')
+        success = False
+    else:
+        lines = [os.path.basename(output) + '.png']
+        for (name, surface), (x, y) in zip(surfaces, positions):
+            # NOTE: copy the pixels as they are, alpha included. if the image itself comes
+            # with a color key (e.g. a palette PNG with a transparent entry) those pixels are
+            # skipped and stay transparent in the atlas; the lessons' own cyan color key is
+            # applied when the atlas is loaded.
+            sdl2.SDL_SetSurfaceBlendMode(surface, sdl2.SDL_BLENDMODE_NONE)
+            dst = sdl2.SDL_Rect(x=x + ATLAS_PADDING, y=y + ATLAS_PADDING, w=surface.contents.w, h=surface.contents.h)
+            sdl2.SDL_BlitSurface(surface, None, atlas, dst)
+            lines.append(f'{name} {dst.x} {dst.y} {dst.w} {dst.h}')
+        if sdl2.sdlimage.IMG_SavePNG(atlas, (output + '.png').encode()) != 0:
+            print(f'Unable to save {output}.png! SDL_image Error: {sdl2.sdlimage.IMG_GetError().decode()}')
+            success = False
+        else:
+            with open(output + '.idx', 'w') as f:
+                f.write('\n'.join(lines) + '\n')
+            print(f'Packed {len(surfaces)} images into {output}.png ({width}x{height})')
+        sdl2.SDL_FreeSurface(atlas)
+
+    for _, s in surfaces:
+        sdl2.SDL_FreeSurface(s)
+    return success
+
+def main():
+    parser = argparse.ArgumentParser(description='Pack the images of a directory into one atlas.')
+    parser.add_argument('directory')
+    parser.add_argument('-o', '--output', help='output path without extension (default: <directory>/atlas)')
+    args = parser.parse_args()
+    output = args.output or os.path.join(args.directory, 'atlas')
+
+    if not (sdl2.sdlimage.IMG_Init(sdl2.sdlimage.IMG_INIT_PNG) & sdl2.sdlimage.IMG_INIT_PNG):
+        print(f'SDL_image could not initialize! SDL_image Error: {sdl2.sdlimage.IMG_GetError().decode()}')
+        return 1
+    success = pack_directory(args.directory, output)
+    sdl2.sdlimage.IMG_Quit()
+    return 0 if success else 1
+
+if __name__ == '__main__':
+    sys.exit(main())